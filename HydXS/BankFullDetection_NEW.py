@@ -88,7 +88,7 @@
 ###############################################################################################################################
 #
 # input: pre-processed dataframe from step 2
-# uses: spline_withR (second critical deRosa element)
+# uses: spline_withR (second critical deRosa element) , or its SciPy port spline_scipy
 # output: tuple of values from modelling run
 #
 # if running over single XS, use the "HydXS_perXS " function in HydXS_modelling.py
@@ -109,14 +109,32 @@ from shapely.geometry import Polygon
 from shapely.geometry import box
 from shapely.geometry import LineString
 import numpy as np
+import logging
+from typing import NamedTuple
 
 # specific library name  -----------------------------------------------------------------------------------------------------
-from .spline_withR_NEW import runAlg as splineR
+from .stage_geometry import stage_geometry, profile_array
+from .stage_sampling import adaptive_stages
+from . import HydXS_profiling
+
+logger = logging.getLogger(__name__)
 
 
 # underlying functions -------------------------------------------------------------------------------------------------------
 
 
+# smoothing backend used by mainFun : "R" (spline_withR_NEW, needs rpy2) or "scipy" (spline_scipy, pure Python)
+# imported on first use, so R / rpy2 is only needed when the R backend is selected
+def get_smoother(smoother="R"):
+    if smoother == "R":
+        from .spline_withR_NEW import runAlg
+    elif smoother == "scipy":
+        from .spline_scipy import runAlg
+    else:
+        raise ValueError("smoother must be 'R' or 'scipy'")
+    return runAlg
+
+
 def cmp(a, b):
     return bool(a > b) - bool(a < b)
 
@@ -144,33 +162,65 @@ def diff_n(Harray, locMax, dist):
         return False
 
 
+# turning points of a curve (or of each row of a 2-D stack of curves), vectorised ----------------------------------------------
+# maxima / minima are where the gradient changes sign ; the rank of a maximum is how many points either side of it
+# (clipped at the curve ends) it stays higher than, starting from the rank of the previous maximum (as the original loop did)
+# OUTPUT: dictionary as below for a 1-D curve ; list of dictionaries, one per row, for a 2-D stack
 def local_maxmin(Harray):
-    gradients = np.diff(Harray)
-    maxima_num = 0
-    minima_num = 0
-    max_locations = []
-    min_locations = []
-    count = 0
-    ranks = []
-    rank = 1
-    for i in gradients[:-1]:
-        count += 1
-        if (cmp(i, 0) > 0) & (cmp(gradients[count], 0) < 0) & (i != gradients[count]):
-            maxima_num += 1
-            max_locations.append(count)
-            while diff_n(Harray, count, rank) and rank < len(Harray):
-                rank += 1
-            ranks.append(rank)
-        if (cmp(i, 0) < 0) & (cmp(gradients[count], 0) > 0) & (i != gradients[count]):
-            minima_num += 1
-            min_locations.append(count)
-    turning_points = {
-        "maxima_number": maxima_num,
-        "minima_number": minima_num,
-        "maxima_locations": max_locations,
-        "minima_locations": min_locations,
-        "maxima_ranks": ranks,
-    }
+    H = np.asarray(Harray, dtype=float)
+    if H.ndim == 1:
+        return local_maxmin(H[None, :])[0]
+    ncurve, n = H.shape
+
+    gradients = np.diff(H, axis=1)
+    left = gradients[:, :-1]
+    right = gradients[:, 1:]
+    is_max = (left > 0) & (right < 0) & (left != right)
+    is_min = (left < 0) & (right > 0) & (left != right)
+    max_curve, max_loc = np.nonzero(is_max)
+    max_loc = max_loc + 1
+    min_curve, min_loc = np.nonzero(is_min)
+    min_loc = min_loc + 1
+
+    # ranks (diff_n in the original loop), stepped for the k-th maximum of every curve at once
+    # the rank carries over from one maximum to the next along each curve
+    ranks = np.empty(len(max_loc), dtype=int)
+    rank = np.ones(ncurve, dtype=int)
+    order = np.arange(len(max_loc)) - np.searchsorted(max_curve, max_curve)
+    for k in range(order.max() + 1 if len(order) else 0):
+        sel = np.flatnonzero(order == k)
+        curve = max_curve[sel]
+        loc = max_loc[sel]
+        r = rank[curve]
+        active = np.arange(len(sel))
+        while len(active) > 0:
+            c = curve[active]
+            p = loc[active]
+            lGrad = H[c, p] - H[c, np.maximum(p - r[active], 0)]
+            rGrad = H[c, np.minimum(p + r[active], n - 1)] - H[c, p]
+            step = (lGrad > 0) & (rGrad < 0) & (lGrad != rGrad) & (r[active] < n)
+            active = active[step]
+            r[active] += 1
+        rank[curve] = r
+        ranks[sel] = r
+
+    max_split = np.searchsorted(max_curve, np.arange(1, ncurve))
+    min_split = np.searchsorted(min_curve, np.arange(1, ncurve))
+    turning_points = []
+    for max_locations, min_locations, max_ranks in zip(
+        np.split(max_loc, max_split),
+        np.split(min_loc, min_split),
+        np.split(ranks, max_split),
+    ):
+        turning_points.append(
+            {
+                "maxima_number": len(max_locations),
+                "minima_number": len(min_locations),
+                "maxima_locations": max_locations.tolist(),
+                "minima_locations": min_locations.tolist(),
+                "maxima_ranks": max_ranks.tolist(),
+            }
+        )
     return turning_points
 
 
@@ -180,11 +230,25 @@ def local_maxmin(Harray):
 #   minVdep : meters : minimum hydraulic depth for bankful ; deRosa original = 1m ; MDAP amended = 0.2m
 #   (new) allow_multichannel : boolean : True if replicating original deRosa; False if running MDAP amended
 #   (new) create_plot : boolean : part of MDAP amendment, only use True if running single XS at a time
+#   (new) geometry : "shapely" (per-stage GEOS intersections, original) or "analytic" (vectorised, see stage_geometry.py)
+#   (new) smoother : "R" (spline_withR_NEW via rpy2, original) or "scipy" (spline_scipy, no R needed)
+#   (new) curve : StageCurve from stage_curve() ; if given, the depth sweep is skipped and only the smoothing / bankfull runs
+#   (new) seed : seed for the random CV folds of the spline smoothing ; None = unseeded (original behaviour)
+#   (new) cache : StageCache (see HydXS_cache.py) ; the stage curve, and the spline smoothing if seeded, are taken from it when cached
+#   (new) stage_grid : "uniform" (nVsteps evenly spaced depths, original) or "adaptive" (coarse-to-fine, see stage_sampling.py)
+#   (new) cap_at_crest : boolean : True to end the depth grid (and so the search for the bankfull) at the lower bank crest, see
+#         stage_curve ; raises NoAdmissibleStageRange if there is no depth below it
 # OUTPUT: boundsOK[0],boundsOK[2],wetArea.bounds[1], wetArea.bounds[3], nchannel, fig, spar
 # ie. LeftDistance(bank), RightDistance(bank), n/a, BankFull, nChannels, "-" or a graph, smoothing parameter from spline_withR
 
 
-def calc_hyd_outputs(pointList, dept, allow_multichannel=False):
+def calc_hyd_outputs(pointList, dept, allow_multichannel=False, geometry="shapely"):
+    if geometry == "analytic":
+        area, perimeter, width = stage_geometry(pointList, [dept], allow_multichannel)
+        return area[0] / width[0], area[0] / perimeter[0], width[0]
+    elif geometry != "shapely":
+        raise ValueError("geometry must be 'shapely' or 'analytic'")
+
     polygonXSorig = Polygon(pointList)
     borderXS = LineString(pointList)
 
@@ -214,46 +278,190 @@ def calc_hyd_outputs(pointList, dept, allow_multichannel=False):
     return HydDept, HydRad, width
 
 
-def mainFun(
-    pointList, nVsteps=200, minVdep=0.1, allow_multichannel=False, create_plot=False
-):
+# hydraulic depth / radius curve of a single XS over the depth grid ----------------------------------------------------------------
+# deterministic for a given XS (only the spline smoothing is random), so HydXS_modelling.py computes it once per XS and
+# passes it to mainFun (curve=...) for every run and boundary retry
+#   profile : (Distance, Z) points of the XS as an (n, 2) array ; the caller's pointList is not modified
+#   stage_grid : "uniform" (np.linspace over nVsteps, original) or "adaptive" (coarse-to-fine, see stage_sampling.py)
+#   weights : None for the uniform grid ; for the adaptive grid, the weight of each depth in the spline smoothing
+#   cap_at_crest : False (original) = depths up to 0.1m below the highest point of the XS ; True = depths below the lower bank
+#     crest (bank_crest) only ; at and above it the wet area reaches the end of the XS, so the bankfull would hit a boundary
+#     (note 8), and those stages are not computed ; the grid is the part of the uncapped grid below the crest, so it has fewer
+#     stages, unless fewer than MIN_CAPPED_STEPS of them are below it : the grid is then MIN_CAPPED_STEPS evenly spaced depths
+#     below the crest, so the spline is never fitted to a curve of a few points
+class StageCurve(NamedTuple):
+    profile: np.ndarray
+    depts: np.ndarray
+    HydDept: np.ndarray
+    HydRad: np.ndarray
+    weights: np.ndarray = None
+
+
+# XS polygon, XS line, and XS polygon extended 1m above the highest point (see note 10 above)
+def xs_polygons(profile):
+    pointList = [tuple(p) for p in profile]
     polygonXSorig = Polygon(pointList)
     borderXS = LineString(pointList)
-
-    minY = polygonXSorig.bounds[1]
     maxY = polygonXSorig.bounds[-1]
     pointList.insert(0, (polygonXSorig.bounds[0], maxY + 1))
     pointList.append((polygonXSorig.bounds[2], maxY + 1))
     polygonXS = Polygon(pointList)
+    return polygonXSorig, borderXS, polygonXS
+
+
+# fewest depths of a grid capped at the crest
+MIN_CAPPED_STEPS = 20
+
+
+# no depth between the lowest point of the XS and its lower bank crest (stage_curve with cap_at_crest=True)
+class NoAdmissibleStageRange(ValueError):
+    pass
+
+
+# lower bank crest : the lower of the highest points either side of the lowest point of the XS (ends included)
+def bank_crest(profile):
+    z = profile[:, 1]
+    k = int(np.argmin(z))
+    return min(z[: k + 1].max(), z[k:].max())
+
 
-    depts = np.linspace(minY + 0.1, maxY - 0.1, nVsteps)
-
-    HydRad = np.array([])
-    HydDept = np.array([])
-    for dept in depts:
-        wdep = hdepth(polygonXSorig, dept)
-        wdepLine = WTable(polygonXSorig, dept)
-        wetArea = polygonXS.intersection(wdep)
-        wetPerimeter = borderXS.intersection(wdep)
-        wetWTLine = wdepLine.intersection(polygonXS)
-        # new HydXS code
-        if allow_multichannel == False:
-            if wetArea.geom_type == "MultiPolygon":
-                try:
-                    for poly in list(wetArea.geoms):
-                        if poly.bounds[1] == minY:
-                            wetArea = poly
-                            break
-                except Exception as e:
-                    import pdb
-
-                    pdb.set_trace()
-                wetPerimeter = wetArea.intersection(wetPerimeter)
-                wetWTLine = wetArea.intersection(wetWTLine)
-        # end new HydXS code
-        HydRad = np.append(HydRad, wetArea.area / wetPerimeter.length)
-        HydDept = np.append(HydDept, wetArea.area / wetWTLine.length)
-    deptsLM, HydDeptLM, spar, fit = splineR(depts, HydDept)
+def stage_curve(
+    pointList,
+    nVsteps=200,
+    allow_multichannel=False,
+    geometry="shapely",
+    stage_grid="uniform",
+    cap_at_crest=False,
+):
+    if geometry not in ("shapely", "analytic"):
+        raise ValueError("geometry must be 'shapely' or 'analytic'")
+    profile = profile_array(pointList)
+    polygons = xs_polygons(profile)
+
+    minY = polygons[0].bounds[1]
+    maxY = polygons[0].bounds[-1]
+    lo, hi = minY + 0.1, maxY - 0.1
+    if cap_at_crest:
+        crest = bank_crest(profile)
+        if not crest > lo:
+            raise NoAdmissibleStageRange(
+                "no depth between the lowest point and the lower bank crest"
+            )
+        # the stages of the uncapped grid below the crest
+        uniform = np.linspace(lo, hi, nVsteps)
+        below = int(np.searchsorted(uniform, crest, side="left"))
+        if below >= MIN_CAPPED_STEPS:
+            nVsteps, hi = below, uniform[below - 1]
+        elif below < nVsteps:
+            # too few of them : a finer grid below the crest
+            nVsteps = MIN_CAPPED_STEPS
+            hi = lo + (crest - lo) * (nVsteps - 1) / nVsteps
+
+    if stage_grid == "adaptive":
+        with HydXS_profiling.stage("geometry"):
+            depts, weights, HydDept, HydRad = adaptive_stages(
+                lambda d: stage_hydraulics(
+                    profile, polygons, d, allow_multichannel, geometry
+                ),
+                profile,
+                lo,
+                hi,
+                nVsteps,
+            )
+        return StageCurve(profile, depts, HydDept, HydRad, weights)
+    elif stage_grid != "uniform":
+        raise ValueError("stage_grid must be 'uniform' or 'adaptive'")
+
+    depts = np.linspace(lo, hi, nVsteps)
+    with HydXS_profiling.stage("geometry"):
+        HydDept, HydRad = stage_hydraulics(
+            profile, polygons, depts, allow_multichannel, geometry
+        )
+    return StageCurve(profile, depts, HydDept, HydRad)
+
+
+# hydraulic depth and radius of a XS at each of the depths depts ; polygons from xs_polygons
+def stage_hydraulics(profile, polygons, depts, allow_multichannel, geometry):
+    polygonXSorig, borderXS, polygonXS = polygons
+    minY = polygonXSorig.bounds[1]
+    HydXS_profiling.count("geometry_evaluations", len(depts))
+    if geometry == "analytic":
+        wetAreas, wetPerimeters, wetWidths = stage_geometry(
+            profile, depts, allow_multichannel
+        )
+        HydRad = wetAreas / wetPerimeters
+        HydDept = wetAreas / wetWidths
+    else:
+        HydRad = np.array([])
+        HydDept = np.array([])
+        for dept in depts:
+            wdep = hdepth(polygonXSorig, dept)
+            wdepLine = WTable(polygonXSorig, dept)
+            wetArea = polygonXS.intersection(wdep)
+            wetPerimeter = borderXS.intersection(wdep)
+            wetWTLine = wdepLine.intersection(polygonXS)
+            # new HydXS code
+            if allow_multichannel == False:
+                if wetArea.geom_type == "MultiPolygon":
+                    try:
+                        for poly in list(wetArea.geoms):
+                            if poly.bounds[1] == minY:
+                                wetArea = poly
+                                break
+                    except Exception as e:
+                        # no hydraulic depth / radius at this depth (NaN), instead of stopping the run
+                        logger.warning("wet area at depth %s can't be split into channels : %s", dept, e)
+                        HydRad = np.append(HydRad, np.nan)
+                        HydDept = np.append(HydDept, np.nan)
+                        continue
+                    wetPerimeter = wetArea.intersection(wetPerimeter)
+                    wetWTLine = wetArea.intersection(wetWTLine)
+            # end new HydXS code
+            HydRad = np.append(HydRad, wetArea.area / wetPerimeter.length)
+            HydDept = np.append(HydDept, wetArea.area / wetWTLine.length)
+    return HydDept, HydRad
+
+
+def mainFun(
+    pointList,
+    nVsteps=200,
+    minVdep=0.1,
+    allow_multichannel=False,
+    create_plot=False,
+    geometry="shapely",
+    smoother="R",
+    curve=None,
+    seed=None,
+    cache=None,
+    stage_grid="uniform",
+    cap_at_crest=False,
+):
+    splineR = get_smoother(smoother)
+    if curve is None and cache is not None:
+        curve = cache.stage_curve(
+            pointList, nVsteps, allow_multichannel, geometry, stage_grid, cap_at_crest
+        )
+    elif curve is None:
+        curve = stage_curve(
+            pointList, nVsteps, allow_multichannel, geometry, stage_grid, cap_at_crest
+        )
+    depts = curve.depts
+    HydDept = curve.HydDept
+    polygonXSorig, borderXS, polygonXS = xs_polygons(curve.profile)
+    minY = polygonXSorig.bounds[1]
+
+    # the adaptive depth grid isn't evenly spaced : its depths are weighted in the smoothing (see stage_sampling.py)
+    weighting = {} if curve.weights is None else {"w": curve.weights}
+    HydXS_profiling.count("smoothing_calls")
+    with HydXS_profiling.stage("smoothing"):
+        if cache is not None and seed is not None:
+            deptsLM, HydDeptLM, spar, fit = cache.spline(
+                splineR, smoother, depts, HydDept, seed, **weighting
+            )
+        else:
+            deptsLM, HydDeptLM, spar, fit = splineR(
+                depts, HydDept, seed=seed, **weighting
+            )
 
     if len(deptsLM) > 0:
         max_loc_filtered = []
@@ -11,51 +11,53 @@
 # OUTPUT: dataframe = pre-processed XS data + InRiver + BankFull + BankLeft + BankRight + CountBankFull
 #       where inRiver = True / False ; using Distance and BankLeft and BankRight
 #
-# example: XSdata4 = attach_HydXS( XSdata2, XSdata3_out )
+# example: XSdata4 = attach_HydXS( XSdata2, XSdata3_out, xs_list )
+# a single left merge of the results on x_sec_id, and InRiver as one vectorised comparison over all points
+# xs_index : XSIndex of the pre-processed XS dataset (see xs_index.py) ; built here if not given
 #
 ###############################################################################################################################
 
 import pandas as pd
 
+from .xs_index import XSIndex
 
-def attach_HydXS(xs, results, xs_list):
-    for n,i in enumerate(xs_list):
-        print(i)
-        subset = xs[xs["x_sec_id"] == i].reset_index()
 
-        # initialise
-        left = None
-        right = None
-        bankfull = None
-        count = None
-        # from HydXS results
-        if not len(results[results["CrossSection"] == i]) == 0:
-            left = float(results["LeftOutput"][results["CrossSection"] == i].item())
-            right = float(results["RightOutput"][results["CrossSection"] == i].item())
-            bankfull = float(results["BankFullOutput"][results["CrossSection"] == i].item())
-            count = int(results["CountatBankFull"][results["CrossSection"] == i].item())
-
-        # initialise
-        subset["InRiver"] = False
-        subset["BankFull"] = bankfull
-        subset["BankLeft"] = left
-        subset["BankRight"] = right
-        subset["CountAtBankFull"] = count
-        # set true if between left and right boundaries
-        for j in range(0, len(subset)):
-            if not (left == None or right == None):
-                if (
-                    subset.loc[j, "Distance"] > left
-                    and subset.loc[j, "Distance"] < right
-                ):
-                    subset.loc[j, "InRiver"] = True
-            else:
-                subset["CountAtBankFull"] = 0
-
-        if n == 0:
-            output = subset
-        else:
-            output = pd.concat([output, subset], ignore_index=True)
+def attach_HydXS(xs, results, xs_list, xs_index=None):
+    if xs_index is None:
+        xs_index = XSIndex(xs)
+    # points of each XS in xs_list order, with the HydXS results of their XS
+    output = pd.DataFrame(xs_index.take(xs_list)).reset_index()
+    results = results[
+        [
+            "CrossSection",
+            "BankFullOutput",
+            "LeftOutput",
+            "RightOutput",
+            "CountatBankFull",
+        ]
+    ].rename(
+        columns={
+            "BankFullOutput": "BankFull",
+            "LeftOutput": "BankLeft",
+            "RightOutput": "BankRight",
+            "CountatBankFull": "CountAtBankFull",
+        }
+    )
+    output = output.merge(
+        results,
+        how="left",
+        left_on="x_sec_id",
+        right_on="CrossSection",
+        validate="many_to_one",
+    ).drop(columns="CrossSection")
+    # set true if between left and right boundaries ; XS without results are never in the river and have a count of 0
+    output.insert(
+        output.columns.get_loc("BankFull"),
+        "InRiver",
+        (output["Distance"] > output["BankLeft"])
+        & (output["Distance"] < output["BankRight"]),
+    )
+    output["CountAtBankFull"] = output["CountAtBankFull"].fillna(0).astype(int)
     return output
 
 
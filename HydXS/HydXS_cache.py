@@ -0,0 +1,238 @@
+###############################################################################################################################
+#
+# HydXS_cache.py
+#
+# persistent, content-addressed cache of the mainFun intermediates (see BankFullDetection_NEW.py), so reruns of a survey,
+# or runs with other minVdep / maxrun / nruns, don't recompute identical cross sections
+#   stage curve : depth grid + HydDept / HydRad curves (+ depth weights of an adaptive grid), keyed by the (Distance, Z) points
+#                 of the trimmed XS, nVsteps, allow_multichannel, geometry, the HydXS version, the stage_grid if not uniform
+#                 and cap_at_crest if set
+#   spline      : candidate bankfull depths / hydraulic depths, spar and fitted values of one smoothing, keyed by the curve,
+#                 the smoother (and its version : the scipy version and a hash of spline_scipy.py, or a hash of the R script)
+#                 and the CV fold seed ; only cached with a seed (unseeded runs are random)
+#
+# each entry is one .npz file named by the sha256 of its key, written to a temporary file and moved into place with os.replace,
+# so several processes can share a cache directory ; reading an entry refreshes its modification time, and when the cache grows
+# over max_bytes the least recently used entries (oldest modification time) are removed, down to LOW_WATER * max_bytes so one
+# directory scan makes room for many writes ; an entry that can't be read (eg. truncated by a full disk) is a miss, and is
+# removed
+#
+# INPUT: cache directory ; max_bytes = size limit of the cache (default 1 GiB)
+# OUTPUT: StageCache, passed to mainFun / HydXS_run as cache=...
+#
+# example:
+#    cache = StageCache("model_outputs/cache/")
+#    XSdata3 = HydXS_run( XSdata2, xs_list, num_runs=nruns, smoother="scipy", seed=1, cache=cache )
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import contextlib
+import functools
+import hashlib
+import os
+import tempfile
+import zipfile
+from importlib.metadata import version
+from pathlib import Path
+
+import numpy as np
+
+from .BankFullDetection_NEW import StageCurve, stage_curve
+from .stage_geometry import profile_array
+
+# bump when the layout of the cached entries changes
+CACHE_FORMAT = 1
+# fraction of max_bytes the cache is trimmed down to once it goes over max_bytes
+LOW_WATER = 0.9
+
+
+class StageCache:
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.version = version("HydXS")
+        # running estimate of the cache size, from a directory scan on the first write
+        self._size = None
+
+    # stage curve of a XS, as BankFullDetection_NEW.stage_curve
+    def stage_curve(
+        self,
+        pointList,
+        nVsteps=200,
+        allow_multichannel=False,
+        geometry="shapely",
+        stage_grid="uniform",
+        cap_at_crest=False,
+    ):
+        profile = profile_array(pointList)
+        parts = ["curve", profile, nVsteps, allow_multichannel, geometry, self.version]
+        if stage_grid != "uniform":
+            parts.append(stage_grid)
+        if cap_at_crest:
+            parts.append("cap_at_crest")
+        key = self.key(*parts)
+        entry = self.get(key)
+        if entry is not None:
+            return StageCurve(
+                entry["profile"],
+                entry["depts"],
+                entry["HydDept"],
+                entry["HydRad"],
+                entry.get("weights"),
+            )
+        curve = stage_curve(
+            pointList, nVsteps, allow_multichannel, geometry, stage_grid, cap_at_crest
+        )
+        self.put(key, {name: v for name, v in curve._asdict().items() if v is not None})
+        return curve
+
+    # smoothing of a stage curve, as splineR(depts, HydDept, seed=seed) ; splineR is the backend given by get_smoother(smoother)
+    # w : weights of the depths (adaptive depth grid), None for the uniform grid
+    def spline(self, splineR, smoother, depts, HydDept, seed, w=None):
+        parts = [
+            "spline",
+            np.asarray(depts, dtype=float),
+            np.asarray(HydDept, dtype=float),
+            smoother,
+            smoother_version(smoother),
+            seed,
+            self.version,
+        ]
+        weighting = {}
+        if w is not None:
+            parts.append(np.asarray(w, dtype=float))
+            weighting["w"] = w
+        key = self.key(*parts)
+        entry = self.get(key)
+        if entry is not None:
+            return (
+                from_array(entry, "deptsLM"),
+                from_array(entry, "HydDeptLM"),
+                from_array(entry, "spar")[0],
+                from_array(entry, "fit"),
+            )
+        deptsLM, HydDeptLM, spar, fit = splineR(depts, HydDept, seed=seed, **weighting)
+        entry = {}
+        to_array(entry, "deptsLM", deptsLM)
+        to_array(entry, "HydDeptLM", HydDeptLM)
+        to_array(entry, "spar", [spar])
+        to_array(entry, "fit", fit)
+        self.put(key, entry)
+        return deptsLM, HydDeptLM, spar, fit
+
+    # sha256 of the parts of a key ; arrays by their bytes, anything else by its repr
+    def key(self, *parts):
+        digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                digest.update(str(part.shape).encode())
+                digest.update(np.ascontiguousarray(part).tobytes())
+            else:
+                digest.update(repr(part).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return self.directory / key[:2] / (key + ".npz")
+
+    # entry as a dictionary of arrays, or None if it isn't cached (or can't be read, the entry is then removed)
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+            with contextlib.suppress(OSError):
+                path.unlink()
+            return None
+        return arrays
+
+    def put(self, key, arrays):
+        path = self.path(key)
+        path.parent.mkdir(exist_ok=True)
+        handle, temp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as f:
+                np.savez(f, **arrays)
+            # size of the entry this one replaces, if the key was already cached
+            try:
+                replaced = path.stat().st_size
+            except OSError:
+                replaced = 0
+            os.replace(temp, path)
+        except BaseException:
+            Path(temp).unlink(missing_ok=True)
+            raise
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self.entries())
+        else:
+            self._size += path.stat().st_size - replaced
+        if self._size > self.max_bytes:
+            self.evict(LOW_WATER * self.max_bytes)
+
+    # (path, size, modification time) of every entry
+    def entries(self):
+        entries = []
+        for path in self.directory.glob("*/*.npz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    # remove the least recently used entries until the cache is within target bytes (max_bytes by default)
+    def evict(self, target=None):
+        if target is None:
+            target = self.max_bytes
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        size = sum(entry[1] for entry in entries)
+        for path, entry_size, _ in entries:
+            if size <= target:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+        self._size = size
+
+
+# end StageCache
+
+
+# version of the smoothing backend, part of the spline keys ; with a hash of the backend's code (spline_scipy.py, or the R
+# script), so changes to it aren't hidden
+@functools.lru_cache
+def smoother_version(smoother):
+    if smoother == "scipy":
+        import scipy
+
+        from . import spline_scipy
+
+        source = Path(spline_scipy.__file__).read_bytes()
+        return "scipy " + scipy.__version__ + " " + hashlib.sha256(source).hexdigest()
+    elif smoother == "R":
+        from .spline_withR_NEW import R_SOURCE
+
+        return "R " + hashlib.sha256(R_SOURCE.encode()).hexdigest()
+    return smoother
+
+
+# lists from the spline backends may hold None (failed fits) : stored as NaN, with a mask of where the Nones were
+def to_array(entry, name, values):
+    values = list(values)
+    entry[name + "_none"] = np.array([v is None for v in values], dtype=bool)
+    entry[name] = np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+def from_array(entry, name):
+    return [
+        None if none else value
+        for value, none in zip(entry[name].tolist(), entry[name + "_none"].tolist())
+    ]
+
+
+# end from_array
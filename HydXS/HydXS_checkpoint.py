@@ -0,0 +1,164 @@
+###############################################################################################################################
+#
+# HydXS_checkpoint.py
+#
+# durable store of the Bankfull calc results, one row per (XS, run), so a long HydXS_run can be killed and resumed
+# a SQLite file under out_data_path ; each result is written as soon as it is computed, and committed at least every
+# "commit_every" seconds (and when the run finishes), so a crash loses at most those last seconds of work
+#
+# the store holds a fingerprint of the model settings (checkpoint_fingerprint) ; resuming a store made with other settings
+# raises ValueError instead of mixing results
+# each result is stored with the fingerprint of its XS's pre-processed points (xs_fingerprints in HydXS_incremental.py, without
+# settings) ; only the results of XSs whose points are the same are resumed, so a resume can add, drop or change XSs, and the
+# number of runs isn't part of either fingerprint : resuming with more runs or XSs only computes the new ones
+#
+# INPUT: path of the SQLite file, fingerprint, xs_fingerprints = {XS: fingerprint} of the XSs to be run (more can be added
+#        with store.add_xs_fingerprints, eg. a chunk at a time), resume = True to keep the results already in the file
+# OUTPUT: CheckpointStore ; store.results(xs_list) = {(XS, run): row} already done, store.add(row) = record a new result
+#         where row = (XS, run, BankFull, LeftDistance, RightDistance, nChannels, spar, runs), as RunResults.add
+#
+# example:
+#    store = CheckpointStore(
+#        out_data_path / "HydXS_checkpoint.sqlite", checkpoint_fingerprint(seed=1), xs_fingerprints(XSdata2), resume=True
+#    )
+#    XSdata3 = HydXS_run( XSdata2, xs_list, num_runs=nruns, seed=1, checkpoint=store )
+#    store.close()
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import hashlib
+import json
+import sqlite3
+import time
+
+import numpy as np
+
+# XSs looked up in one query by results()
+QUERY_BATCH = 500
+
+
+# fingerprint of the model settings -------------------------------------------------------------------------------------------
+# settings : keyword arguments, any JSON-able values (eg. steps=200, seed=1) ; the points are checked XS by XS (see above)
+def checkpoint_fingerprint(**settings):
+    return hashlib.sha256(
+        json.dumps(settings, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+# end checkpoint_fingerprint
+
+
+class CheckpointStore:
+    columns = (
+        "CrossSection",
+        "run",
+        "BankFull",
+        "LeftDistance",
+        "RightDistance",
+        "nChannels",
+        "spar",
+        "runs",
+    )
+
+    def __init__(
+        self, path, fingerprint, xs_fingerprints=None, resume=False, commit_every=1.0
+    ):
+        self.path = path
+        self.commit_every = commit_every
+        self.xs_fingerprints = {}
+        if xs_fingerprints is not None:
+            self.add_xs_fingerprints(xs_fingerprints)
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        stored = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'fingerprint'"
+        ).fetchone()
+        if resume and stored is not None and stored[0] != fingerprint:
+            self.connection.close()
+            raise ValueError(
+                "checkpoint "
+                + str(path)
+                + " was made with different settings, it can't be resumed"
+            )
+        # results of an earlier version of the store, without the XS fingerprints
+        columns = self.connection.execute("PRAGMA table_info(results)").fetchall()
+        if columns and "Fingerprint" not in [c[1] for c in columns]:
+            self.connection.execute("DROP TABLE results")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "CrossSection INTEGER, run INTEGER, BankFull REAL, LeftDistance REAL, RightDistance REAL, "
+            "nChannels TEXT, spar REAL, runs INTEGER, Fingerprint TEXT, PRIMARY KEY (CrossSection, run))"
+        )
+        if not resume:
+            self.connection.execute("DELETE FROM results")
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,)
+        )
+        self.connection.commit()
+        self.last_commit = time.monotonic()
+
+    # fingerprints of the pre-processed points of more XSs, {XS: fingerprint} (or a Series, as xs_fingerprints)
+    def add_xs_fingerprints(self, xs_fingerprints):
+        self.xs_fingerprints.update(dict(xs_fingerprints.items()))
+
+    # results already in the store of the XSs of xs_list (all XSs if None), {(XS, run): row} ; only the results stored with
+    # the XS's current fingerprint, the others were computed on other points
+    def results(self, xs_list=None):
+        select = "SELECT " + ", ".join(self.columns) + ", Fingerprint FROM results"
+        if xs_list is None:
+            rows = self.connection.execute(select).fetchall()
+        else:
+            xs_list = [int(i) for i in xs_list]
+            rows = []
+            for k in range(0, len(xs_list), QUERY_BATCH):
+                batch = xs_list[k : k + QUERY_BATCH]
+                rows += self.connection.execute(
+                    select
+                    + " WHERE CrossSection IN ("
+                    + ", ".join("?" * len(batch))
+                    + ")",
+                    batch,
+                ).fetchall()
+        return {
+            (row[0], row[1]): row[:-1]
+            for row in rows
+            if row[-1] is not None and self.xs_fingerprints.get(row[0]) == row[-1]
+        }
+
+    # record one result ; NaN is stored as NULL, and read back as None
+    def add(self, row):
+        row = tuple(
+            None if isinstance(v, float) and np.isnan(v) else v
+            for v in (
+                int(row[0]),
+                int(row[1]),
+                float(row[2]),
+                float(row[3]),
+                float(row[4]),
+                row[5],
+                float(row[6]),
+                int(row[7]),
+            )
+        )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            row + (self.xs_fingerprints.get(row[0]),),
+        )
+        if time.monotonic() - self.last_commit >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.last_commit = time.monotonic()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+# end CheckpointStore
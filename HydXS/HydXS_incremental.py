@@ -0,0 +1,87 @@
+###############################################################################################################################
+#
+# HydXS_incremental.py
+#
+# incremental re-survey : when an updated survey only changes some cross sections, only those are run again and the results of
+# the others are taken from the previous run's final results
+#
+# every XS gets a fingerprint (xs_fingerprints) : a hash of its pre-processed points (x_sec_id, x_sec_order, POINT_Z, Distance,
+# inXS), combined with the model settings ; run_hydxs adds it to the final results as the "Fingerprint" column
+# a XS is recomputed if it is new, or if its fingerprint is not the same as in the previous results (its points changed, or the
+# pre-processing / model settings did) ; previous results without a Fingerprint column are all recomputed
+#
+# INPUT: pre-processed dataframe (preprocess_cross_section) ; previous final results (dataframe or path to the CSV)
+# OUTPUT: xs_fingerprints = Series of fingerprints (16 hex digits) indexed by XS identity
+#         changed_xs = XSs of xs_list to run again ; merge_results = previous rows of the other XSs + new rows, in xs_list order
+#
+# example:
+#    XSdata4, XSdata2 = run_hydxs("survey_2024_06.csv", seed=1, previous="model_outputs/survey_2024_05_final_results.csv")
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .HydXS_io import read_points, input_type_of
+
+
+# fingerprint of each XS ------------------------------------------------------------------------------------------------------
+# the row hashes of a XS are summed (so it is one pass over the table), x_sec_order being part of each row hash ;
+# settings : keyword arguments, any JSON-able values (eg. nVsteps=200, seed=1)
+def xs_fingerprints(data, **settings):
+    columns = ["x_sec_id", "x_sec_order", "POINT_Z", "Distance", "inXS"]
+    rows = pd.util.hash_pandas_object(data[columns], index=False)
+    per_xs = rows.groupby(data["x_sec_id"].to_numpy(), sort=False).sum()
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode())
+    salt = np.uint64(int.from_bytes(digest.digest()[:8], "little"))
+    hashes = per_xs.to_numpy(dtype=np.uint64) ^ salt
+    return pd.Series(
+        [format(h, "016x") for h in hashes.tolist()],
+        index=per_xs.index,
+        name="Fingerprint",
+    )
+
+
+# end xs_fingerprints
+
+
+# previous final results, from a dataframe or the path of the CSV / Parquet / Feather file written by the CLI
+def read_previous(previous):
+    if isinstance(previous, (str, Path)) and input_type_of(previous) == "CSV":
+        return pd.read_csv(previous, dtype={"Fingerprint": str})
+    elif isinstance(previous, (str, Path)):
+        return read_points(previous)
+    return previous
+
+
+# XSs of xs_list that have to be run again : not in the previous results, or with another fingerprint --------------------------
+def changed_xs(xs_list, fingerprints, previous):
+    if "Fingerprint" not in previous.columns:
+        return list(xs_list)
+    before = dict(zip(previous["CrossSection"], previous["Fingerprint"]))
+    return [i for i in xs_list if before.get(i) != fingerprints.get(i)]
+
+
+# end changed_xs
+
+
+# final results of the recomputed XSs (new) and the previous results of the others, in xs_list order ---------------------------
+# XSs that are not in xs_list any more are left out
+def merge_results(previous, new, xs_list):
+    position = {i: k for k, i in enumerate(xs_list)}
+    kept = previous[
+        previous["CrossSection"].isin(position)
+        & ~previous["CrossSection"].isin(new["CrossSection"])
+    ]
+    merged = pd.concat([kept, new], ignore_index=True)
+    order = np.argsort(merged["CrossSection"].map(position).to_numpy(), kind="stable")
+    return merged.iloc[order].reset_index(drop=True)
+
+
+# end merge_results
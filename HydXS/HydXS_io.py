@@ -0,0 +1,104 @@
+###############################################################################################################################
+#
+# HydXS_io.py
+#
+# reading cross section points from, and writing results to, CSV / Parquet / Feather (Arrow IPC) files, and GIS files for input
+# used in run_hydxs, wrangle_cross_section and the hydxs CLI
+#
+# only the columns HydXS uses are read (column projection), and the file's own column types are kept, so wrangle_cross_section
+# only converts (pd.to_numeric) columns that aren't numeric already ; Parquet / Feather need pyarrow ; GIS files are read whole,
+# then cut down to the columns (and the geometry column)
+#
+# INPUT: path ; input_type = "CSV" / "PARQUET" / "FEATHER" / "GIS", or None to go by the file extension ; columns = names to read
+# OUTPUT: read_points = DataFrame (GeoDataFrame for GIS) ; write_table writes a dataframe as "csv" / "parquet" / "feather"
+#
+# example:
+#    points = read_points("survey.parquet", columns=["x_sec_id", "x_sec_order", "POINT_X", "POINT_Y", "POINT_Z", "RivCentre"])
+#    path = write_table(results, "model_outputs/survey_final_results", "parquet")
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+from pathlib import Path
+
+import pandas as pd
+
+# input type of each file extension
+INPUT_TYPES = {
+    ".csv": "CSV",
+    ".parquet": "PARQUET",
+    ".pq": "PARQUET",
+    ".feather": "FEATHER",
+    ".arrow": "FEATHER",
+    ".shp": "GIS",
+    ".gpkg": "GIS",
+    ".geojson": "GIS",
+}
+FILE_INPUT_TYPES = ("CSV", "PARQUET", "FEATHER", "GIS")
+OUTPUT_FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+
+# input type of a file, from its extension ; raises ValueError for an unknown extension
+def input_type_of(path):
+    suffix = Path(path).suffix.lower()
+    if suffix not in INPUT_TYPES:
+        raise ValueError(
+            "can't tell the input type of "
+            + str(path)
+            + " ; use one of "
+            + ", ".join(INPUT_TYPES)
+        )
+    return INPUT_TYPES[suffix]
+
+
+# names of the columns HydXS reads : xy_col is the (X, Y) column names, or the name of the geometry column of GIS input
+def point_columns(xy_col, z_col, xs_id_col, xs_order_col, riv_centre):
+    xy = [xy_col] if isinstance(xy_col, str) else list(xy_col)
+    return [*xy, z_col, xs_id_col, xs_order_col, riv_centre]
+
+
+# points of a survey file ----------------------------------------------------------------------------------------------------
+# columns = None reads every column ; GIS files are read whole, as a GeoDataFrame, and then cut down to the columns, keeping
+# the geometry column
+def read_points(path, input_type=None, columns=None):
+    if input_type is None:
+        input_type = input_type_of(path)
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+    if input_type == "CSV":
+        return pd.read_csv(path, usecols=columns)
+    elif input_type == "PARQUET":
+        return pd.read_parquet(path, columns=columns)
+    elif input_type == "FEATHER":
+        return pd.read_feather(path, columns=columns)
+    elif input_type == "GIS":
+        import geopandas as gpd
+
+        data = gpd.read_file(path)
+        if columns is None:
+            return data
+        geometry = data.geometry.name
+        return data[[c for c in columns if c != geometry] + [geometry]]
+    raise ValueError("input_type must be one of " + ", ".join(FILE_INPUT_TYPES))
+
+
+# end read_points
+
+
+# write a table (eg. the final results) ---------------------------------------------------------------------------------------
+# path without extension, the extension of output_format is added ; returns the path written
+def write_table(data, path, output_format="csv"):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("output_format must be one of " + ", ".join(OUTPUT_FORMATS))
+    path = Path(str(path) + OUTPUT_FORMATS[output_format])
+    if output_format == "csv":
+        data.to_csv(path, index=False)
+    elif output_format == "parquet":
+        data.to_parquet(path, index=False)
+    else:
+        data.reset_index(drop=True).to_feather(path)
+    return path
+
+
+# end write_table
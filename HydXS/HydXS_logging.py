@@ -0,0 +1,165 @@
+###############################################################################################################################
+#
+# HydXS_logging.py
+#
+# messages and progress of a HydXS run, through the standard logging package instead of print
+#   every module logs to logging.getLogger(__name__), ie. a child of the "HydXS" logger ; configure_logging sends the "HydXS"
+#   messages to stderr at the given level (the CLI calls it, with --log-level / --quiet) ; if it isn't called, logging's own
+#   defaults apply (warnings and errors only, on stderr)
+#   Progress : progress of a long loop (XSs, or XS runs) at INFO level, at most one line every PROGRESS_INTERVAL seconds, with a
+#   text bar, the throughput and the estimated time left ; nothing is formatted when INFO isn't enabled (eg. quiet)
+#   worker processes (HydXS_pool in HydXS_modelling.py) send their records through a queue to the main process, where a
+#   listener thread hands them to the "HydXS" loggers there, so all messages come out on one stream
+#
+# INPUT: level ("DEBUG", "INFO", "WARNING" ...) ; quiet = True for warnings and errors only
+# OUTPUT: the "HydXS" logger, configured
+#
+# example:
+#    configure_logging("INFO")
+#    with Progress(len(xs_list), "stage curves", unit="XS") as progress:
+#        for i in xs_list:
+#            ...
+#            progress.update()
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import contextlib
+import logging
+import logging.handlers
+import sys
+import time
+
+# shortest time between two progress lines, in seconds
+PROGRESS_INTERVAL = 5.0
+BAR_WIDTH = 20
+FORMAT = "%(asctime)s HydXS %(levelname)s: %(message)s"
+
+logger = logging.getLogger("HydXS")
+# handler added by configure_logging, replaced when it is called again
+_HANDLER = None
+
+
+# send the HydXS messages at or above level to stream (stderr by default) ; quiet = warnings and errors only -----------------------
+def configure_logging(level="INFO", quiet=False, stream=None):
+    global _HANDLER
+    if _HANDLER is not None:
+        logger.removeHandler(_HANDLER)
+    _HANDLER = logging.StreamHandler(sys.stderr if stream is None else stream)
+    _HANDLER.setFormatter(logging.Formatter(FORMAT))
+    logger.addHandler(_HANDLER)
+    logger.setLevel(logging.WARNING if quiet else level)
+    logger.propagate = False
+    return logger
+
+
+# end configure_logging
+
+
+# progress of a loop over total items, logged at INFO level at most once every interval seconds ---------------------------------
+# total : number of items, or the most there can be (eg. adaptive ensemble runs) ; the line of the last update is always logged
+class Progress:
+    def __init__(self, total, name, unit="XS", interval=None, log=logger):
+        self.total = total
+        self.name = name
+        self.unit = unit
+        self.interval = PROGRESS_INTERVAL if interval is None else interval
+        self.log = log
+        self.enabled = log.isEnabledFor(logging.INFO)
+        self.done = 0
+        self.start = self.last = time.monotonic()
+
+    def update(self, n=1):
+        self.done += n
+        if self.enabled:
+            now = time.monotonic()
+            if now - self.last >= self.interval:
+                self.last = now
+                self.log.info(self.line(now))
+
+    # final line, with the total time and throughput
+    def close(self):
+        if self.enabled and self.done > 0:
+            elapsed = time.monotonic() - self.start
+            self.log.info(
+                "%s : %d %s in %s (%.1f %s/s)",
+                self.name,
+                self.done,
+                self.unit,
+                duration(elapsed),
+                self.done / max(elapsed, 1e-9),
+                self.unit,
+            )
+
+    def line(self, now):
+        elapsed = now - self.start
+        rate = self.done / max(elapsed, 1e-9)
+        share = min(self.done / self.total, 1) if self.total else 1
+        filled = int(round(share * BAR_WIDTH))
+        left = (self.total - self.done) / rate if rate > 0 else float("inf")
+        return "%s [%s%s] %d/%d %s (%.1f%%) %.1f %s/s, ETA %s" % (
+            self.name,
+            "#" * filled,
+            "-" * (BAR_WIDTH - filled),
+            self.done,
+            self.total,
+            self.unit,
+            100 * share,
+            rate,
+            self.unit,
+            duration(max(left, 0)),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# end Progress
+
+
+# seconds as eg. "42s", "3m05s", "2h07m"
+def duration(seconds):
+    if seconds == float("inf"):
+        return "?"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return "%ds" % seconds
+    if seconds < 3600:
+        return "%dm%02ds" % divmod(seconds, 60)
+    return "%dh%02dm" % (seconds // 3600, seconds % 3600 // 60)
+
+
+# worker process logging --------------------------------------------------------------------------------------------------------
+# queue for the records of the worker processes of a pool (context = multiprocessing context of the pool), passed to
+# worker_logging in each worker ; a listener thread hands them to the loggers of this process until the with block ends
+@contextlib.contextmanager
+def worker_log_queue(context):
+    queue = context.Queue()
+    listener = logging.handlers.QueueListener(queue, _Dispatch())
+    listener.start()
+    try:
+        yield queue
+    finally:
+        listener.stop()
+
+
+# in a worker process : send the HydXS records at or above level to the main process
+def worker_logging(queue, level):
+    logger.handlers[:] = [logging.handlers.QueueHandler(queue)]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+# hands a record from a worker to the logger of the same name here, so it is filtered and formatted as the main process's
+class _Dispatch(logging.Handler):
+    def emit(self, record):
+        log = logging.getLogger(record.name)
+        if log.isEnabledFor(record.levelno):
+            log.handle(record)
+
+
+# end worker logging
@@ -23,16 +23,35 @@
 #   print(HydXS1)
 #  the output will be the printed values and a graph
 #
+# workers > 1 spreads the (XS, run) calculations over a process pool ; with a fixed seed the output is identical to workers=1
+#     XSdata3 = HydXS_run( XSdata2, xs_list, num_runs=nruns, smoother="scipy", seed=42, workers=8 )
+#
 ###############################################################################################################################
 
 
 # importing libraries etc  ----------------------------------------------------------------------------------------------------
+import contextlib
+import logging
+import multiprocessing
+import time
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # specific library name  -----------------------------------------------------------------------------------------------------
 from .BankFullDetection_NEW import mainFun as HydXS
+from .BankFullDetection_NEW import stage_curve
+from .BankFullDetection_NEW import get_smoother
+from .BankFullDetection_NEW import NoAdmissibleStageRange
+from .xs_index import XSIndex
+from .xs_ragged import RaggedXS
+from .xs_archive import ArchiveProfile
+from .HydXS_output import ensemble_settled
+from . import HydXS_profiling
+from .HydXS_logging import Progress, worker_log_queue, worker_logging
+
+logger = logging.getLogger(__name__)
 
 
 # multiple runs of AMENDED Russell-MDAP HydXS Bankfull calculation , over single/multiple XSs---------------------------------
@@ -43,12 +62,34 @@ from .BankFullDetection_NEW import mainFun as HydXS
 #   num_runs : how many times to run the Bankfull calculation per XS ; to assess variability due to spar differences
 #   boundary = False for AMENDED Russell-MDAP ; ie. does not permit bankfull that hits boundaries
 #   maxrun = how many times to try a single XS calc if bankfull hits boundaries
+#   smoother = "R" (rpy2, original) or "scipy" (no R needed) ; passed to mainFun in BankFullDetection_NEW.py
+#   geometry = "shapely" (original) or "analytic" ; how the hydraulic depth curve is computed in BankFullDetection_NEW.py
+#   stage_grid = "uniform" (steps evenly spaced depths, original) or "adaptive" (a coarse sweep refined around the turning points
+#      and bends of the hydraulic depth curve, see stage_sampling.py ; the depths are weighted in the spline smoothing)
+#   cap_at_crest = True to end the depth grid, and so the bankfull search, below the lower bank crest (see stage_curve in
+#      BankFullDetection_NEW.py) ; a XS with no depth below it gets no bankfull and runs = 98, without boundary retries
+# the hydraulic depth curve of each XS is computed once (HydXS_stage_curves) and reused by every run and boundary retry,
+# only the spline smoothing / bankfull selection is repeated
+#   seed = None (random, as original) or an integer ; each (XS, run, retry) then gets its own reproducible seed (xs_seed)
+#   workers = number of processes ; > 1 spreads all (XS, run) calculations over a process pool, results in XS/run order
+#   xs_index = XSIndex of the inXS points of "data" (see xs_index.py / model_xs_index) ; built here if not given
+#   checkpoint = None or a CheckpointStore (see HydXS_checkpoint.py) ; every (XS, run) result is recorded in it as it is computed,
+#      and the results already in it are reused instead of computed again (a XS with all its runs done isn't even prepared)
+#   cache = None or a StageCache (see HydXS_cache.py) ; stage curves, and seeded spline smoothings, are reused across runs on disk
+#   archive = None or an XSArchive (see xs_archive.py) ; the XSs are read from it (memory-mapped, also in the worker processes)
+#      instead of from data, which may then be None
+#   adaptive = True for an adaptive ensemble : runs are done one at a time, and after min_runs runs a XS gets no more runs once
+#      its calcoutputs mode criterion (2/3 of the runs within 5cm of the mode) is settled either way at the given confidence
+#      (see ensemble_settled in HydXS_output.py), or once a run fails ; num_runs is the most runs a XS gets
+#      the output then has an "n_members" column, the number of runs done for each XS (the later run columns are empty)
+#      with a seed, the runs done are the same as the first n_members runs of a full ensemble
 # OUTPUT:
 #   dataframe and .csv PER run, with one row per XS
 #       CrossSection / BankFull / LeftDistance / RightDistance / nChannels / spar / runs
 #   AND single .csv for ALL runs, with one row per XS and 3 columns per run (n)
 #       CrossSection / BankFull(n) / LeftDistance(n) / RightDistance(n)
 # results are then combined and exported into csv using HydXS_output.py
+# the results of all runs are collected in one RunResults (long format) and turned into the wide layout once, by HydXS_wide
 def HydXS_run(
     data,
     xs_list,
@@ -58,149 +99,630 @@ def HydXS_run(
     maxrun=3,
     steps=200,
     minV=0.1,
+    smoother="R",
+    geometry="shapely",
+    seed=None,
+    workers=1,
+    xs_index=None,
+    checkpoint=None,
+    cache=None,
+    archive=None,
+    adaptive=False,
+    min_runs=3,
+    confidence=0.8,
+    stage_grid="uniform",
+    cap_at_crest=False,
 ):
-    for k in range(1, num_runs + 1):
-        print("run: ", k)
-        # variable names
-        run_name = "run_" + str(k)
-        # csv_name = output_path / ("HydXS_run" + str(k) + ".csv")
-        bankfull_name = "bankfull_" + str(k)
-        left_name = "left_" + str(k)
-        right_name = "right_" + str(k)
-        # individual run
-        model = HydXS_perXS(
-            data, xs_list, allow_boundary=boundary, maxrun=maxrun, steps=steps, minV=minV
+    # (XS, run) results already in the checkpoint are not computed again
+    done = {} if checkpoint is None else checkpoint.results(xs_list)
+    all_runs = range(1, num_runs + 1)
+    done_xs = {i for i in xs_list if all((i, k) in done for k in all_runs)}
+    with HydXS_profiling.stage("stage_curves"):
+        xs_inputs = HydXS_inputs(
+            data,
+            [i for i in xs_list if i not in done_xs],
+            steps=steps,
+            geometry=geometry,
+            xs_index=xs_index,
+            cache=cache,
+            archive=archive,
+            stage_grid=stage_grid,
+            cap_at_crest=cap_at_crest,
         )
-        dtemp = pd.DataFrame(model)
-        dtemp[bankfull_name] = round(dtemp.BankFull, 2)
-        dtemp[left_name] = round(dtemp.LeftDistance, 2)
-        dtemp[right_name] = round(dtemp.RightDistance, 2)
-        # dtemp.to_csv(csv_name, index=False)
-        dtemp = dtemp.drop(
-            columns=[
-                "BankFull",
-                "LeftDistance",
-                "RightDistance",
-                "runs",
-                "spar",
-                "nChannels",
-            ]
+    inputs = {xs_input[0]: xs_input for xs_input in xs_inputs}
+    xs_ids = [i for i in xs_list if i in inputs or i in done_xs]
+    settings = dict(
+        allow_boundary=boundary,
+        maxrun=maxrun,
+        steps=steps,
+        minV=minV,
+        smoother=smoother,
+        geometry=geometry,
+        seed=seed,
+        cache=cache,
+        stage_grid=stage_grid,
+        cap_at_crest=cap_at_crest,
+    )
+    output = RunResults(num_runs * len(xs_ids))
+    # XS runs to compute (not in the checkpoint) ; the most there can be with an adaptive ensemble
+    todo = sum((i, k) not in done for i in xs_ids for k in all_runs)
+    progress = Progress(todo, "model runs", unit="XS runs")
+
+    # results of the (run, XS) pairs in batch, in that order, added to output ; from the checkpoint, or computed
+    def add_results(batch, pool=None):
+        tasks = [(inputs[i], k, settings) for k, i in batch if (i, k) not in done]
+        task_results = HydXS_results(
+            tasks, workers=workers, smoother=smoother, pool=pool
         )
-        # group datasets/runs together
-        if k == 1:
-            results = dtemp
-        else:
-            results = results.join(dtemp.set_index("CrossSection"), on="CrossSection")
-    results = results.astype({"CrossSection": int}).reset_index()
-    return results
+        with HydXS_profiling.stage("model_runs"):
+            for k, i in batch:
+                if (i, k) in done:
+                    output.add(*done[(i, k)])
+                    HydXS_profiling.count("checkpoint_results")
+                    continue
+                HydXS_output(output, i, *next(task_results), run=k)
+                if checkpoint is not None:
+                    checkpoint.add(output.row(output.size - 1))
+                progress.update()
+
+    if not adaptive:
+        # all runs together, in long format (one row per XS and run), in run / xs_list order
+        with progress:
+            add_results([(k, i) for k in all_runs for i in xs_ids])
+        log_failures(output)
+        # csv_name = output_path / "HydXS_runs.csv"
+        # output.frame().to_csv(csv_name, index=False)
+        return HydXS_wide(output.frame(), num_runs)
+
+    # adaptive ensemble : one run at a time, for the XSs that aren't settled yet
+    bank = np.full((len(xs_ids), num_runs), np.nan)
+    n_members = np.zeros(len(xs_ids), dtype=int)
+    active = np.arange(len(xs_ids))
+    with progress, HydXS_pool(workers, smoother) as pool:
+        for k in all_runs:
+            start = output.size
+            add_results([(k, xs_ids[m]) for m in active], pool=pool)
+            bank[active, k - 1] = np.round(output.BankFull[start : output.size], 2)
+            n_members[active] = k
+            if k >= min_runs:
+                active = active[
+                    ~ensemble_settled(bank[active, :k], confidence=confidence)
+                ]
+            if len(active) == 0:
+                break
+    log_failures(output)
+    logger.info(
+        "adaptive ensemble : %d XS runs of at most %d",
+        output.size,
+        num_runs * len(xs_ids),
+    )
+    wide = HydXS_wide(output.frame(), num_runs)
+    wide["n_members"] = wide["CrossSection"].map(dict(zip(xs_ids, n_members)))
+    return wide
 
 
 ##end HydXS_run
 
 
+# number of XS runs without a bankfull (boundary hit after maxrun tries, no depth below the bank crest, or no smoothing)
+def log_failures(output):
+    failed = int(np.isnan(output.BankFull[: output.size]).sum())
+    if failed > 0:
+        logger.info("%d of %d XS runs without a bankfull", failed, output.size)
+
+
+# index of the points that go into the Bankfull calc (inXS == True), one contiguous block per XS ------------------------------
+# used in "HydXS_stage_curves", "HydXS_inputs" and "run_hydxs"
+def model_xs_index(data):
+    return XSIndex(data, mask=data["inXS"] == True)
+
+
+# end model_xs_index
+
+
+# hydraulic depth curve per XS, computed once ----------------------------------------------------------------------------------
+# used in "HydXS_inputs" below
+# OUTPUT : dictionary of XS identity -> StageCurve (see BankFullDetection_NEW.py)
+#    a XS whose curve can't be computed is left out, so mainFun recomputes it and the failure is handled as before
+def HydXS_stage_curves(
+    data,
+    xs_list,
+    steps=200,
+    geometry="shapely",
+    xs_index=None,
+    cache=None,
+    ragged=None,
+    stage_grid="uniform",
+    cap_at_crest=False,
+):
+    if ragged is None:
+        ragged = RaggedXS(model_xs_index(data) if xs_index is None else xs_index)
+    curves = {}
+    progress = Progress(len(xs_list), "stage curves", unit="XS")
+    for i in xs_list:
+        progress.update()
+        profile = ragged.profile(i)
+        if len(profile) == 0:
+            continue
+        start = time.perf_counter()
+        try:
+            if cache is None:
+                curves[i] = stage_curve(
+                    profile,
+                    nVsteps=steps,
+                    geometry=geometry,
+                    stage_grid=stage_grid,
+                    cap_at_crest=cap_at_crest,
+                )
+            else:
+                curves[i] = cache.stage_curve(
+                    profile,
+                    nVsteps=steps,
+                    geometry=geometry,
+                    stage_grid=stage_grid,
+                    cap_at_crest=cap_at_crest,
+                )
+        except Exception:
+            HydXS_profiling.count("stage_curve_failures")
+        HydXS_profiling.observe("xs_stage_curve_seconds", time.perf_counter() - start)
+    progress.close()
+    return curves
+
+
+# end HydXS_stage_curves
+
+
+# everything the Bankfull calc needs for each XS, gathered once ------------------------------------------------------------------
+# used in "HydXS_run" and "HydXS_perXS"
+# OUTPUT : list of (XS identity, DZ points, min Distance, max Distance, StageCurve or None), one per XS with data, in xs_list order
+#    the DZ points are the (n, 2) (Distance, Z) array of the XS, a slice of a RaggedXS (see xs_ragged.py), not shapely Points
+#    archive : XSArchive (see xs_archive.py) to take the XSs from instead of data ; the DZ points are then an ArchiveProfile
+#    reference, and the StageCurve is without its profile, so the tasks sent to worker processes don't carry the points
+def HydXS_inputs(
+    data,
+    xs_list,
+    steps=200,
+    geometry="shapely",
+    curves=None,
+    xs_index=None,
+    cache=None,
+    archive=None,
+    stage_grid="uniform",
+    cap_at_crest=False,
+):
+    if archive is not None:
+        ragged = archive
+    elif xs_index is None:
+        ragged = RaggedXS(model_xs_index(data))
+    else:
+        ragged = RaggedXS(xs_index)
+    if curves is None:
+        curves = HydXS_stage_curves(
+            data,
+            xs_list,
+            steps=steps,
+            geometry=geometry,
+            cache=cache,
+            ragged=ragged,
+            stage_grid=stage_grid,
+            cap_at_crest=cap_at_crest,
+        )
+    xs_inputs = []
+    for i in xs_list:
+        profile = ragged.profile(i)
+        curve = curves.get(i)
+        if len(profile) == 0:
+            continue
+        if archive is not None:
+            # the points are read from the archive where the calc runs (see HydXS_oneXS)
+            curve = None if curve is None else curve._replace(profile=None)
+            xs_inputs.append(
+                (
+                    i,
+                    ArchiveProfile(archive, i),
+                    float(profile[:, 0].min()),
+                    float(profile[:, 0].max()),
+                    curve,
+                )
+            )
+        else:
+            xs_inputs.append(
+                (
+                    i,
+                    profile,
+                    float(profile[:, 0].min()),
+                    float(profile[:, 0].max()),
+                    curve,
+                )
+            )
+    return xs_inputs
+
+
+# end HydXS_inputs
+
+
+# reproducible seed for the spline CV fold sampling of one (XS, run, retry) --------------------------------------------------------
+# None if no seed is given (R / NumPy draw their own random folds, as original)
+# derived from the seed and the identities only, so it doesn't depend on the order or process the calc runs in
+def xs_seed(seed, i, run, attempt):
+    if seed is None:
+        return None
+    state = np.random.SeedSequence([int(seed), int(i), int(run), int(attempt)])
+    return int(state.generate_state(1)[0] >> 1)  # < 2^31, valid for R set.seed
+
+
+# run the (XS, run) tasks, serially or over a process pool --------------------------------------------------------------------------
+# each task is (xs_input, run number, settings) for HydXS_task ; results are returned in task order
+# worker processes are started with "spawn" (rpy2 embeds R, which is not fork safe) and warm up their own smoothing backend
+def HydXS_execute(tasks, workers=1, smoother="R"):
+    return list(HydXS_results(tasks, workers=workers, smoother=smoother))
+
+
+# same, as a generator : each result is given as soon as it (and the ones before it) are done
+# pool : process pool from HydXS_pool, to reuse it over several batches of tasks ; None starts one for these tasks if workers > 1
+# when profiling (see HydXS_profiling.py), each worker task is recorded in a Profiler of its own, merged into the active one
+def HydXS_results(tasks, workers=1, smoother="R", pool=None):
+    if workers is None or workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield HydXS_task(task)
+        return
+    if pool is None:
+        with HydXS_pool(workers, smoother) as pool:
+            yield from HydXS_results(tasks, workers, smoother, pool)
+        return
+    chunksize = max(1, len(tasks) // (workers * 4))
+    profiler = HydXS_profiling.active_profiler()
+    if profiler is None:
+        yield from pool.map(HydXS_task, tasks, chunksize=chunksize)
+        return
+    for result, state in pool.map(HydXS_profiled_task, tasks, chunksize=chunksize):
+        profiler.merge(state)
+        yield result
+
+
+# process pool for HydXS_results, as a context manager ; None (no pool) if workers <= 1
+# the log records of the workers are sent to this process (see HydXS_logging.py), at the level of the HydXS logger here
+@contextlib.contextmanager
+def HydXS_pool(workers=1, smoother="R"):
+    if workers is None or workers <= 1:
+        yield None
+        return
+    context = multiprocessing.get_context("spawn")
+    level = logging.getLogger("HydXS").getEffectiveLevel()
+    with (
+        worker_log_queue(context) as log_queue,
+        ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=HydXS_worker_init,
+            initargs=(smoother, log_queue, level),
+        ) as pool,
+    ):
+        yield pool
+
+
+def HydXS_worker_init(smoother="R", log_queue=None, log_level=logging.WARNING):
+    if log_queue is not None:
+        worker_logging(log_queue, log_level)
+    get_smoother(smoother)
+    if smoother == "R":
+        from .spline_withR_NEW import warm_up
+
+        warm_up()
+
+
+# end HydXS_execute
+
+
+# Bankfull calc for a single XS in a single run, with retries when the bankfull hits the XS boundaries ----------------------------
+# used in "HydXS_run" and "HydXS_perXS", through HydXS_execute
+# INPUT : xs_input from HydXS_inputs, run number, and the HydXS_perXS settings
+# OUTPUT : var1, var2, var3, var4, var5, fig, spar, runs (as passed to HydXS_output)
+#    runs = 99 if the bankfull still hit a boundary after maxrun tries, 98 if the XS has no depth below its lower bank crest
+#    (cap_at_crest) ; no bankfull either way
+def HydXS_task(task):
+    xs_input, run, settings = task
+    return HydXS_oneXS(xs_input, run, **settings)
+
+
+# HydXS_task in a worker process, with the Profiler state of the task
+def HydXS_profiled_task(task):
+    with HydXS_profiling.profiling(HydXS_profiling.Profiler()) as profiler:
+        result = HydXS_task(task)
+    return result, profiler.state()
+
+
+def HydXS_oneXS(
+    xs_input,
+    run=1,
+    allow_boundary=False,
+    maxrun=3,
+    steps=200,
+    minV=0.1,
+    plot=False,
+    smoother="R",
+    geometry="shapely",
+    seed=None,
+    cache=None,
+    stage_grid="uniform",
+    cap_at_crest=False,
+):
+    i, dtemp, dist_min, dist_max, curve = xs_input
+    start = time.perf_counter()
+    if isinstance(dtemp, ArchiveProfile):
+        dtemp = dtemp.load()
+        curve = None if curve is None else curve._replace(profile=dtemp)
+    runs = 0
+    if allow_boundary:
+        try:
+            var1, var2, var3, var4, var5, fig, spar = HydXS(
+                dtemp,
+                nVsteps=steps,
+                minVdep=minV,
+                create_plot=plot,
+                geometry=geometry,
+                smoother=smoother,
+                curve=curve,
+                seed=xs_seed(seed, i, run, 1),
+                cache=cache,
+                stage_grid=stage_grid,
+                cap_at_crest=cap_at_crest,
+            )
+        except Exception as e:
+            if isinstance(e, NoAdmissibleStageRange):
+                runs = 98  # set for output trigger
+            else:
+                HydXS_profiling.count("errors")
+            var1, var2, var3, var4, var5, fig, spar = (
+                None,
+                None,
+                None,
+                None,
+                None,
+                "-",
+                None,
+            )
+    else:
+        var1 = dist_min
+        var2 = dist_max
+        while ((var1 == dist_min) or (var2 == dist_max)) and runs < maxrun:
+            runs = runs + 1
+            try:
+                var1, var2, var3, var4, var5, fig, spar = HydXS(
+                    dtemp,
+                    nVsteps=steps,
+                    minVdep=minV,
+                    create_plot=plot,
+                    geometry=geometry,
+                    smoother=smoother,
+                    curve=curve,
+                    seed=xs_seed(seed, i, run, runs),
+                    cache=cache,
+                    stage_grid=stage_grid,
+                    cap_at_crest=cap_at_crest,
+                )
+            except NoAdmissibleStageRange:
+                # no depth below the lower bank crest : every retry would hit the boundaries as well
+                var1, var2, var3, var4, var5, fig, spar = (None,) * 5 + ("-", None)
+                runs = 98  # set for output trigger
+                break
+            except Exception as e:
+                HydXS_profiling.count("errors")
+                var1, var2, var3, var4, var5, fig, spar = (
+                    var1,
+                    var2,
+                    None,
+                    None,
+                    None,
+                    "-",
+                    None,
+                )
+        if runs == maxrun and ((var1 == dist_min) or (var2 == dist_max)):
+            runs = 99  # set for output trigger
+    xs_run_counts(runs, maxrun, var4, allow_boundary)
+    HydXS_profiling.observe("xs_run_seconds", time.perf_counter() - start)
+    return var1, var2, var3, var4, var5, fig, spar, runs
+
+
+# counters of one XS run, for the active Profiler (see HydXS_profiling.py) : boundary retries, and failures (no bankfull),
+# of which boundary_failures (runs = 99) and no_admissible_range (runs = 98) ; the errors counter is of the other mainFun exceptions
+def xs_run_counts(runs, maxrun, bankfull, allow_boundary):
+    if HydXS_profiling.active_profiler() is None:
+        return
+    HydXS_profiling.count("xs_runs")
+    if not allow_boundary and runs != 98:
+        retries = maxrun - 1 if runs == 99 else runs - 1
+        HydXS_profiling.count("retries", retries)
+        HydXS_profiling.observe("retries", retries)
+    if bankfull is None or runs in (98, 99):
+        HydXS_profiling.count("failures")
+    if runs == 99:
+        HydXS_profiling.count("boundary_failures")
+    elif runs == 98:
+        HydXS_profiling.count("no_admissible_range")
+
+
+# end HydXS_task
+
+
 # single run of Bankfull calculation, over single/multiple XS------------------------------------------------------------------
 # can be run stand-alone
 # used in "HydXS_run" function above
 # this code tries "maxrun" number of times to get a BankFull calc that doesn't hit the left or right boundaries
+# curves : hydraulic depth curves from HydXS_stage_curves ; computed here (once per XS, not per retry) if not given
+# seed, run : the CV fold seeds are derived from (seed, XS, run, retry), see xs_seed ; workers, xs_index, cache, archive, stage_grid,
+# cap_at_crest : as in HydXS_run
 # INPUT : full dataframe from pre-processing step
 # OUTPUT : dataframe for all XSs in the single run, one row per XS
 #    CrossSection / BankFull / LeftDistance / RightDistance / nChannels / spar / runs
 def HydXS_perXS(
-    full_dataset, xs_list, allow_boundary=False, maxrun=3, steps=200, minV=0.1, plot=False
+    full_dataset,
+    xs_list,
+    allow_boundary=False,
+    maxrun=3,
+    steps=200,
+    minV=0.1,
+    plot=False,
+    smoother="R",
+    geometry="shapely",
+    curves=None,
+    seed=None,
+    run=1,
+    workers=1,
+    xs_index=None,
+    cache=None,
+    archive=None,
+    stage_grid="uniform",
+    cap_at_crest=False,
 ):
-    output = pd.DataFrame()
-    for i in xs_list:
-        print(i)
-        subset = full_dataset[
-            (full_dataset["x_sec_id"] == i) & (full_dataset["inXS"] == True)
-        ].reset_index()
-        if len(subset) == 0:
-            pass
-        else:
-            dtemp = list(subset.PointDZ)
-            runs = 0
-            if allow_boundary:
-                try:
-                    var1, var2, var3, var4, var5, fig, spar = HydXS(
-                        dtemp, nVsteps=steps, minVdep=minV, create_plot=plot
-                    )
-                except Exception as e:
-                    import pdb
-
-                    pdb.set_trace()
-                    var1, var2, var3, var4, var5, fig, spar = (
-                        None,
-                        None,
-                        None,
-                        None,
-                        None,
-                        "-",
-                        None,
-                    )
-            else:
-                var1 = min(subset["Distance"])
-                var2 = max(subset["Distance"])
-                while (
-                    (var1 == min(subset["Distance"]))
-                    or (var2 == max(subset["Distance"]))
-                ) and runs < maxrun:
-                    runs = runs + 1
-                    try:
-                        var1, var2, var3, var4, var5, fig, spar = HydXS(
-                            dtemp, nVsteps=steps, minVdep=minV, create_plot=plot
-                        )
-                    except Exception as e:
-
-                        var1, var2, var3, var4, var5, fig, spar = (
-                            var1,
-                            var2,
-                            None,
-                            None,
-                            None,
-                            "-",
-                            None,
-                        )
-                if runs == maxrun and (
-                    (var1 == min(subset["Distance"]))
-                    or (var2 == max(subset["Distance"]))
-                ):
-                    runs = 99  # set for output trigger
-            output = HydXS_output(
-                output, i, var1, var2, var3, var4, var5, fig, spar, runs
-            )
-    if len(output) == 0:
-        pass
-    else:
-        output = output.astype({"CrossSection": int})
-        output = output.astype({"runs": int})
-    return output
+    xs_inputs = HydXS_inputs(
+        full_dataset,
+        xs_list,
+        steps=steps,
+        geometry=geometry,
+        curves=curves,
+        xs_index=xs_index,
+        cache=cache,
+        archive=archive,
+        stage_grid=stage_grid,
+        cap_at_crest=cap_at_crest,
+    )
+    settings = dict(
+        allow_boundary=allow_boundary,
+        maxrun=maxrun,
+        steps=steps,
+        minV=minV,
+        plot=plot,
+        smoother=smoother,
+        geometry=geometry,
+        seed=seed,
+        cache=cache,
+        stage_grid=stage_grid,
+        cap_at_crest=cap_at_crest,
+    )
+    tasks = [(xs_input, run, settings) for xs_input in xs_inputs]
+    output = RunResults(len(tasks))
+    for xs_input, xs_result in zip(
+        xs_inputs, HydXS_execute(tasks, workers=workers, smoother=smoother)
+    ):
+        HydXS_output(output, xs_input[0], *xs_result, run=run)
+    return output.frame(run=run)
 
 
 # end HydXS_perXS
 
 
+# results of Bankfull calc runs, collected in preallocated arrays -------------------------------------------------------------
+# used in "HydXS_run" and "HydXS_perXS" (through HydXS_output below)
+# one row per (XS, run) ; turned into a dataframe once, at the end, by frame
+#    CrossSection / run / BankFull / LeftDistance / RightDistance / nChannels / spar / runs
+class RunResults:
+    def __init__(self, size):
+        self.CrossSection = np.zeros(size, dtype=np.int64)
+        self.run = np.zeros(size, dtype=np.int64)
+        self.BankFull = np.full(size, np.nan)
+        self.LeftDistance = np.full(size, np.nan)
+        self.RightDistance = np.full(size, np.nan)
+        # number of channels, as given by mainFun ("1", "2", ...)
+        self.nChannels = np.full(size, None, dtype=object)
+        self.spar = np.full(size, np.nan)
+        self.runs = np.zeros(size, dtype=np.int64)
+        self.size = 0
+
+    def add(self, i, run, bankfull, left, right, nchannels, spar, runs):
+        n = self.size
+        self.CrossSection[n] = i
+        self.run[n] = run
+        self.BankFull[n] = np.nan if bankfull is None else bankfull
+        self.LeftDistance[n] = np.nan if left is None else left
+        self.RightDistance[n] = np.nan if right is None else right
+        self.nChannels[n] = nchannels
+        self.spar[n] = np.nan if spar is None else spar
+        self.runs[n] = runs
+        self.size = n + 1
+
+    # row n, as given to add
+    def row(self, n):
+        return (
+            self.CrossSection[n],
+            self.run[n],
+            self.BankFull[n],
+            self.LeftDistance[n],
+            self.RightDistance[n],
+            self.nChannels[n],
+            self.spar[n],
+            self.runs[n],
+        )
+
+    # long format dataframe of all rows ; or, for a single run, one row per XS indexed by XS identity (without the run column)
+    def frame(self, run=None):
+        columns = [
+            "CrossSection",
+            "run",
+            "BankFull",
+            "LeftDistance",
+            "RightDistance",
+            "nChannels",
+            "spar",
+            "runs",
+        ]
+        output = pd.DataFrame(
+            {name: getattr(self, name)[: self.size] for name in columns}
+        )
+        if run is None:
+            return output
+        output = output[output["run"] == run].drop(columns="run")
+        return output.set_index(output["CrossSection"].to_numpy())
+
+
+# end RunResults
+
+
 # pull together the output for a single run of Bankfull calc-------------------------------------------------------------------
-# used in "HydXS_perXS" function above
-# OUTPUT : dataframe for single XS, one row only
-#    CrossSection / BankFull / LeftDistance / RightDistance / nChannels / spar / runs
-def HydXS_output(output, i, var1, var2, var3, var4, var5, fig, spar, runs):
-    output.loc[i, "CrossSection"] = i
-    if var4 == None or runs == 99:
-        # bankfull still hits boundaries or no output
-        output.loc[i, "BankFull"] = None
-        output.loc[i, "LeftDistance"] = None
-        output.loc[i, "RightDistance"] = None
-        output.loc[i, "nChannels"] = None
+# used in "HydXS_run" and "HydXS_perXS" functions above
+# adds one row, for a single XS, to the RunResults "output"
+#    CrossSection / run / BankFull / LeftDistance / RightDistance / nChannels / spar / runs
+def HydXS_output(output, i, var1, var2, var3, var4, var5, fig, spar, runs, run=1):
+    if var4 == None or runs in (98, 99):
+        # bankfull still hits boundaries, no depth below the lower bank crest, or no output
+        output.add(i, run, None, None, None, None, spar, runs)
     else:
-        output.loc[i, "CrossSection"] = i
-        output.loc[i, "BankFull"] = var4
-        output.loc[i, "LeftDistance"] = var1
-        output.loc[i, "RightDistance"] = var2
-        output.loc[i, "nChannels"] = var5
-    # common output
-    output.loc[i, "spar"] = spar
-    output.loc[i, "runs"] = runs
+        output.add(i, run, var4, var1, var2, var5, spar, runs)
     return output
 
 
 # end HydXS_output
+
+
+# all runs side by side, one row per XS --------------------------------------------------------------------------------------
+# used in "HydXS_run"
+# INPUT : long format results (RunResults.frame) ; num_runs = number of runs to have columns for (runs without results are empty),
+#    None for the runs in output
+# OUTPUT : index / CrossSection / bankfull_n / left_n / right_n for each run n, rounded to 2 decimals
+def HydXS_wide(output, num_runs=None):
+    # if a XS is run twice in a run, the last result is kept
+    output = output.drop_duplicates(["CrossSection", "run"], keep="last")
+    xs_ids = pd.unique(output["CrossSection"])
+    wide = output.pivot(
+        index="CrossSection",
+        columns="run",
+        values=["BankFull", "LeftDistance", "RightDistance"],
+    ).reindex(xs_ids)
+    if num_runs is None:
+        runs = sorted(pd.unique(output["run"]))
+    else:
+        runs = range(1, num_runs + 1)
+        wide = wide.reindex(
+            columns=pd.MultiIndex.from_product(
+                [["BankFull", "LeftDistance", "RightDistance"], runs]
+            )
+        )
+    results = {"CrossSection": xs_ids}
+    for k in runs:
+        results["bankfull_" + str(k)] = np.round(wide[("BankFull", k)].to_numpy(), 2)
+        results["left_" + str(k)] = np.round(wide[("LeftDistance", k)].to_numpy(), 2)
+        results["right_" + str(k)] = np.round(wide[("RightDistance", k)].to_numpy(), 2)
+    return pd.DataFrame(results, index=xs_ids).reset_index()
+
+
+# end HydXS_wide
@@ -17,6 +17,12 @@
 # OUTPUT: dataframe = input + BankFullType + BankFullOutput + CountatBankFull + LeftOutput + RightOutput
 # currently overwrites INPUT
 #
+# with an "n_members" column (adaptive ensemble, see HydXS_run), only the first n_members runs of each XS are used, and the
+# 2/3 threshold is of n_members
+# the per-run bankfull/left/right columns are handled as (number of XS, num_runs) matrices, so the mode, the window count,
+# the 3-bin fallback and the choice of banks are computed for all XSs at once ; results are the same, bit for bit, as the
+# original per-row loop with statistics.mode / scipy.stats.binned_statistic
+#
 # this data is intended to be examined by users, to understand variability of results
 # ie. the more variable the BankFull calc between runs, the more likely it is to require manual intervention of expert
 #
@@ -29,108 +35,167 @@
 import statistics
 import pandas as pd
 import numpy as np
-from scipy import stats
-import math
 
 
 # bring together results for num_run calc runs ---------------------------------------------------------------------------------
 def calcoutputs(dataset, num_runs, window=0.05):
-    for i in range(0, len(dataset)):
-        # column for each run output
-        for j in range(1, num_runs + 1):
-            bankvar = "bankfull_" + str(j)
-            leftvar = "left_" + str(j)
-            rightvar = "right_" + str(j)
-            var1 = dataset.loc[i, bankvar]
-            var2 = dataset.loc[i, leftvar]
-            var3 = dataset.loc[i, rightvar]
-            if j == 1:
-                group_bank = [var1]
-                group_left = [var2]
-                group_right = [var3]
-            else:
-                group_bank.append(var1)
-                group_left.append(var2)
-                group_right.append(var3)
-
-        # exclude XS with no results
-        if math.isnan(statistics.mean(group_bank)):
-            dataset.loc[i, "CountatBankFull"] = 0
-
-        else:
-            # initially set to mode of bankfull calcs
-            try:
-                bank_mode = statistics.mode(group_bank)
-            except:
-                bank_mode = statistics.median(group_bank)
-            dataset.loc[i, "BankFullType"] = "mode"
-            dataset.loc[i, "BankFullOutput"] = bank_mode
-            dataset.loc[i, "CountatBankFull"] = sum(
-                map(lambda x: bank_mode - window <= x <= bank_mode + window, group_bank)
-            )
-
-            # the mode of bankfull doesn't always line up with mode of banks edges
-            # dataset.loc[i,"LeftOutput"] = statistics.mode(group_left)
-            # dataset.loc[i,"RightOutput"] = statistics.mode(group_right)
-            done = False
-            k = 0
-            while done == False:
-                if group_bank[k] == bank_mode:
-                    done = True
-                    dataset.loc[i, "LeftOutput"] = group_left[k]
-                    dataset.loc[i, "RightOutput"] = group_right[k]
-                else:
-                    k = k + 1
-
-            ##if there is a split in possible bankfull calcs - if less than 2/3rds of calcs are approx. mode
-            if dataset.loc[i, "CountatBankFull"] < num_runs * 2 / 3:
-                dataset.loc[i, "BankFullType"] = "binned"
-
-                # Bankfull
-                bin_means, bin_edges, binnum = stats.binned_statistic(
-                    group_bank, group_bank, statistic="mean", bins=3
-                )
-                maxbin = max(
-                    (binnum == 1).sum(), (binnum == 2).sum(), (binnum == 3).sum()
-                )
-                # this ordering will mean that if there are equal numbers for any bins, the lowest bankfull will be chosen
-                # which is likely to be one with less smoothing
-                if maxbin == (binnum == 1).sum():
-                    thebin = 1
-                elif maxbin == (binnum == 2).sum():
-                    thebin = 2
-                elif maxbin == (binnum == 3).sum():
-                    thebin = 3
-                bank_by_bin = round(bin_means[thebin - 1], 2)
-                dataset.loc[i, "BankFullOutput"] = bank_by_bin
-
-                # now for the left and right bank limits
-                done = False
-                k = 0
-                while done == False and k < num_runs:
-                    if group_bank[k] == bank_by_bin:
-                        done = True
-                        dataset.loc[i, "LeftOutput"] = group_left[k]
-                        dataset.loc[i, "RightOutput"] = group_right[k]
-                    else:
-                        k = k + 1
-                # if needs interpolation
-                if k == num_runs:
-                    templ = []
-                    for m in range(0, len(binnum)):
-                        if binnum[m] == thebin:
-                            if templ == []:
-                                templ = [group_left[m]]
-                                tempr = [group_right[m]]
-                            else:
-                                templ.append(group_left[m])
-                                tempr.append(group_right[m])
-                    dataset.loc[i, "LeftOutput"] = statistics.mean(templ)
-                    dataset.loc[i, "RightOutput"] = statistics.mean(tempr)
-
-    dataset = dataset.astype({"CountatBankFull": int})
+    # column for each run output
+    bank = run_matrix(dataset, "bankfull_", num_runs)
+    left = run_matrix(dataset, "left_", num_runs)
+    right = run_matrix(dataset, "right_", num_runs)
+    rows = np.arange(len(dataset))
+    # members of each XS's ensemble : all num_runs runs, or the first n_members (adaptive ensemble, see HydXS_run)
+    if "n_members" in dataset.columns:
+        n_members = dataset["n_members"].to_numpy(dtype=int)
+    else:
+        n_members = np.full(len(dataset), num_runs)
+    member = np.arange(num_runs) < n_members[:, None]
+    bank = np.where(member, bank, np.nan)
+
+    # exclude XS with no results
+    valid = ~(np.isnan(bank) & member).any(axis=1)
+
+    # initially set to mode of bankfull calcs ; its first run gives the left and right banks
+    # the mode of bankfull doesn't always line up with mode of banks edges
+    # (runs that aren't members are NaN : each counts once, after the members, so it never wins the mode)
+    k = run_mode(np.where(valid[:, None], bank, 0.0))
+    bank_mode = bank[rows, k]
+    count = (
+        (bank_mode[:, None] - window <= bank) & (bank <= bank_mode[:, None] + window)
+    ).sum(axis=1)
+    count = np.where(valid, count, 0)
+    output = bank_mode.copy()
+    left_output = left[rows, k]
+    right_output = right[rows, k]
+
+    ##if there is a split in possible bankfull calcs - if less than 2/3rds of calcs are approx. mode
+    binned = valid & (count < n_members * 2 / 3)
+    if binned.any():
+        group_bank = bank[binned]
+        group_member = member[binned]
+        binnum = np.where(group_member, three_bins(group_bank), 0)
+        # mean of the bin with most runs ; if there are equal numbers for any bins, the lowest bankfull will be chosen
+        # which is likely to be one with less smoothing
+        bin_count = np.stack([(binnum == b).sum(axis=1) for b in (1, 2, 3)], axis=1)
+        thebin = np.argmax(bin_count, axis=1) + 1
+        in_bin = binnum == thebin[:, None]
+        bank_by_bin = np.round(run_sum(group_bank, in_bin) / in_bin.sum(axis=1), 2)
+        output[binned] = bank_by_bin
+
+        # now for the left and right bank limits : the first run with exactly that bankfull
+        match = group_bank == bank_by_bin[:, None]
+        found = match.any(axis=1)
+        k_bin = np.argmax(match, axis=1)
+        group_left = left[binned]
+        group_right = right[binned]
+        bin_rows = np.arange(len(group_bank))
+        left_bin = group_left[bin_rows, k_bin]
+        right_bin = group_right[bin_rows, k_bin]
+        # if needs interpolation : mean of the banks of the runs in the bin
+        left_bin[~found] = run_mean(group_left[~found], in_bin[~found])
+        right_bin[~found] = run_mean(group_right[~found], in_bin[~found])
+        left_output[binned] = left_bin
+        right_output[binned] = right_bin
+
+    dataset["BankFullType"] = np.where(valid, np.where(binned, "binned", "mode"), None)
+    dataset["BankFullOutput"] = np.where(valid, output, np.nan)
+    dataset["CountatBankFull"] = count
+    dataset["LeftOutput"] = np.where(valid, left_output, np.nan)
+    dataset["RightOutput"] = np.where(valid, right_output, np.nan)
 
     return dataset
 
 
 # end calcoutputs
+
+
+# (number of XS, num_runs) matrix of one output, from the columns prefix1 ... prefix<num_runs> ----------------------------------
+# used in calcoutputs
+def run_matrix(dataset, prefix, num_runs):
+    columns = [prefix + str(j) for j in range(1, num_runs + 1)]
+    return dataset[columns].to_numpy(dtype=float)
+
+
+# run giving the mode of each row, as statistics.mode --------------------------------------------------------------------------
+# used in calcoutputs
+# the mode is the value with the highest count ; if there is a tie, the one that occurs first
+# OUTPUT : column (run) index of the first occurrence of the mode, one per row
+def run_mode(values):
+    n, n_runs = values.shape
+    # runs of equal values in the sorted rows : their length is the count of the value
+    order = np.argsort(values, axis=1)
+    ordered = np.take_along_axis(values, order, axis=1)
+    new_run = np.ones((n, n_runs), dtype=bool)
+    new_run[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    starts = np.flatnonzero(new_run)
+    length = np.diff(np.append(starts, n * n_runs))
+    # first occurrence of each value, and the first run of each row
+    first = np.minimum.reduceat(order.ravel(), starts)
+    row_starts = np.flatnonzero(starts % n_runs == 0)
+    longest = np.maximum.reduceat(length, row_starts)
+    is_mode = length == np.repeat(longest, np.diff(np.append(row_starts, len(starts))))
+    return np.minimum.reduceat(np.where(is_mode, first, n_runs), row_starts)
+
+
+# sum of the values of each row where mask is True ----------------------------------------------------------------------------
+# used in calcoutputs
+# summed run by run, in the same order as scipy.stats.binned_statistic (np.bincount) does
+def run_sum(values, mask):
+    total = np.zeros(len(values))
+    for x_j in np.where(mask, values, 0.0).T.copy():
+        total += x_j
+    return total
+
+
+# mean of the values of each row where mask is True, as statistics.mean ----------------------------------------------------------
+# used in calcoutputs, for the few XSs whose binned bankfull isn't one of the runs
+def run_mean(values, mask):
+    return np.array([statistics.mean(v[m].tolist()) for v, m in zip(values, mask)])
+
+
+# bin (1, 2 or 3) of every value, as scipy.stats.binned_statistic(values, values, bins=3) per row ---------------------------------
+# used in calcoutputs
+# 3 equal bins between the row minimum and maximum (widened by 0.5 either side if they are equal), right edge in the last bin
+def three_bins(values):
+    # NaN (not a member of the ensemble) is left out of the minimum and maximum
+    smin = np.fmin.reduce(values, axis=1)
+    smax = np.fmax.reduce(values, axis=1)
+    same = smin == smax
+    smin = np.where(same, smin - 0.5, smin)
+    smax = np.where(same, smax + 0.5, smax)
+    edges = np.linspace(smin, smax, 4, axis=1)
+    # every value is >= the first edge
+    binnum = np.ones(values.shape, dtype=int)
+    for e in range(1, 4):
+        binnum += values >= edges[:, e, None]
+    return np.minimum(binnum, 3)
+
+
+# end three_bins
+
+
+# whether the ensemble of each XS is settled, for the adaptive ensemble of HydXS_run ---------------------------------------------
+# bank : (number of XS, runs so far) rounded bankfull of each run ; the calcoutputs criterion is : "mode" if at least 2/3 of
+# the runs are within window of the mode, "binned" otherwise ; the XS is settled when the Wilson score interval (at the one-sided
+# confidence level) of that proportion is all above or all below 2/3, or when a run has no result (the XS has no result then)
+def ensemble_settled(bank, confidence=0.8, window=0.05):
+    n = bank.shape[1]
+    failed = np.isnan(bank).any(axis=1)
+    k = run_mode(np.where(failed[:, None], 0.0, bank))
+    bank_mode = bank[np.arange(len(bank)), k]
+    count = (
+        (bank_mode[:, None] - window <= bank) & (bank <= bank_mode[:, None] + window)
+    ).sum(axis=1)
+    low, high = wilson_interval(count, n, statistics.NormalDist().inv_cdf(confidence))
+    return failed | (low >= 2 / 3) | (high < 2 / 3)
+
+
+# Wilson score interval of the proportion count / n, z = normal quantile
+def wilson_interval(count, n, z):
+    p = count / n
+    centre = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+    margin = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    return centre - margin, centre + margin
+
+
+# end ensemble_settled
@@ -0,0 +1,163 @@
+###############################################################################################################################
+#
+# HydXS_profiling.py
+#
+# instrumentation of a HydXS run : where the time goes (wrangling, trimming, geometry, smoothing, retries, aggregation ...)
+#   stages     : wall (time.perf_counter) and CPU (time.process_time) seconds, and number of calls, of each named stage ;
+#                stages nest (eg. "smoothing" is part of "model_runs"), so they don't add up to the total
+#   counters   : counts of events, eg. geometry evaluations (depths the hydraulic depth curve is computed at), smoothing calls,
+#                boundary retries, failures
+#   histograms : one value per XS (or per XS and run), eg. the seconds a XS run took, or its boundary retries ; reported as
+#                count / mean / percentiles and a histogram (powers of 2 bins for timings, one bin per value for counts)
+#
+# instrumentation is off unless a Profiler is made active with `with profiling(Profiler()):` ; the stage / count / observe
+# functions below then record into it, otherwise they do nothing (a check of one global, so no measurable cost), and they are
+# only called once per stage, XS or run, never per depth step
+# worker processes (HydXS_results in HydXS_modelling.py) record each task in a Profiler of their own, whose state is merged
+# into the active one ; their stage times are summed over the processes
+#
+# INPUT: Profiler() ; run_hydxs(..., profile=True) makes one and returns its report
+# OUTPUT: profiler.report() = {"wall", "cpu", "stages", "counters", "histograms"}, JSON-able
+#
+# example:
+#    XSdata4, XSdata2, report = run_hydxs("survey.csv", smoother="scipy", profile=True)
+#    print(report["stages"]["smoothing"]["wall"], report["counters"]["retries"])
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import contextlib
+import time
+
+import numpy as np
+
+# the active Profiler, None when instrumentation is off
+_ACTIVE = None
+_OFF = contextlib.nullcontext()
+
+
+class Profiler:
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.samples = {}
+        self._start = (time.perf_counter(), time.process_time())
+
+    # time the code in the with block as stage "name"
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            totals = self.stages.setdefault(name, [0.0, 0.0, 0])
+            totals[0] += time.perf_counter() - wall
+            totals[1] += time.process_time() - cpu
+            totals[2] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        self.samples.setdefault(name, []).append(value)
+
+    # everything recorded, as plain picklable values (sent back from worker processes) ; merge adds it to this Profiler
+    def state(self):
+        return self.stages, self.counters, self.samples
+
+    def merge(self, state):
+        stages, counters, samples = state
+        for name, (wall, cpu, calls) in stages.items():
+            totals = self.stages.setdefault(name, [0.0, 0.0, 0])
+            totals[0] += wall
+            totals[1] += cpu
+            totals[2] += calls
+        for name, n in counters.items():
+            self.count(name, n)
+        for name, values in samples.items():
+            self.samples.setdefault(name, []).extend(values)
+
+    # wall / CPU seconds since the Profiler was made, and the summary of each stage, counter and histogram
+    def report(self):
+        return {
+            "wall": time.perf_counter() - self._start[0],
+            "cpu": time.process_time() - self._start[1],
+            "stages": {
+                name: {"wall": wall, "cpu": cpu, "calls": calls}
+                for name, (wall, cpu, calls) in self.stages.items()
+            },
+            "counters": dict(self.counters),
+            "histograms": {
+                name: histogram(values) for name, values in self.samples.items()
+            },
+        }
+
+
+# end Profiler
+
+
+# summary of the values of one histogram : bins are one per integer for counts, powers of 2 for other values (eg. seconds) ---
+def histogram(values):
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {"count": 0}
+    if np.all(values == np.round(values)):
+        edges = np.arange(values.min(), values.max() + 2)
+    else:
+        low = np.floor(np.log2(max(values.min(), 1e-9)))
+        high = np.ceil(np.log2(max(values.max(), 1e-9)))
+        edges = 2.0 ** np.arange(low, max(high, low + 1) + 1)
+        edges[0] = min(edges[0], values.min())
+    counts, edges = np.histogram(values, bins=edges)
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "count": len(values),
+        "sum": float(values.sum()),
+        "mean": float(values.mean()),
+        "min": float(values.min()),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(values.max()),
+        "edges": edges.tolist(),
+        "counts": counts.tolist(),
+    }
+
+
+# end histogram
+
+
+# make profiler the active one in the with block (None : instrumentation off) ---------------------------------------------------
+@contextlib.contextmanager
+def profiling(profiler):
+    global _ACTIVE
+    before, _ACTIVE = _ACTIVE, profiler
+    try:
+        yield profiler
+    finally:
+        _ACTIVE = before
+
+
+def active_profiler():
+    return _ACTIVE
+
+
+# recording into the active Profiler, if any ; used across the package --------------------------------------------------------
+def stage(name):
+    if _ACTIVE is None:
+        return _OFF
+    return _ACTIVE.stage(name)
+
+
+def count(name, n=1):
+    if _ACTIVE is not None:
+        _ACTIVE.count(name, n)
+
+
+def observe(name, value):
+    if _ACTIVE is not None:
+        _ACTIVE.observe(name, value)
+
+
+# end profiling
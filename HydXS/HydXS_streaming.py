@@ -0,0 +1,321 @@
+###############################################################################################################################
+#
+# HydXS_streaming.py
+#
+# streaming version of run_hydxs (run_HydXS.py) for surveys too large to hold in memory
+# the CSV is read in chunks of whole cross sections and each chunk goes through
+#    wrangle -> pre-process -> model runs -> aggregate (calcoutputs) -> attach
+# as a generator pipeline ; the results of each chunk are appended to CSV files in out_data_path, so memory is bounded by
+# the chunk size (plus the largest cross section) rather than by the size of the survey
+#
+# INPUT: path to a CSV of cross section points (as for run_hydxs), with the points of each XS on consecutive rows
+#        chunksize = number of CSV rows read at a time ; a XS cut by the end of a chunk is carried over to the next one
+# OUTPUT: <CSV name>_final_results.csv = one row per XS, as returned by run_hydxs
+#         <CSV name>_points.csv = every pre-processed point with its XS results, as attach_HydXS (without the shapely point columns)
+#         returns the paths of the two files
+#
+# with a seed, the results are the same as run_hydxs on the whole CSV (the CV fold seeds only depend on XS and run)
+# with checkpoint / resume, the (XS, run) results are kept in out_data_path/HydXS_checkpoint.sqlite as in run_hydxs ; a resumed
+# run writes the output files again from the start, taking the results already in the checkpoint instead of computing them
+#
+# example:
+#    results_csv, points_csv = run_hydxs_streaming("survey.csv", nruns=11, smoother="scipy", seed=1, chunksize=500000)
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .wrangle_cross_section import wrangle_cross_section
+from .xs_preprocessor import preprocess_cross_section
+from .HydXS_modelling import HydXS_run, model_xs_index
+from .HydXS_output import calcoutputs
+from .HydXS_attachModelResults import attach_HydXS
+from .xs_index import XSIndex
+from .HydXS_incremental import xs_fingerprints, read_previous, changed_xs, merge_results
+from .HydXS_checkpoint import CheckpointStore, checkpoint_fingerprint
+from .HydXS_cache import StageCache
+from .HydXS_profiling import stage
+
+logger = logging.getLogger(__name__)
+
+
+# whole cross sections from a CSV, a chunk at a time ---------------------------------------------------------------------------
+# the rows of the last XS of a chunk may continue in the next chunk, so they are held back and put in front of the next one
+# raises ValueError if a XS appears again after other XSs (the CSV has to be grouped by XS)
+def read_xs_chunks(csv_path, xs_id_col="x_sec_id", chunksize=100000):
+    done = set()
+    carry = None
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        ids = chunk[xs_id_col].to_numpy()
+        # start of the trailing block of the last XS
+        last = np.flatnonzero(ids != ids[-1])
+        last = last[-1] + 1 if len(last) > 0 else 0
+        carry = chunk.iloc[last:]
+        complete = chunk.iloc[:last]
+        if len(complete) > 0:
+            check_grouped(complete, xs_id_col, done)
+            yield complete
+    if carry is not None and len(carry) > 0:
+        check_grouped(carry, xs_id_col, done)
+        yield carry
+
+
+# end read_xs_chunks
+
+
+# every XS of a chunk must be new, and on consecutive rows ; used in read_xs_chunks
+def check_grouped(chunk, xs_id_col, done):
+    ids = chunk[xs_id_col].to_numpy()
+    starts = ids[1:] != ids[:-1]
+    chunk_ids = [ids[0]] + list(ids[1:][starts])
+    if len(set(chunk_ids)) < len(chunk_ids) or not done.isdisjoint(chunk_ids):
+        raise ValueError(
+            "CSV is not grouped by "
+            + xs_id_col
+            + " : streaming needs the points of each XS on consecutive rows"
+        )
+    done.update(chunk_ids)
+
+
+# HydXS over a stream of chunks of whole cross sections --------------------------------------------------------------------------
+# yields (per XS results, per point results) for each chunk, as run_hydxs / attach_HydXS
+# first / last / exclude / window / nVsteps / minVdep / maxr / nruns / smoother / geometry / seed / workers / stage_grid /
+# cap_at_crest / resume / adaptive / min_runs : as run_hydxs
+# checkpoint : None, or the path of the SQLite file to record (and with resume, reuse) the (XS, run) results in
+# cache : None or a StageCache (see HydXS_cache.py), as HydXS_run
+# previous : None, or the previous final results (dataframe) ; only the XSs of a chunk that changed are run again, the results
+#   of the others are taken from it (see HydXS_incremental.py)
+def stream_hydxs(
+    chunks,
+    xy_col=("POINT_X", "POINT_Y"),
+    z_col="POINT_Z",
+    xs_id_col="x_sec_id",
+    xs_order_col="x_sec_order",
+    riv_centre="RivCentre",
+    exclude=(),
+    first=None,
+    last=None,
+    window=10,
+    nVsteps=200,
+    minVdep=0.2,
+    maxr=3,
+    nruns=11,
+    smoother="R",
+    geometry="shapely",
+    seed=None,
+    workers=1,
+    stage_grid="uniform",
+    cap_at_crest=False,
+    checkpoint=None,
+    resume=False,
+    cache=None,
+    previous=None,
+    adaptive=False,
+    min_runs=3,
+):
+    settings = dict(
+        maxr=maxr,
+        nVsteps=nVsteps,
+        minVdep=minVdep,
+        smoother=smoother,
+        geometry=geometry,
+        seed=seed,
+    )
+    if stage_grid != "uniform":
+        settings["stage_grid"] = stage_grid
+    if cap_at_crest:
+        settings["cap_at_crest"] = cap_at_crest
+    store = None
+    if checkpoint is not None:
+        store = CheckpointStore(
+            checkpoint, checkpoint_fingerprint(**settings), resume=resume
+        )
+    try:
+        for n, chunk in enumerate(chunks, 1):
+            xs_list = list(pd.unique(chunk[xs_id_col]))
+            if first and last:
+                xs_list = [i for i in xs_list if first <= i < last]
+            if len(xs_list) == 0:
+                continue
+            with stage("wrangle"):
+                XSdata1 = wrangle_cross_section(
+                    point_df=chunk,
+                    input_type="DF",
+                    xy_col=xy_col,
+                    z_col=z_col,
+                    xs_id_col=xs_id_col,
+                    xs_order_col=xs_order_col,
+                    riv_centre=riv_centre,
+                    make_points=False,
+                )
+            with stage("preprocess"):
+                XSdata2 = preprocess_cross_section(
+                    XSdata1,
+                    xs_list=xs_list,
+                    dR_cutoff=True,
+                    dR_window=window,
+                    dR_excl=exclude,
+                    xs_index=XSIndex(XSdata1),
+                )
+            if len(XSdata2) == 0:
+                continue
+            XSindex2 = model_xs_index(XSdata2)
+            xs_list = [i for i in xs_list if i in XSindex2]
+            if len(xs_list) == 0:
+                continue
+            if adaptive:
+                fingerprints = xs_fingerprints(
+                    XSdata2,
+                    nruns=nruns,
+                    adaptive=adaptive,
+                    min_runs=min_runs,
+                    **settings,
+                )
+            else:
+                fingerprints = xs_fingerprints(XSdata2, nruns=nruns, **settings)
+            run_list = xs_list
+            if previous is not None:
+                run_list = changed_xs(xs_list, fingerprints, previous)
+            if len(run_list) == 0:
+                XSdata4 = merge_results(previous, previous.iloc[:0], xs_list)
+                with stage("output"):
+                    XSdata5 = attach_HydXS(XSdata2, XSdata4, xs_list)
+                logger.info("chunk %d : %d cross sections unchanged", n, len(xs_list))
+                yield XSdata4, XSdata5
+                continue
+            if store is not None:
+                store.add_xs_fingerprints(xs_fingerprints(XSdata2))
+            XSdata3 = HydXS_run(
+                XSdata2,
+                run_list,
+                num_runs=nruns,
+                maxrun=maxr,
+                steps=nVsteps,
+                minV=minVdep,
+                smoother=smoother,
+                geometry=geometry,
+                seed=seed,
+                workers=workers,
+                xs_index=XSindex2,
+                stage_grid=stage_grid,
+                cap_at_crest=cap_at_crest,
+                checkpoint=store,
+                cache=cache,
+                adaptive=adaptive,
+                min_runs=min_runs,
+            )
+            if store is not None:
+                store.commit()
+            with stage("output"):
+                XSdata4 = calcoutputs(XSdata3, nruns)
+                XSdata4["Fingerprint"] = XSdata4["CrossSection"].map(fingerprints)
+                if previous is not None:
+                    XSdata4 = merge_results(previous, XSdata4, xs_list)
+                XSdata5 = attach_HydXS(XSdata2, XSdata4, xs_list)
+            logger.info(
+                "chunk %d : %d cross sections done, %d of them run",
+                n,
+                len(xs_list),
+                len(run_list),
+            )
+            yield XSdata4, XSdata5
+    finally:
+        if store is not None:
+            store.close()
+
+
+# end stream_hydxs
+
+
+# main streaming function --------------------------------------------------------------------------------------------------------
+# same parameters as run_hydxs (for a CSV path), plus chunksize ; output files are overwritten, also on resume (see above)
+def run_hydxs_streaming(
+    point_csv,
+    xy_col=("POINT_X", "POINT_Y"),
+    z_col="POINT_Z",
+    xs_id_col="x_sec_id",
+    xs_order_col="x_sec_order",
+    riv_centre="RivCentre",
+    exclude=(),
+    first=None,
+    last=None,
+    window=10,
+    nVsteps=200,
+    minVdep=0.2,
+    maxr=3,
+    nruns=11,
+    out_data_path="model_outputs/test01/",
+    smoother="R",
+    geometry="shapely",
+    seed=None,
+    workers=1,
+    chunksize=100000,
+    stage_grid="uniform",
+    cap_at_crest=False,
+    checkpoint=False,
+    resume=False,
+    cache_dir=None,
+    previous=None,
+    adaptive=False,
+    min_runs=3,
+):
+    # read before the output files are removed : the previous results may be one of them
+    if previous is not None:
+        previous = read_previous(previous)
+    out_data_path = Path(out_data_path)
+    out_data_path.mkdir(exist_ok=True, parents=True)
+    results_csv = out_data_path / (Path(point_csv).stem + "_final_results.csv")
+    points_csv = out_data_path / (Path(point_csv).stem + "_points.csv")
+    for path in (results_csv, points_csv):
+        path.unlink(missing_ok=True)
+
+    chunks = read_xs_chunks(point_csv, xs_id_col=xs_id_col, chunksize=chunksize)
+    for results, points in stream_hydxs(
+        chunks,
+        xy_col=xy_col,
+        z_col=z_col,
+        xs_id_col=xs_id_col,
+        xs_order_col=xs_order_col,
+        riv_centre=riv_centre,
+        exclude=exclude,
+        first=first,
+        last=last,
+        window=window,
+        nVsteps=nVsteps,
+        minVdep=minVdep,
+        maxr=maxr,
+        nruns=nruns,
+        smoother=smoother,
+        geometry=geometry,
+        seed=seed,
+        workers=workers,
+        stage_grid=stage_grid,
+        cap_at_crest=cap_at_crest,
+        checkpoint=(
+            out_data_path / "HydXS_checkpoint.sqlite" if checkpoint or resume else None
+        ),
+        resume=resume,
+        cache=None if cache_dir is None else StageCache(cache_dir),
+        previous=previous,
+        adaptive=adaptive,
+        min_runs=min_runs,
+    ):
+        append_csv(results, results_csv)
+        append_csv(points, points_csv)
+    return results_csv, points_csv
+
+
+# end run_hydxs_streaming
+
+
+# append a chunk of output to a CSV, with the header only at the start of the file
+def append_csv(data, path):
+    data.to_csv(path, mode="a", header=not path.exists(), index=False)
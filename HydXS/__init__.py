@@ -1,4 +1,6 @@
 from .run_HydXS import run_hydxs
+from .HydXS_streaming import run_hydxs_streaming
+from .wrangle_cross_section import add_point_geometry
 
 from importlib.metadata import version
 
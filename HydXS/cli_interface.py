@@ -2,6 +2,11 @@ import typer
 from pathlib import Path
 from typing import Optional, Union, Tuple
 from HydXS.run_HydXS import run_hydxs
+from HydXS.HydXS_streaming import run_hydxs_streaming
+from HydXS.HydXS_io import write_table, INPUT_TYPES, FILE_INPUT_TYPES
+from HydXS.HydXS_profiling import Profiler, profiling
+from HydXS.HydXS_logging import configure_logging
+import json
 
 
 app = typer.Typer()
@@ -50,10 +55,82 @@ def run(
     maxr: int = 3,  # KEEP / CHANGE : HydXS default is 3 ; how many times HydXS tries to get a result that doesn't hit boundary ; the higher the number, the longer the running
     nruns: int = 11,  # KEEP / CHANGE : HydXS default is 11; make an odd number of runs, so mode is possible (if even, and split, then mode cannot be calc'd)
     out_data_path: Path = "model_outputs/test01/",  # CHANGE : where output CSV are saved
+    smoother: str = "R",  # KEEP / CHANGE : "R" (rpy2, original) or "scipy" (pure Python, no R install needed)
+    geometry: str = "shapely",  # KEEP / CHANGE : "shapely" (original) or "analytic" (vectorised, much faster)
+    seed: Optional[int] = None,  # KEEP / CHANGE : set for reproducible runs (random CV folds in the spline smoothing)
+    workers: int = 1,  # KEEP / CHANGE : number of processes to spread the cross sections and runs over
+    checkpoint: bool = False,  # KEEP / CHANGE : record every (XS, run) result in out_data_path/HydXS_checkpoint.sqlite as it is done
+    resume: bool = False,  # KEEP / CHANGE : carry on from the checkpoint of a killed run, skipping the (XS, run) results already done
+    cache_dir: Optional[Path] = None,  # KEEP / CHANGE : directory of a disk cache of stage curves and seeded spline fits, reused by later runs
+    previous: Optional[Path] = None,  # KEEP / CHANGE : final results CSV of an earlier run of this survey ; only the changed XSs are run again
+    archive: Optional[Path] = None,  # KEEP / CHANGE : directory for a memory-mapped archive of the pre-processed XSs, shared by the worker processes
+    adaptive: bool = False,  # KEEP / CHANGE : stop running a XS once its mode / binned result is settled ; nruns is then the most runs per XS
+    min_runs: int = 3,  # KEEP / CHANGE : runs every XS gets in the adaptive ensemble
+    stage_grid: str = "uniform",  # KEEP / CHANGE : "uniform" (nVsteps evenly spaced depths, original) or "adaptive" (coarse sweep refined around the bankfull candidates, fewer geometry evaluations)
+    cap_at_crest: bool = False,  # KEEP / CHANGE : only look for the bankfull below the lower bank crest ; a XS with no depth there gets no result without retries
+    output_format: str = "csv",  # KEEP / CHANGE : "csv", "parquet" or "feather" for the final results
+    chunksize: Optional[int] = None,  # KEEP / CHANGE : if set, stream the CSV this many rows at a time (points of each XS on consecutive rows) and append results as they are done
+    profile: Optional[Path] = None,  # KEEP / CHANGE : JSON file for a report of the time spent in each stage, counters (geometry evaluations, smoothing calls, retries, failures) and per XS timings
+    log_level: str = "INFO",  # KEEP / CHANGE : "DEBUG", "INFO" (progress, throughput and ETA of each stage) or "WARNING" ; messages go to stderr
+    quiet: bool = False,  # KEEP / CHANGE : warnings and errors only, no progress
 ):
+    configure_logging(log_level.upper(), quiet)
     out_data_path.mkdir(parents=True, exist_ok=True)
 
-    out, _preproc_data = run_hydxs(
+    if chunksize:
+        # streaming reads CSV chunks and appends CSV results
+        if input_type in FILE_INPUT_TYPES:
+            file_type = input_type
+        else:
+            file_type = INPUT_TYPES.get(Path(point_df).suffix.lower())
+        if file_type != "CSV":
+            raise typer.BadParameter(
+                f"--chunksize only streams CSV input, not {point_df} (input type {file_type or input_type})"
+            )
+        if output_format != "csv":
+            raise typer.BadParameter(
+                f"--chunksize appends the results to CSV files, --output-format {output_format} can't be used with it"
+            )
+        if archive is not None:
+            raise typer.BadParameter(
+                "--archive holds a whole pre-processed survey, it can't be used with --chunksize (one chunk in memory at a time)"
+            )
+        with profiling(None if profile is None else Profiler()) as profiler:
+            run_hydxs_streaming(
+                point_df,
+                xy_col,
+                z_col,
+                xs_id_col,
+                xs_order_col,
+                riv_centre,
+                exclude,
+                first,
+                last,
+                window,
+                nVsteps,
+                minVdep,
+                maxr,
+                nruns,
+                out_data_path,
+                smoother,
+                geometry,
+                seed,
+                workers,
+                chunksize,
+                stage_grid,
+                cap_at_crest,
+                checkpoint,
+                resume,
+                cache_dir,
+                previous,
+                adaptive,
+                min_runs,
+            )
+        if profile is not None:
+            profile.write_text(json.dumps(profiler.report(), indent=2))
+        return
+
+    out, _preproc_data, *report = run_hydxs(
         point_df,
         input_type,
         xy_col,
@@ -73,10 +150,26 @@ def run(
         maxr,  # KEEP / CHANGE : HydXS default is 3 ; how many times HydXS tries to get a result that doesn't hit boundary ; the higher the number, the longer the running
         nruns,  # KEEP / CHANGE : HydXS default is 11; make an odd number of runs, so mode is possible (if even, and split, then mode cannot be calc'd)
         out_data_path,  # CHANGE : where output CSV are saved
+        smoother,
+        geometry,
+        seed,
+        workers,
+        checkpoint,
+        resume,
+        cache_dir,
+        previous,
+        False,  # make_points : only the final results are written, the shapely point columns aren't needed
+        archive,
+        adaptive,
+        min_runs,
+        stage_grid,
+        cap_at_crest,
+        profile is not None,
     )
+    if profile is not None:
+        profile.write_text(json.dumps(report[0], indent=2))
     in_file_name = Path(point_df).stem
-    file_name = f"{in_file_name}_final_results.csv"
-    out.to_csv(out_data_path / file_name, index=False)
+    write_table(out, out_data_path / f"{in_file_name}_final_results", output_format)
 
 
 if __name__ == "__main__":
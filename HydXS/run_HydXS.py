@@ -15,6 +15,7 @@
 ## imports ---------------------------------------------------------------------------------------------------------
 from __future__ import annotations
 from typing import Union, Tuple, List
+import logging
 
 import geopandas
 import pandas
@@ -24,8 +25,17 @@ from .xs_preprocessor import *
 from .HydXS_modelling import *
 from .HydXS_output import *
 from .HydXS_attachModelResults import *
+from .xs_index import XSIndex
+from .HydXS_checkpoint import CheckpointStore, checkpoint_fingerprint
+from .HydXS_cache import StageCache
+from .xs_archive import open_xs_archive
+from .HydXS_io import read_points, point_columns, FILE_INPUT_TYPES
+from .HydXS_incremental import xs_fingerprints, read_previous, changed_xs, merge_results
+from .HydXS_profiling import Profiler, profiling, stage
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 ## parameters ------------------------------------------------------------------------------------------------------
 # 01: data input
 
@@ -56,7 +66,7 @@ from pathlib import Path
 def run_hydxs(
     point_df: geopandas.GeoDataFrame | pandas.DataFrame,
     input_type: str = "DF",
-    xy_col: tuple[str, str] = ("POINT_X", "POINT_Y"),
+    xy_col: Union[tuple[str, str], str] = ("POINT_X", "POINT_Y"),
     z_col: str = "POINT_Z",
     xs_id_col: str = "x_sec_id",
     xs_order_col: str = "x_sec_order",
@@ -72,13 +82,28 @@ def run_hydxs(
     maxr: int = 3,
     nruns: int = 11,
     out_data_path: str | Path = "model_outputs/test01/",
+    smoother: str = "R",
+    geometry: str = "shapely",
+    seed: int = None,
+    workers: int = 1,
+    checkpoint: bool = False,
+    resume: bool = False,
+    cache_dir: str | Path = None,
+    previous: str | Path | pd.DataFrame = None,
+    make_points: bool = True,
+    archive: str | Path = None,
+    adaptive: bool = False,
+    min_runs: int = 3,
+    stage_grid: str = "uniform",
+    cap_at_crest: bool = False,
+    profile: bool = False,
 ) -> pd.DataFrame:
     """Main function to run the entire pipeline on a set of cross section point data.
 
     Args:
-        point_df (geopandas.GeoDataFrame | pandas.DataFrame): input dataframe or GeoDataFrame with points along cross sections
-        input_type (str, optional): type of Dataframe, "DF" if Dataframe, "GDF" if GeoDataFrame. Defaults to "DF".
-        xy_col (tuple[str, str], optional): tuple of x and y column names. Defaults to ("POINT_X", "POINT_Y").
+        point_df (geopandas.GeoDataFrame | pandas.DataFrame | str | Path): input dataframe or GeoDataFrame with points along cross sections, or the path of a CSV / Parquet / Feather / GIS file of them
+        input_type (str, optional): type of Dataframe, "DF" if Dataframe, "GDF" if GeoDataFrame ; for a path, "CSV", "PARQUET", "FEATHER" or "GIS" (otherwise taken from the file extension). Defaults to "DF".
+        xy_col (tuple[str, str] | str, optional): tuple of x and y column names, or the name of the point geometry column for a GeoDataFrame / GIS file. Defaults to ("POINT_X", "POINT_Y").
         z_col (str, optional): name of column that holds elevation data for each point. Defaults to "POINT_Z".
         xs_id_col (str, optional): Name of column that holds an integer cross section ID. Defaults to "x_sec_id".
         xs_order_col (str, optional): Name of column that holds the position of that point in the order of the cross section. Defaults to "x_sec_order".
@@ -92,6 +117,21 @@ def run_hydxs(
         maxr (int, optional): Maximum number of sub runs for each cross section per run. Defaults to 3.
         nruns (int, optional): Number of runs over entire set of cross sections. Defaults to 11.
         out_data_path (str | Path, optional): data path where intermediate outputs are stored. Defaults to "model_outputs/test01/".
+        smoother (str, optional): smoothing spline backend, "R" (rpy2) or "scipy" (pure Python, no R install needed). Defaults to "R".
+        geometry (str, optional): how the hydraulic depth curve is computed, "shapely" (intersection per depth step) or "analytic" (vectorised closed form). Defaults to "shapely".
+        seed (int, optional): seed for the random CV folds of the spline smoothing, makes runs reproducible. Defaults to None (unseeded).
+        workers (int, optional): number of processes the (cross section, run) calculations are spread over. With a seed, the output is the same as with 1 worker. Defaults to 1.
+        checkpoint (bool, optional): record every (cross section, run) result in out_data_path / "HydXS_checkpoint.sqlite" as it is computed. Defaults to False.
+        resume (bool, optional): reuse the results already in the checkpoint and only compute the rest (implies checkpoint). Raises ValueError if the checkpoint was made with different model settings ; cross sections whose points changed are computed again, and cross sections can be added. Defaults to False.
+        cache_dir (str | Path, optional): directory of a disk cache of the stage curves and (seeded) spline fits, shared between runs so identical cross sections aren't recomputed. Defaults to None (no cache).
+        previous (str | Path | pandas.DataFrame, optional): final results of a previous run (or the path of its CSV). Only the cross sections whose points or model settings changed since (see the Fingerprint column) are run again, the others are taken from these results. Defaults to None (run everything).
+        make_points (bool, optional): add the PointXY and PointDZ shapely point columns to the pre-processed points. The model doesn't use them, so False saves a Python object per point ; they can be added later with add_point_geometry. Defaults to True.
+        archive (str | Path, optional): directory to write the pre-processed cross sections to as a memory-mapped archive (see xs_archive.py) ; the model runs, and worker processes, then read them from it instead of each holding a copy. Defaults to None.
+        adaptive (bool, optional): adaptive ensemble, runs are added one at a time and a cross section gets no more once the mode criterion of the output (2/3 of the runs within 5cm of the mode) is settled either way, so nruns is the most runs a cross section gets. The results then have an n_members column, the number of runs done. Defaults to False.
+        min_runs (int, optional): number of runs every cross section gets in the adaptive ensemble. Defaults to 3.
+        stage_grid (str, optional): depths the hydraulic depth curve is computed at, "uniform" (nVsteps evenly spaced depths) or "adaptive" (a coarse sweep of the same grid, refined where the curve bends, around its turning points and shoulders and over the flat parts of the cross section, so fewer depths are evaluated ; the depths are weighted in the smoothing). Defaults to "uniform".
+        cap_at_crest (bool, optional): end the depths, and so the bankfull search, below the lower bank crest (the lower of the highest points either side of the lowest point), where the bankfull would otherwise hit a cross section end. Fewer depths are evaluated, and a cross section with no depth below its crest gets no bankfull straight away (runs = 98 in the per run results) instead of maxr retries. Defaults to False.
+        profile (bool, optional): time and count the stages of the run (see HydXS_profiling.py), and return the report as a third output : a JSON-able dict of per stage wall / CPU seconds, counters (geometry evaluations, smoothing calls, retries, failures ...) and per cross section latency histograms. Defaults to False.
 
     Returns:
         pandas.DataFrame: output aggregate dataframe, it will have a value for each point, though some of them are cross section aggregated values.
@@ -115,9 +155,27 @@ def run_hydxs(
                 BankRight - Distance along cross section where first non river point is on right
                 CountAtBankFull - Number of runs that produces this bankfull measurement (only usefull for Mode outputs)
 
+            The final results also have a Fingerprint column : a hash of the pre-processed points of the cross section and of
+            the model settings, used to find the changed cross sections when they are passed back as previous.
+
+        With profile=True, the profiling report is returned as well.
+
     """
+    if profile:
+        arguments = dict(locals(), profile=False)
+        with profiling(Profiler()) as profiler:
+            XSdata4, XSdata2 = run_hydxs(**arguments)
+        return XSdata4, XSdata2, profiler.report()
+
     if isinstance(point_df, (str, Path)) == True:
-        point_df = pd.read_csv(point_df)
+        # CSV / Parquet / Feather / GIS file, by input_type or by extension ; only the columns used are read
+        with stage("read"):
+            point_df = read_points(
+                point_df,
+                input_type if input_type in FILE_INPUT_TYPES else None,
+                columns=point_columns(xy_col, z_col, xs_id_col, xs_order_col, riv_centre),
+            )
+        input_type = "GDF" if isinstance(point_df, geopandas.GeoDataFrame) else "DF"
         
     if not first or not last:
         xs_list = list(point_df[xs_id_col].unique())
@@ -127,42 +185,112 @@ def run_hydxs(
     if isinstance(out_data_path, (str)):
         out_data_path = Path(out_data_path)
         out_data_path.mkdir(exist_ok=True, parents=True)
+    if resume:
+        checkpoint = True
 
-    XSdata1 = wrangle_cross_section(
-        point_df=point_df,
-        input_type=input_type,
-        xy_col=xy_col,
-        z_col=z_col,
-        xs_id_col=xs_id_col,
-        xs_order_col=xs_order_col,
-        riv_centre=riv_centre,
-    )
+    with stage("wrangle"):
+        XSdata1 = wrangle_cross_section(
+            point_df=point_df,
+            input_type=input_type,
+            xy_col=xy_col,
+            z_col=z_col,
+            xs_id_col=xs_id_col,
+            xs_order_col=xs_order_col,
+            riv_centre=riv_centre,
+            make_points=make_points,
+        )
+        # points of each XS as one contiguous block, so every stage looks an XS up by slicing instead of filtering the whole table
+        XSindex1 = XSIndex(XSdata1)
 
     # 02: pre-processing
-    XSdata2 = preprocess_cross_section(
-        XSdata1,
-        xs_list = xs_list,
-        dR_cutoff=True,
-        dR_window=window,
-        dR_excl=exclude,
-    )
+    with stage("preprocess"):
+        XSdata2 = preprocess_cross_section(
+            XSdata1,
+            xs_list = xs_list,
+            dR_cutoff=True,
+            dR_window=window,
+            dR_excl=exclude,
+            xs_index=XSindex1,
+            archive=archive,
+        )
+        XSindex2 = model_xs_index(XSdata2)
+    logger.info("%d cross sections, %d points in the model", len(XSindex2), len(XSindex2.frame))
 
-    # 03: model runs
-    XSdata3 = HydXS_run(
-        XSdata2,
-        xs_list,
-        num_runs=nruns,
-        output_path=out_data_path,
-        maxrun=maxr,
-        steps=nVsteps,
-        minV=minVdep,
+    # fingerprint of each XS, and the XSs that changed since the previous results (all of them if there are none)
+    settings = dict(
+        maxr=maxr,
+        nVsteps=nVsteps,
+        minVdep=minVdep,
+        smoother=smoother,
+        geometry=geometry,
+        seed=seed,
     )
+    if stage_grid != "uniform":
+        settings["stage_grid"] = stage_grid
+    if cap_at_crest:
+        settings["cap_at_crest"] = cap_at_crest
+    with stage("fingerprints"):
+        if adaptive:
+            fingerprints = xs_fingerprints(
+                XSdata2, nruns=nruns, adaptive=adaptive, min_runs=min_runs, **settings
+            )
+        else:
+            fingerprints = xs_fingerprints(XSdata2, nruns=nruns, **settings)
+    run_list = xs_list
+    if previous is not None:
+        previous = read_previous(previous)
+        run_list = changed_xs(xs_list, fingerprints, previous)
+        logger.info("%d cross sections changed since the previous results", len(run_list))
+
+    # results of each (XS, run), kept on disk so a killed run can be resumed
+    store = None
+    if checkpoint:
+        store = CheckpointStore(
+            Path(out_data_path) / "HydXS_checkpoint.sqlite",
+            checkpoint_fingerprint(**settings),
+            xs_fingerprints(XSdata2),
+            resume=resume,
+        )
+
+    if previous is not None and len(run_list) == 0:
+        return merge_results(previous, previous.iloc[:0], xs_list), XSdata2
+
+    # 03: model runs (whatever is done is committed to the checkpoint, even if the run fails)
+    try:
+        XSdata3 = HydXS_run(
+            XSdata2,
+            run_list,
+            num_runs=nruns,
+            output_path=out_data_path,
+            maxrun=maxr,
+            steps=nVsteps,
+            minV=minVdep,
+            smoother=smoother,
+            geometry=geometry,
+            seed=seed,
+            workers=workers,
+            xs_index=XSindex2,
+            checkpoint=store,
+            cache=None if cache_dir is None else StageCache(cache_dir),
+            archive=None if archive is None else open_xs_archive(archive),
+            adaptive=adaptive,
+            min_runs=min_runs,
+            stage_grid=stage_grid,
+            cap_at_crest=cap_at_crest,
+        )
+    finally:
+        if store is not None:
+            store.close()
 
     # 04: model output
-    XSdata4 = calcoutputs(XSdata3, nruns)
+    with stage("output"):
+        XSdata4 = calcoutputs(XSdata3, nruns)
+        XSdata4["Fingerprint"] = XSdata4["CrossSection"].map(fingerprints)
+        if previous is not None:
+            XSdata4 = merge_results(previous, XSdata4, xs_list)
 
     # # 05: attach to original XS dataset
-    # XSdata5 = attach_HydXS(XSdata2, XSdata4, xs_list)
+    # XSdata5 = attach_HydXS(XSdata2, XSdata4, xs_list, xs_index=XSIndex(XSdata2))
     return XSdata4, XSdata2
 
 
@@ -0,0 +1,229 @@
+###############################################################################################################################
+#
+# spline_scipy.py
+#
+# native Python / SciPy port of spline_withR_NEW.py (no R, no rpy2)
+# selected in BankFullDetection mainFun with smoother="scipy"
+#
+###############################################################################################################################
+#
+# same algorithm as the R code in spline_withR_NEW.py (Luca Scrucca, 26/3/2014, with the Russell-MDAP amendments):
+#
+# 1. smoothing spline y = f(x) : natural cubic smoothing spline, solved with the Reinsch algorithm (banded system)
+#    the smoothing parameter uses the smooth.spline "spar" scale: x is scaled to [0,1] and
+#    lambda = r * 256^(3*spar - 1), r = tr(X'WX) / tr(Sigma) for the cubic B-spline basis on the knots
+# 2. spar selected by 10-fold CV over spar = log(seq(1, e, length = 100)), using the 1-SE rule
+#    folds are balanced and drawn at random, as in the R "folds" function
+# 3. stationary points from sign changes of f', refined with newtonraphson (tol = 1e-9, max.iter = 20)
+# 4. local maxima are the refined roots with f'' < 0
+#    (as in R, if there are candidates but newtonraphson converges for none of them, the CV is redrawn and refitted)
+#
+# differences to R: the spline uses every x as a knot (R smooth.spline thins the knots above 49 points),
+#                   and the fold sampling uses NumPy's random generator, so results match R in distribution, not bit-wise
+#
+# INPUT: depts, HydDept (as for spline_withR_NEW.runAlg) ; seed : optional seed / numpy Generator for the fold sampling
+#        w : optional weight of each depth (adaptive depth grid, see stage_sampling.py) ; also weights the CV error
+# OUTPUT: (deptsLM, HydDeptLM, spar, fit) , same as spline_withR_NEW.runAlg
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import logging
+
+import numpy as np
+from scipy.interpolate import BSpline
+from scipy.linalg import solveh_banded
+
+logger = logging.getLogger(__name__)
+
+# smoothing parameter grid, as in cv.smooth.spline
+SPAR_GRID = np.log(np.linspace(1, np.exp(1), 100))
+
+
+# natural cubic smoothing spline ----------------------------------------------------------------------------------------------
+# Reinsch algorithm (Green & Silverman 1994, ch. 2): (R + lam Q'W^-1Q) gamma = Q'y ; g = y - lam W^-1 Q gamma
+# returns (knots, g, gamma) : fitted values and second derivatives at the knots
+def _fit_spline(x, y, w, lam):
+    n = len(x)
+    h = np.diff(x)
+    ih = 1.0 / h
+    winv = 1.0 / w
+    # Q (n x n-2) : column j has 1/h[j], -1/h[j]-1/h[j+1], 1/h[j+1] on rows j, j+1, j+2
+    q0 = ih[:-1]
+    q1 = -ih[:-1] - ih[1:]
+    q2 = ih[1:]
+    # R (n-2 x n-2) tridiagonal
+    r_diag = (h[:-1] + h[1:]) / 3.0
+    r_off = h[1:-1] / 6.0
+    # Q'W^-1Q is pentadiagonal
+    d0 = q0**2 * winv[:-2] + q1**2 * winv[1:-1] + q2**2 * winv[2:]
+    d1 = q1[:-1] * q0[1:] * winv[1:-2] + q2[:-1] * q1[1:] * winv[2:-1]
+    d2 = q2[:-2] * q0[2:] * winv[2:-2]
+
+    m = n - 2
+    ab = np.zeros((3, m))
+    ab[2] = r_diag + lam * d0
+    ab[1, 1:] = r_off + lam * d1
+    ab[0, 2:] = lam * d2
+    qty = q0 * y[:-2] + q1 * y[1:-1] + q2 * y[2:]
+    gamma_in = solveh_banded(ab, qty)
+
+    qgamma = np.zeros(n)
+    qgamma[:-2] += q0 * gamma_in
+    qgamma[1:-1] += q1 * gamma_in
+    qgamma[2:] += q2 * gamma_in
+    g = y - lam * winv * qgamma
+    gamma = np.concatenate(([0.0], gamma_in, [0.0]))
+    return x, g, gamma
+
+
+# evaluate the spline (or its 1st/2nd derivative) at xnew ; linear beyond the end knots, as R predict.smooth.spline
+def _predict_spline(fit, xnew, deriv=0):
+    t, g, gamma = fit
+    xnew = np.asarray(xnew, dtype=float)
+    h = np.diff(t)
+    slope = np.diff(g) / h - h * (2 * gamma[:-1] + gamma[1:]) / 6.0
+    end_slope = (g[-1] - g[-2]) / h[-1] + h[-1] * (gamma[-2] + 2 * gamma[-1]) / 6.0
+
+    i = np.clip(np.searchsorted(t, xnew, side="right") - 1, 0, len(t) - 2)
+    u = xnew - t[i]
+    c3 = (gamma[i + 1] - gamma[i]) / (6.0 * h[i])
+    if deriv == 0:
+        out = g[i] + u * (slope[i] + u * (gamma[i] / 2.0 + u * c3))
+        out = np.where(xnew < t[0], g[0] + slope[0] * (xnew - t[0]), out)
+        out = np.where(xnew > t[-1], g[-1] + end_slope * (xnew - t[-1]), out)
+    elif deriv == 1:
+        out = slope[i] + u * (gamma[i] + 3.0 * u * c3)
+        out = np.where(xnew < t[0], slope[0], out)
+        out = np.where(xnew > t[-1], end_slope, out)
+    elif deriv == 2:
+        out = gamma[i] + 6.0 * u * c3
+        out = np.where((xnew < t[0]) | (xnew > t[-1]), 0.0, out)
+    else:
+        raise ValueError("deriv must be 0, 1 or 2")
+    return out
+
+
+# r = tr(X'WX) / tr(Sigma) for the cubic B-spline basis with knots at x (x scaled to [0,1]), as in smooth.spline
+def _penalty_ratio(x, w):
+    t = np.concatenate((np.repeat(x[0], 3), x, np.repeat(x[-1], 3)))
+    X = BSpline.design_matrix(x, t, 3)
+    trXWX = (X.multiply(X).T @ w).sum()
+    # B'' is piecewise linear, so a 2-point Gauss rule per knot interval integrates B''^2 exactly
+    h = np.diff(x)
+    offset = 0.5 / np.sqrt(3.0)
+    gauss = np.concatenate((x[:-1] + h * (0.5 - offset), x[:-1] + h * (0.5 + offset)))
+    nbasis = len(t) - 4
+    d2 = BSpline(t, np.eye(nbasis), 3).derivative(2)(gauss)
+    trSigma = (np.concatenate((h, h)) / 2.0) @ (d2**2).sum(axis=1)
+    return trXWX / trSigma
+
+
+def smooth_spline(x, y, spar, w=None, ratio=None):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    w = np.ones(len(x)) if w is None else np.asarray(w, dtype=float)
+    x0 = x[0]
+    xrange = x[-1] - x[0]
+    xbar = (x - x0) / xrange
+    if ratio is None:
+        ratio = _penalty_ratio(xbar, w)
+    fit = _fit_spline(xbar, y, w, ratio * 256.0 ** (3 * spar - 1))
+    return fit, x0, xrange
+
+
+def predict(spline, xnew, deriv=0):
+    fit, x0, xrange = spline
+    return _predict_spline(fit, (np.asarray(xnew, dtype=float) - x0) / xrange, deriv) / xrange**deriv
+
+
+# 10-fold CV for spar with the 1-SE rule, as cv.smooth.spline in spline_withR_NEW.py --------------------------------------------
+def folds(n, k, rng):
+    fold = rng.permutation(np.arange(n) % k)
+    return [np.flatnonzero(fold == i) for i in range(k)]
+
+
+def cv_smooth_spline(x, y, rng, nfold=10, spar=SPAR_GRID, w=None):
+    n = len(y)
+    w = np.ones(n) if w is None else np.asarray(w, dtype=float)
+    xfolds = folds(n, nfold, rng)
+    err = np.full((len(spar), nfold), np.nan)
+    for i, test in enumerate(xfolds):
+        train = np.setdiff1d(np.arange(n), test)
+        xtrain = x[train]
+        xbar = (xtrain - xtrain[0]) / (xtrain[-1] - xtrain[0])
+        ratio = _penalty_ratio(xbar, w[train])
+        for s, sp in enumerate(spar):
+            mod = smooth_spline(xtrain, y[train], sp, w=w[train], ratio=ratio)
+            err[s, i] = np.sum(w[test] * (y[test] - predict(mod, x[test])) ** 2)
+    cv_error = err.sum(axis=1) / n
+    folds_size = np.array([len(f) for f in xfolds])
+    se = np.sqrt(np.var(err / folds_size, axis=1, ddof=1) / nfold)
+    best = np.argmin(cv_error)
+    est = spar[best]
+    oneserule = (cv_error + se)[best]
+    above = spar >= est
+    est1se = spar[above][np.flatnonzero(cv_error[above] <= oneserule)[0]]
+    return {"spar": spar, "error": cv_error, "se": se, "sparmin": est, "spar1se": est1se}
+
+
+# Newton-Raphson to find x such that f'(x) == 0 ; NaN if not converged ------------------------------------------------------------
+def newtonraphson(spline, x0, tol=0.000000001, max_iter=20):
+    x = x0
+    f1 = predict(spline, x, deriv=1)
+    f2 = predict(spline, x, deriv=2)
+    it = 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        while abs(f1) > tol and it < max_iter:
+            x = x - f1 / f2
+            f1 = predict(spline, x, deriv=1)
+            f2 = predict(spline, x, deriv=2)
+            it += 1
+    if not abs(f1) <= tol:
+        return np.nan
+    return float(x)
+
+
+# local maxima of the CV-selected smoothing spline, as definitiveFunc in spline_withR_NEW.py -------------------------------------
+def definitiveFunc(x, y, rng, w=None):
+    check = True
+    while check:
+        cv = cv_smooth_spline(x, y, rng, w=w)
+        fit = smooth_spline(x, y, cv["spar1se"], w=w)
+        fderiv1 = predict(fit, x, deriv=1)
+        # stationary points
+        candidates = x[np.flatnonzero(np.diff(np.sign(fderiv1)) != 0)]
+        if len(candidates) > 0:
+            xsol = np.array([newtonraphson(fit, c) for c in candidates])
+            xsol = xsol[~np.isnan(xsol)]
+            if len(xsol) > 0:
+                local_max = xsol[predict(fit, xsol, deriv=2) < 0]
+                out = np.column_stack((local_max, predict(fit, local_max)))
+                check = False
+        else:
+            out = np.empty((0, 2))
+            check = False
+    return out, cv["spar1se"], predict(fit, x)
+
+
+# drop-in replacement for spline_withR_NEW.runAlg --------------------------------------------------------------------------------
+def runAlg(depts, HydDept, seed=None, w=None):
+    y = np.array(HydDept, dtype=float)
+    x = np.array(depts, dtype=float)
+    rng = np.random.default_rng(seed)
+    spar = [None]
+    try:
+        out, spar[0], fit = definitiveFunc(x, y, rng, w=w)
+        fitList = list(fit)
+        if len(out) > 0:
+            return list(out[:, 0]), list(out[:, 1]), spar[0], fitList
+        else:
+            return [x[-1]], [y[-1]], spar[0], fitList
+    except Exception as e:
+        # no smoothing : mainFun then takes the top of the depth grid, which usually hits the XS boundaries
+        logger.debug("spline smoothing failed : %s", e)
+        return [None], [None], spar[0], [None]
+
+
+# end
@@ -0,0 +1,94 @@
+###############################################################################################################################
+#
+# stage_geometry.py
+#
+# analytic (closed-form) stage geometry for a single cross section
+# used in BankFullDetection_NEW.mainFun / calc_hyd_outputs when geometry="analytic"
+#
+# the shapely path in mainFun builds a box and a water-table line for every stage and intersects them with the XS polygon,
+# ie. 3 GEOS calls per stage (600 per XS at nVsteps=200)
+# here the XS profile is treated as a chain of straight segments between the (Distance, Z) vertices, so for a water level h
+# each segment is either dry, fully wet or partly wet, and its wet area / wet perimeter / top width have closed forms:
+#   fully wet  (h >= zhi) : width = dx ; perimeter = L ; area = dx * (h - (z1 + z2) / 2)
+#   partly wet (zlo < h < zhi) : f = (h - zlo) / (zhi - zlo) ; width = f*dx ; perimeter = f*L ; area = f*dx*(h - zlo)/2
+#   dry        (h <= zlo) : all zero
+# all stages and all segments are evaluated in one (n_stages, n_segments) NumPy pass
+#
+# allow_multichannel=False mirrors the MDAP amendment in mainFun (only the wet polygon containing the XS minimum is kept):
+#   a segment belongs to the channel containing the minimum if every vertex between it and the minimum is below h
+#
+# INPUT: pointList = (Distance, Z) points of a single XS (shapely Points or tuples, in order along the XS)
+#        depts = water levels (elevations) to evaluate
+# OUTPUT: wet area, wet perimeter and top width, one value per stage
+#
+# example:
+#    area, perimeter, width = stage_geometry(dtemp, np.linspace(minY + 0.1, maxY - 0.1, 200))
+#    HydDept = area / width
+#    HydRad = area / perimeter
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import numpy as np
+
+
+# (Distance, Z) points to a (n, 2) float array ---------------------------------------------------------------------------------
+def profile_array(pointList):
+    if isinstance(pointList, np.ndarray):
+        return np.asarray(pointList, dtype=float)
+    return np.array(
+        [tuple(p.coords[0]) if hasattr(p, "coords") else tuple(p) for p in pointList],
+        dtype=float,
+    )
+
+
+# highest vertex between each segment and the XS minimum ------------------------------------------------------------------------
+# a segment is connected to the channel holding the minimum at stage h if this value is below h
+def _barrier_heights(z):
+    k = int(np.argmin(z))
+    barrier = np.full(len(z) - 1, -np.inf)
+    # segments left of the minimum: segment j spans vertices j, j+1 ; barrier = max(z[j+1:k])
+    if k > 1:
+        barrier[: k - 1] = np.maximum.accumulate(z[1:k][::-1])[::-1]
+    # segments right of the minimum: segment j (j >= k) ; barrier = max(z[k+1:j+1])
+    if k < len(z) - 2:
+        barrier[k + 1 :] = np.maximum.accumulate(z[k + 1 : -1])
+    return barrier
+
+
+# main analytic geometry function ----------------------------------------------------------------------------------------------
+def stage_geometry(pointList, depts, allow_multichannel=False):
+    xz = profile_array(pointList)
+    x = xz[:, 0]
+    z = xz[:, 1]
+    h = np.atleast_1d(np.asarray(depts, dtype=float))[:, None]
+
+    dx = np.diff(x)[None, :]
+    z1 = z[:-1][None, :]
+    z2 = z[1:][None, :]
+    zlo = np.minimum(z1, z2)
+    zhi = np.maximum(z1, z2)
+    dz = zhi - zlo
+    seglen = np.hypot(dx, dz)
+
+    full = h >= zhi
+    part = (h > zlo) & ~full
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = np.where(part, (h - zlo) / np.where(dz > 0, dz, 1.0), 0.0)
+    frac = np.where(full, 1.0, frac)
+
+    width = frac * dx
+    perimeter = frac * seglen
+    area = np.where(full, dx * (h - 0.5 * (z1 + z2)), 0.5 * width * (h - zlo))
+
+    if not allow_multichannel:
+        connected = _barrier_heights(z)[None, :] < h
+        width = np.where(connected, width, 0.0)
+        perimeter = np.where(connected, perimeter, 0.0)
+        area = np.where(connected, area, 0.0)
+
+    return area.sum(axis=1), perimeter.sum(axis=1), width.sum(axis=1)
+
+
+# end stage_geometry
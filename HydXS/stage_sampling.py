@@ -0,0 +1,137 @@
+###############################################################################################################################
+#
+# stage_sampling.py
+#
+# adaptive (coarse-to-fine) depth grid for the hydraulic depth curve of a single cross section
+# used in BankFullDetection_NEW.stage_curve when stage_grid="adaptive"
+#
+# the uniform grid (np.linspace(minY + 0.1, maxY - 0.1, nVsteps)) spends the same number of stages on every XS, however deep, and
+# most of them on stretches where the HydDept curve is close to a straight line ; here, on the stages of that uniform grid
+#   1. a coarse sweep : every COARSE_STRIDE-th stage (and the last one), and every stage over the elevation range of the flat
+#      segments of the XS (gradient below FLAT of the median) ; the wet width grows fast over them, so HydDept has a shoulder
+#      there (where bankfull often is) that is only a few stages wide
+#   2. bisection : the middle stage of an interval is evaluated, and if HydDept there is further than TOLERANCE (a share of the
+#      HydDept range) from the straight line between the interval ends, both halves are split again, down to single steps ;
+#      the other kinks of the curve, at the vertex elevations where the wet width changes pace, are found this way
+#   3. around each turning point of HydDept (a candidate bankfull) and each shoulder (its slope drops below SHOULDER of the slope
+#      below), every stage within COARSE_STRIDE stages is added, so the bankfull is located on the same stages as with the
+#      uniform grid (the curve is flat there, so step 2 leaves it sparse)
+# so the depth grid is a subset of the uniform grid, dense where the curve bends and sparse where it is straight
+#
+# the stages are not evenly spaced any more, so each one gets a weight proportional to the depth range it stands for (the mean
+# distance to its neighbours, scaled to a mean of 1) ; the smoothing spline (runAlg in spline_withR_NEW.py / spline_scipy.py)
+# is fitted with these weights, so the densely sampled stretches don't pull the fit more than they do with the uniform grid
+#
+# INPUT: evaluate = function of an array of depths, giving (HydDept, HydRad) at those depths (see stage_hydraulics in
+#        BankFullDetection_NEW.py) ; profile = (Distance, Z) points of the XS ; lo / hi = first and last depth ;
+#        nVsteps = stages of the uniform grid
+# OUTPUT: depts (sorted), weights, HydDept, HydRad
+#
+# example:
+#    depts, weights, HydDept, HydRad = adaptive_stages(evaluate, profile, minY + 0.1, maxY - 0.1, 200)
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import numpy as np
+
+# spacing of the coarse sweep, in uniform grid stages
+COARSE_STRIDE = 8
+# largest distance of HydDept from a straight line over an interval that isn't split, as a share of the HydDept range
+TOLERANCE = 0.002
+# a stage where the slope of HydDept drops below this share of the slope below it is a shoulder
+SHOULDER = 0.5
+# a segment of the XS profile whose gradient is below this share of the median gradient is flat
+FLAT = 0.5
+
+
+# main adaptive sampling function ---------------------------------------------------------------------------------------------
+def adaptive_stages(evaluate, profile, lo, hi, nVsteps=200):
+    uniform = np.linspace(lo, hi, nVsteps)
+    # stages evaluated so far, as positions in the uniform grid
+    index = np.arange(0, nVsteps, COARSE_STRIDE)
+    index = np.unique(
+        np.concatenate((index, [nVsteps - 1], flat_stages(profile, uniform)))
+    )
+    HydDept, HydRad = evaluate(uniform[index])
+    tol = TOLERANCE * (np.nanmax(HydDept) - np.nanmin(HydDept))
+
+    # add the stages at positions new, evaluated, keeping the stages in order
+    def add(new):
+        nonlocal index, HydDept, HydRad
+        HydDeptNew, HydRadNew = evaluate(uniform[new])
+        index = np.concatenate((index, new))
+        order = np.argsort(index, kind="stable")
+        index = index[order]
+        HydDept = np.concatenate((HydDept, HydDeptNew))[order]
+        HydRad = np.concatenate((HydRad, HydRadNew))[order]
+
+    # bisection of the intervals where the curve isn't straight (a NaN is never straight)
+    split = np.diff(index) > 1
+    while split.any():
+        left = index[:-1][split]
+        right = index[1:][split]
+        mid = (left + right) // 2
+        f = (mid - left) / (right - left)
+        line = HydDept[:-1][split] * (1 - f) + HydDept[1:][split] * f
+        add(mid)
+        deviation = np.abs(HydDept[np.searchsorted(index, mid)] - line)
+        bent = ~(deviation <= tol)
+        starts = np.concatenate((left[bent], mid[bent]))
+        split = np.isin(index[:-1], starts) & (np.diff(index) > 1)
+
+    # turning points (sign changes of the slope ; NaN stages count as turning points) and shoulders (the slope drops) of HydDept,
+    # with every stage within COARSE_STRIDE stages of them ; the curve is flat there, so the bisection leaves it sparse
+    slope = np.diff(HydDept) / np.diff(uniform[index])
+    below, above = slope[:-1], slope[1:]
+    candidate = ~(below * above > 0) | ~(np.abs(above) >= SHOULDER * np.abs(below))
+    candidate = index[np.flatnonzero(candidate) + 1]
+    if len(candidate) > 0:
+        near = np.abs(np.arange(nVsteps)[:, None] - candidate[None, :]).min(axis=1)
+        fill = np.setdiff1d(np.flatnonzero(near <= COARSE_STRIDE), index)
+        if len(fill) > 0:
+            add(fill)
+
+    depts = uniform[index]
+    return depts, stage_weights(depts), HydDept, HydRad
+
+
+# end adaptive_stages
+
+
+# stages of the uniform grid over the elevation range of a flat segment of the XS profile, or a step either side of it ----------
+# the wet width grows fast there, so HydDept has a shoulder (a possible bankfull) at most a few steps wide
+def flat_stages(profile, uniform):
+    profile = np.asarray(profile, dtype=float)
+    if len(profile) < 2 or len(uniform) < 2:
+        return np.empty(0, dtype=int)
+    dx = np.abs(np.diff(profile[:, 0]))
+    z1, z2 = profile[:-1, 1], profile[1:, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gradient = np.abs(z2 - z1) / dx
+    flat = gradient < FLAT * np.nanmedian(gradient)
+    step = uniform[1] - uniform[0]
+    low = np.minimum(z1, z2)[flat] - step
+    high = np.maximum(z1, z2)[flat] + step
+    over = (uniform[:, None] >= low[None, :]) & (uniform[:, None] <= high[None, :])
+    return np.flatnonzero(over.any(axis=1))
+
+
+# end flat_stages
+
+
+# weight of each stage : mean distance to its neighbours (the one neighbour at either end), scaled to a mean of 1 -------------
+# all ones for an evenly spaced grid
+def stage_weights(depts):
+    depts = np.asarray(depts, dtype=float)
+    if len(depts) < 2:
+        return np.ones(len(depts))
+    spacing = np.diff(depts)
+    weights = np.concatenate(
+        ([spacing[0]], (spacing[:-1] + spacing[1:]) / 2, [spacing[-1]])
+    )
+    return weights / weights.mean()
+
+
+# end stage_weights
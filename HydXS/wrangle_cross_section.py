@@ -7,10 +7,15 @@
 # input: *****to fill in
 # output: a dataframe with XS (many rows per XS) + x_sec_id , x_sec_order , POINT_X , POINT_Y , POINT_Z + XY point + DZ point + Distance
 #
+# columnar: the points are sorted by (x_sec_id, x_sec_order) once, the distance between consecutive points is np.hypot of the
+# coordinate differences and Distance is its cumulative sum within each XS ; rows are returned in input order
+# the XY / DZ shapely points are made with the shapely 2 vectorised constructor, and only if make_points=True
+#
 ###############################################################################################################################
 
 
 # importing libraries etc  ----------------------------------------------------------------------------------------------------
+import logging
 import numpy as np
 import pandas as pd
 import geopandas as gpd
@@ -19,20 +24,29 @@ from shapely.geometry import Polygon
 from shapely.geometry import box
 from shapely.geometry import LineString
 from shapely.geometry import Point
+import shapely
+from geopandas import GeoDataFrame
+from pathlib import Path
+
+from .HydXS_io import read_points, point_columns, FILE_INPUT_TYPES
 
+logger = logging.getLogger(__name__)
 
 # high-level wrangle_cross_section function ---------------------------------------------------------------------------------
 # # point_df is the cross-section dataframe, OR geopandas dataframe, OR path to a csv or GIS file
-# # input_type : DF (dataframe) / GDF (geopandas dataframe) / CSV (path to CSV) / GIS (path to GIS)
+# # input_type : DF (dataframe) / GDF (geopandas dataframe) / CSV (path to CSV) / PARQUET (path to Parquet)
+# #   / FEATHER (path to Feather / Arrow IPC) / GIS (path to GIS file, eg. shapefile or GeoPackage) ; see HydXS_io.py
 # # xy_col : names of X and Y columns
 # #   if dataframe, is a tuple of the names of the X and Y columns
-# #   if geopandas, then name of the XY 'geometry' column
-# #   if CSV path, is a tuple of the names of the X and Y columns
+# #   if geopandas or GIS path, then name of the XY 'geometry' column
+# #   if CSV / Parquet / Feather path, is a tuple of the names of the X and Y columns
 # # z_col : name of elevation column, eg. POINT_Z
 # # xs_id_col : name of cross-section unique identifier column
 # # xs_order_col : name of column that sorts the points of the cross-section in order
 # # riv_centre : name of column that is TRUE/1 at river centre (only one value/row per cross-section)
 # #           OR path to shapefile if 'point_df' is geopandas or path
+# make_points : add the PointXY and PointDZ shapely point columns ; False leaves them out (Distance is computed either way)
+#   the Bankfull calc doesn't need them (it uses the Distance / POINT_Z arrays, see xs_ragged.py) ; add_point_geometry adds them later
 
 
 def wrangle_cross_section(
@@ -43,31 +57,32 @@ def wrangle_cross_section(
     xs_id_col="x_sec_id",
     xs_order_col="x_sec_order",
     riv_centre="RivCentre",
+    make_points=True,
 ):
     # check consistency of data input
     if (
         (input_type == "DF" and not type(point_df) == pd.DataFrame)
         or (input_type == "GDF" and not type(point_df) == GeoDataFrame)
-        or (
-            input_type == "CSV"
-            and not (type(point_df) == str and point_df[-3:].upper() == "CSV")
-        )
-        or (
-            input_type == "GIS"
-            and not (type(point_df) == str and point_df[-3:].upper() == "GIS")
-        )
+        or (input_type in FILE_INPUT_TYPES and not isinstance(point_df, (str, Path)))
+        or input_type not in ("DF", "GDF") + FILE_INPUT_TYPES
     ):
         raise ValueError("mismatch between input_type and point_df")
 
-    # bring in data
+    # bring in data ; from files, only the columns used here
     if input_type in ("DF", "GDF"):
         xs = pd.DataFrame(point_df)
-    elif input_type == "CSV":
-        pass  # to do
-    elif input_type == "GIS":
-        pass  # to do
-    print(xs.head())
-    xs["POINT_Z"] = pd.to_numeric(xs[z_col], errors="coerce")
+    else:
+        xs = pd.DataFrame(
+            read_points(
+                point_df,
+                input_type,
+                columns=point_columns(
+                    xy_col, z_col, xs_id_col, xs_order_col, riv_centre
+                ),
+            )
+        )
+    logger.debug("input points :\n%s", xs.head())
+    xs["POINT_Z"] = as_numeric(xs[z_col])
 
     xs["x_sec_id"] = xs[xs_id_col]
     xs["x_sec_order"] = xs[xs_order_col]
@@ -75,23 +90,31 @@ def wrangle_cross_section(
     # not complete if shape file
 
     # add XY point geometry
-    if input_type == "GDF":
-        xs["PointXY"] = xs[xy_col]
+    if input_type in ("GDF", "GIS"):
+        xs["POINT_X"] = shapely.get_x(np.asarray(xs[xy_col]))
+        xs["POINT_Y"] = shapely.get_y(np.asarray(xs[xy_col]))
     else:
-        xs["POINT_X"] = pd.to_numeric(xs[xy_col[0]], errors="coerce")
-        xs["POINT_Y"] = pd.to_numeric(xs[xy_col[1]], errors="coerce")
-
-        xs["PointXY"] = xs.apply(make_xs_point_xy, axis=1)
-    # add distance
-    # initialise output
-    xs["Distance"] = 0.0
-    # loop over unique values of x_sec_id (in case they are not sequential)
-    for i in set(xs[xs_id_col]):
-        xs_i = xs[xs[xs_id_col] == i]
-        xs_i = xs_distance(xs_i, sort_column=xs_order_col)
-        xs.loc[xs[xs_id_col] == i, "Distance"] = xs_i["Distance"].to_list()
-    # add Distance-Depth points
-    xs["PointDZ"] = xs.apply(make_xs_point_distZ, axis=1)
+        xs["POINT_X"] = as_numeric(xs[xy_col[0]])
+        xs["POINT_Y"] = as_numeric(xs[xy_col[1]])
+    # add distance, cumulative along each XS
+    xs["Distance"] = xs_distances(
+        xs["x_sec_id"], xs["x_sec_order"], xs["POINT_X"], xs["POINT_Y"]
+    )
+    if not make_points:
+        return xs[
+            [
+                "x_sec_id",
+                "x_sec_order",
+                "POINT_X",
+                "POINT_Y",
+                "POINT_Z",
+                "Distance",
+                "RivCentre",
+            ]
+        ]
+    # add XY and Distance-Depth points
+    xs["PointXY"] = make_xs_points_xy(xs)
+    xs["PointDZ"] = make_xs_points_distZ(xs)
 
     return xs[
         [
@@ -111,6 +134,13 @@ def wrangle_cross_section(
 # end wrangle_cross_section
 
 
+# numeric column : typed columns (eg. from Parquet / Feather) as they are, others through pd.to_numeric (unparseable -> NaN)
+def as_numeric(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column
+    return pd.to_numeric(column, errors="coerce")
+
+
 # redefine points as XY or Distance-Z ------------------------------------------------------------------------------------------
 # both used in wrangle_cross_section
 def make_xs_point_xy(x):
@@ -121,7 +151,50 @@ def make_xs_point_distZ(x):
     return Point(x["Distance"], x["POINT_Z"])
 
 
-# distancing function ----------------------------------------------------------------------------------------------------------
+# same, for a whole dataframe at once (shapely 2 vectorised constructor) ; object array of Points, one per row
+def make_xs_points_xy(xs):
+    return shapely.points(
+        xs["POINT_X"].to_numpy(dtype=float), xs["POINT_Y"].to_numpy(dtype=float)
+    )
+
+
+def make_xs_points_distZ(xs):
+    return shapely.points(
+        xs["Distance"].to_numpy(dtype=float), xs["POINT_Z"].to_numpy(dtype=float)
+    )
+
+
+# add the PointXY and PointDZ shapely point columns to a dataframe made with make_points=False (eg. for plotting or export)
+# the columns are put in the same places as wrangle_cross_section(make_points=True) puts them
+def add_point_geometry(xs):
+    xs = xs.copy()
+    xs.insert(xs.columns.get_loc("POINT_Z") + 1, "PointXY", make_xs_points_xy(xs))
+    xs.insert(xs.columns.get_loc("Distance") + 1, "PointDZ", make_xs_points_distZ(xs))
+    return xs
+
+
+# cumulative distance along every XS at once ---------------------------------------------------------------------------------
+# used in wrangle_cross_section
+# points are put in (XS, order) sequence, the step between consecutive points is np.hypot of the X and Y differences,
+# reset to zero at the first point of each XS, and summed within each XS
+# OUTPUT : numpy array of Distance, in the row order of the input
+def xs_distances(xs_id, xs_order, x, y):
+    codes = pd.factorize(np.asarray(xs_id))[0]
+    order = np.lexsort((np.asarray(xs_order), codes))
+    codes = codes[order]
+    x = np.asarray(x, dtype=float)[order]
+    y = np.asarray(y, dtype=float)[order]
+    step = np.empty(len(order))
+    if len(order) > 0:
+        step[0] = 0.0
+        step[1:] = np.hypot(np.diff(x), np.diff(y))
+        step[1:][codes[1:] != codes[:-1]] = 0.0
+    distance = np.empty(len(order))
+    distance[order] = pd.Series(step).groupby(codes, sort=False).cumsum().to_numpy()
+    return distance
+
+
+# distancing function, single XS (see xs_distances for the whole dataframe) ------------------------------------------------------
 def xs_distance(xs, sort_column="index"):
     # input is single cross section
     tempxs = xs.reset_index().sort_values(by=sort_column)
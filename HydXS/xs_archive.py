@@ -0,0 +1,140 @@
+###############################################################################################################################
+#
+# xs_archive.py
+#
+# on-disk archive of pre-processed (trimmed, inXS == True) cross sections, for runs over more XSs than fit in memory, and so
+# many worker processes can read the same XSs without each holding a copy
+#
+# the archive is a directory of .npy files, opened memory-mapped (np.load(mmap_mode="r")) :
+#   ids.npy     : XS identities, sorted
+#   offsets.npy : start row of each XS in dz.npy, and the total number of rows
+#   dz.npy      : (number of points, 2) float64 (Distance, Z) of every inXS point, one contiguous block per XS, in x_sec_order
+#   meta.npy    : per XS : riverMin, first and last x_sec_order kept by the trimming (trim bounds), number of points
+# a profile is a slice of the memory map (no copy) ; the OS page cache is shared by every process reading the archive
+#
+# XSArchive has the same interface as RaggedXS (see xs_ragged.py), and can be used in its place in HydXS_run / HydXS_perXS
+# (archive=...) ; it is pickled as its path, and the Bankfull tasks carry an ArchiveProfile (archive, XS) instead of the points,
+# so worker processes open the archive themselves (once per process) and read their XSs from it
+#
+# INPUT: write_xs_archive(path, data) : output of preprocess_cross_section (or preprocess_cross_section(..., archive=path))
+# OUTPUT: open_xs_archive(path) = XSArchive
+#
+# example:
+#    XSdata2 = preprocess_cross_section( XSdata1 , xs_list , archive="model_outputs/xs_archive" )
+#    archive = open_xs_archive("model_outputs/xs_archive")
+#    XSdata3 = HydXS_run( None, list(archive.ids), num_runs=nruns, smoother="scipy", seed=1, workers=8, archive=archive )
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .xs_index import XSIndex
+
+META_DTYPE = np.dtype(
+    [("riverMin", "f8"), ("first", "i8"), ("last", "i8"), ("n_points", "i8")]
+)
+
+# archives opened in this process, by path ; so unpickling many tasks doesn't reopen the files
+_OPEN = {}
+
+
+# write the inXS points of a pre-processed dataframe as an archive (a directory, created if needed, files overwritten) --------
+def write_xs_archive(path, data):
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    index = XSIndex(data, mask=data["inXS"] == True)
+    frame = index.frame
+    starts = index.offsets[:-1]
+    order = frame["x_sec_order"].to_numpy()
+    meta = np.zeros(len(index.ids), dtype=META_DTYPE)
+    if "riverMin" in frame.columns and len(frame) > 0:
+        meta["riverMin"] = frame["riverMin"].to_numpy(dtype=float)[starts]
+    else:
+        meta["riverMin"] = np.nan
+    if len(frame) > 0:
+        meta["first"] = np.minimum.reduceat(order, starts)
+        meta["last"] = np.maximum.reduceat(order, starts)
+    meta["n_points"] = np.diff(index.offsets)
+    dz = np.column_stack(
+        (
+            frame["Distance"].to_numpy(dtype=float),
+            frame["POINT_Z"].to_numpy(dtype=float),
+        )
+    )
+    # each file is written aside and moved into place, so memory maps of an older archive at this path stay valid
+    _OPEN.pop(str(path), None)
+    for name, values in (
+        ("ids", index.ids),
+        ("offsets", index.offsets),
+        ("dz", dz),
+        ("meta", meta),
+    ):
+        np.save(path / (name + ".tmp.npy"), values)
+        os.replace(path / (name + ".tmp.npy"), path / (name + ".npy"))
+    return path
+
+
+# end write_xs_archive
+
+
+def open_xs_archive(path):
+    return XSArchive(path)
+
+
+class XSArchive:
+    def __init__(self, path):
+        self.path = str(Path(path))
+        if self.path not in _OPEN:
+            directory = Path(self.path)
+            ids = np.load(directory / "ids.npy")
+            _OPEN[self.path] = (
+                ids,
+                np.load(directory / "offsets.npy"),
+                np.load(directory / "dz.npy", mmap_mode="r"),
+                np.load(directory / "meta.npy"),
+                {i: k for k, i in enumerate(ids.tolist())},
+            )
+        self.ids, self.offsets, self.dz, self._meta, self._position = _OPEN[self.path]
+
+    # pickled as its path, reopened (memory-mapped) in the process that unpickles it
+    def __reduce__(self):
+        return (XSArchive, (self.path,))
+
+    def __contains__(self, i):
+        return i in self._position
+
+    def __len__(self):
+        return len(self.ids)
+
+    # (Distance, Z) points of XS i, read-only slice of the memory map ; an empty (0, 2) array if XS i isn't in the archive
+    def profile(self, i):
+        k = self._position.get(i)
+        if k is None:
+            return self.dz[:0]
+        return self.dz[self.offsets[k] : self.offsets[k + 1]]
+
+    # riverMin / first / last / n_points of every XS, indexed by XS identity
+    def meta(self):
+        return pd.DataFrame(self._meta, index=self.ids)
+
+
+# end XSArchive
+
+
+# reference to the points of one XS of an archive, read when the Bankfull calc runs (see HydXS_oneXS in HydXS_modelling.py)
+class ArchiveProfile(NamedTuple):
+    archive: XSArchive
+    i: int
+
+    def load(self):
+        return self.archive.profile(self.i)
+
+
+# end ArchiveProfile
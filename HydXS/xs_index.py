@@ -0,0 +1,73 @@
+###############################################################################################################################
+#
+# xs_index.py
+#
+# cross-section index : the points of every XS as one contiguous block, looked up by XS identity
+# built once in run_hydxs and passed through preprocess_cross_section, HydXS_run / HydXS_perXS and attach_HydXS
+#
+# the dataframe is sorted by (x_sec_id, x_sec_order) once, so the points of each XS are in x_sec_order whatever the row order of
+# the input (the Distance of wrangle_cross_section follows x_sec_order, and the XS polygon of the Bankfull calc is made from the
+# points in row order) ; without an x_sec_order column, by x_sec_id only (stable, so points keep their order within each XS)
+# the start/end offset of each XS is stored, and a lookup is then a positional slice of the sorted frame instead of a boolean
+# filter over the whole dataset (which made every stage O(number of points x number of XS))
+#
+# INPUT: dataframe with an x_sec_id column (and x_sec_order) ; optional mask of the rows to keep (eg. data["inXS"] == True)
+# OUTPUT: XSIndex ; index.get(i) = points of XS i (empty frame if XS i has no points), in x_sec_order
+#
+# example:
+#    index = XSIndex(XSdata2, mask=XSdata2["inXS"] == True)
+#    subset = index.get(641)
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import numpy as np
+
+
+class XSIndex:
+    def __init__(self, data, id_col="x_sec_id", mask=None, order_col="x_sec_order"):
+        ids = data[id_col].to_numpy()
+        if order_col in data.columns:
+            order = np.lexsort((data[order_col].to_numpy(), ids))
+        else:
+            order = np.argsort(ids, kind="stable")
+        if mask is not None:
+            order = order[np.asarray(mask, dtype=bool)[order]]
+        self.frame = data.iloc[order]
+        self.ids, starts = np.unique(ids[order], return_index=True)
+        self.offsets = np.append(starts, len(order))
+        self._position = {i: k for k, i in enumerate(self.ids.tolist())}
+
+    def __contains__(self, i):
+        return i in self._position
+
+    def __len__(self):
+        return len(self.ids)
+
+    # start and end row of XS i in self.frame ; (0, 0) if XS i has no points
+    def bounds(self, i):
+        k = self._position.get(i)
+        if k is None:
+            return 0, 0
+        return self.offsets[k], self.offsets[k + 1]
+
+    def get(self, i):
+        start, end = self.bounds(i)
+        return self.frame.iloc[start:end]
+
+    # rows of self.frame holding the XSs in xs_list (in that order, XSs without points give no rows),
+    # and the start row of each of those XSs within the selection, plus the total number of rows
+    def rows(self, xs_list):
+        bounds = np.array([self.bounds(i) for i in xs_list], dtype=int).reshape(-1, 2)
+        lengths = bounds[:, 1] - bounds[:, 0]
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        rows = np.arange(offsets[-1]) - np.repeat(offsets[:-1] - bounds[:, 0], lengths)
+        return rows, offsets
+
+    # points of the XSs in xs_list, in that order
+    def take(self, xs_list):
+        return self.frame.iloc[self.rows(xs_list)[0]]
+
+
+# end XSIndex
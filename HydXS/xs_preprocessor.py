@@ -19,6 +19,11 @@
 #     XSdata2 = preprocess_cross_section( XSdata1 , dR_first = first , dR_last = last , dR_cutoff=True , dR_centre = centre , dR_window = window , dR_excl = exclude )
 #
 # this can be used to process one XS at a time, or a subset of XSs
+# xs_index : XSIndex of the wrangled dataframe (see xs_index.py) ; built here if not given
+# archive : path ; if given, the trimmed (inXS) points are also written there as a memory-mappable archive (see xs_archive.py)
+#
+# the XSs are gathered with a single positional take, and the trimming (XS_UseCentre) is done for all of them in one pass
+# (xs_use_centre), with per-XS reductions over the concatenated arrays instead of row loops per XS
 #
 ###############################################################################################################################
 
@@ -33,6 +38,9 @@ from shapely.geometry import box
 from shapely.geometry import LineString
 from shapely.geometry import Point
 
+from .xs_index import XSIndex
+from .xs_archive import write_xs_archive
+
 
 # high-level preprocessing function  -------------------------------------------------------------------------------------------
 def preprocess_cross_section(
@@ -42,27 +50,28 @@ def preprocess_cross_section(
     dR_centre="RivCentre",
     dR_window=10,
     dR_excl=(0, 9999),
+    xs_index=None,
+    archive=None,
 ):
     # Take output from wrangle_cross_section()
-    xs_df = pd.DataFrame(xs)
-    dataset2 = pd.DataFrame()
-    # cycle through each XS
-    for n,i in enumerate(xs_list):
-        temp = xs_df[xs_df["x_sec_id"] == i].reset_index()
-        if len(temp) == 0 or i in dR_excl:
-            pass
-        else:
-            if dR_cutoff == True:
-                # cutting off the XS where minimum is not in the river centre
-                newdata = XS_UseCentre(temp, dR_centre, dR_window)
-            else:
-                # pass through whole XS untampered
-                temp["inXS"] = True
-                newdata = temp
-            if n == 0:
-                dataset2 = newdata
-            else:
-                dataset2 = pd.concat([dataset2, newdata], ignore_index=True)
+    if xs_index is None:
+        xs_index = XSIndex(xs)
+    # rows of each XS to keep, in xs_list order
+    keep = [i for i in xs_list if not i in dR_excl and i in xs_index]
+    if len(keep) == 0:
+        return pd.DataFrame()
+    rows, offsets = xs_index.rows(keep)
+    dataset2 = pd.DataFrame(xs_index.frame.iloc[rows]).reset_index()
+    if dR_cutoff == True:
+        # cutting off the XS where minimum is not in the river centre
+        riverMin, inXS = xs_use_centre(dataset2, offsets, dR_centre, dR_window)
+        dataset2["riverMin"] = riverMin
+        dataset2["inXS"] = inXS
+    else:
+        # pass through whole XS untampered
+        dataset2["inXS"] = True
+    if archive is not None:
+        write_xs_archive(archive, dataset2)
     return dataset2
 
 
@@ -72,41 +81,65 @@ def preprocess_cross_section(
 # removes edge of XS where there is a minimum outside the river channel ---------------------------------------------------------
 # required for HydXS to work - would ideally have some kind of coping calc within HydXS, but this is simpler for now
 # run per XS, returns a subset of the XS
-# used in preprocess_cross_section above
+# used in preprocess_cross_section above (through xs_use_centre, for all XSs at once)
 def XS_UseCentre(xs, centre="RivCentre", window=10):
-    # riverMin
-    riverMin = min(xs["POINT_Z"])
-    for j in range(0, len(xs)):
-        window_min = max(0, j - window)
-        window_max = min(j + window + 1, len(xs))
-        # if not pd.isna(xs.loc[j,centre]) :
-        if not xs.loc[j, centre] == 0:
-            little = xs[window_min:window_max]
-            riverMin = min(little["POINT_Z"])
-            break
-    # there are some XS where the minimum depth is at more than one point along bottom
-    group = []
-    for j in range(0, len(xs)):
-        if xs.loc[j, "POINT_Z"] == riverMin:
-            group.append(j)
-    leftMin = group[0]
-    rightMin = group[-1]
-    # now check which parts of XS to exclude
-    left = 0
-    right = len(xs) - 1
-    for j in range(0, len(xs)):
-        if (xs.loc[j, "x_sec_order"] <= leftMin) and (xs.loc[j, "POINT_Z"] < riverMin):
-            left = j
-        if (xs.loc[j, "x_sec_order"] >= rightMin) and (xs.loc[j, "POINT_Z"] < riverMin):
-            right = j
-            break
+    riverMin, inXS = xs_use_centre(xs, np.array([0, len(xs)]), centre, window)
     # return full XS with new column True/False as to whether to include in HydXS model run
     xs["riverMin"] = riverMin
-    xs["inXS"] = False
-    for j in range(0, len(xs)):
-        if xs.loc[j, "x_sec_order"] > left + 1 and xs.loc[j, "x_sec_order"] < right + 1:
-            xs.loc[j, "inXS"] = True
+    xs["inXS"] = inXS
     return xs
 
 
 # end XS_UseCentre
+
+
+# XS_UseCentre over many XSs at once --------------------------------------------------------------------------------------------
+# xs : rows of all XSs, each XS a contiguous block in x_sec_order ; offsets : start row of each XS, and the total number of rows
+# per XS, with j the row position within the XS:
+#   riverMin = minimum POINT_Z within "window" rows of the first river centre row (centre != 0), or of the whole XS if there is none
+#   leftMin / rightMin = first / last j where POINT_Z == riverMin
+#   right = first j with x_sec_order >= rightMin and POINT_Z < riverMin, else the last row
+#   left = last j up to that row with x_sec_order <= leftMin and POINT_Z < riverMin, else 0
+#   inXS = left + 1 < x_sec_order < right + 1
+# OUTPUT : riverMin and inXS, one value per row
+def xs_use_centre(xs, offsets, centre="RivCentre", window=10):
+    z = xs["POINT_Z"].to_numpy(dtype=float)
+    order = xs["x_sec_order"].to_numpy()
+    lengths = np.diff(offsets)
+    starts = offsets[:-1]
+    n = len(z)
+    big = np.iinfo(np.int64).max
+    # XS of each row and position j of each row within its XS
+    seg = np.repeat(np.arange(len(lengths)), lengths)
+    pos = np.arange(n) - starts[seg]
+
+    def first(mask):
+        return np.minimum.reduceat(np.where(mask, pos, big), starts)
+
+    def last(mask):
+        return np.maximum.reduceat(np.where(mask, pos, -1), starts)
+
+    # riverMin, from the window around the first river centre row
+    first_centre = first(xs[centre].to_numpy() != 0)
+    has_centre = first_centre != big
+    in_window = has_centre[seg] & (np.abs(pos - first_centre[seg]) <= window)
+    riverMin = np.where(
+        has_centre,
+        np.fmin.reduceat(np.where(in_window, z, np.inf), starts),
+        np.fmin.reduceat(z, starts),
+    )
+    # there are some XS where the minimum depth is at more than one point along bottom
+    at_min = z == riverMin[seg]
+    leftMin = first(at_min)
+    rightMin = last(at_min)
+    # now check which parts of XS to exclude
+    below = z < riverMin[seg]
+    right = first((order >= rightMin[seg]) & below)
+    left = last((order <= leftMin[seg]) & below & (pos <= right[seg]))
+    right = np.where(right == big, lengths - 1, right)
+    left = np.where(left == -1, 0, left)
+    inXS = (order > left[seg] + 1) & (order < right[seg] + 1)
+    return riverMin[seg], inXS
+
+
+# end xs_use_centre
@@ -0,0 +1,53 @@
+###############################################################################################################################
+#
+# xs_ragged.py
+#
+# ragged store of the (Distance, Z) profiles of many cross sections : one contiguous (number of points, 2) float64 array, and the
+# start / end offset of each XS ; replaces the PointDZ column of shapely Points (one Python object per survey point) in the
+# Bankfull calc, so a XS profile is a slice (a view, no copy) and is pickled to worker processes as a plain array
+#
+# built from an XSIndex (see xs_index.py), whose frame already holds each XS as one contiguous block, in x_sec_order
+# shapely points are only made when needed, eg. for plotting or export (add_point_geometry in wrangle_cross_section.py)
+#
+# INPUT: XSIndex of a dataframe with Distance and POINT_Z columns
+# OUTPUT: RaggedXS ; ragged.profile(i) = (n, 2) array of the (Distance, Z) points of XS i, in x_sec_order
+#
+# example:
+#    ragged = RaggedXS(model_xs_index(XSdata2))
+#    HydXS(ragged.profile(641), nVsteps=200, minVdep=0.2)
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import numpy as np
+
+
+class RaggedXS:
+    def __init__(self, xs_index):
+        frame = xs_index.frame
+        self.ids = xs_index.ids
+        self.offsets = xs_index.offsets
+        self.dz = np.column_stack(
+            (
+                frame["Distance"].to_numpy(dtype=float),
+                frame["POINT_Z"].to_numpy(dtype=float),
+            )
+        )
+        self._position = {i: k for k, i in enumerate(self.ids.tolist())}
+
+    def __contains__(self, i):
+        return i in self._position
+
+    def __len__(self):
+        return len(self.ids)
+
+    # (Distance, Z) points of XS i ; an empty (0, 2) array if XS i has no points
+    def profile(self, i):
+        k = self._position.get(i)
+        if k is None:
+            return self.dz[:0]
+        return self.dz[self.offsets[k] : self.offsets[k + 1]]
+
+
+# end RaggedXS
@@ -0,0 +1,3 @@
+# benchmarks of HydXS on synthetic cross sections ; run with "python -m benchmarks" from the repository root (see README)
+from .synthetic import synthetic_cross_sections, synthetic_profile, SHAPES
+from .suite import run_benchmarks, compare, read_report, write_report, PRESETS
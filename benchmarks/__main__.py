@@ -0,0 +1,69 @@
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+
+from .suite import PRESETS, compare, read_report, report_json, run_benchmarks, write_report
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    preset: str = "quick",  # KEEP / CHANGE : "quick" (under a minute), "standard" (run_hydxs on 10 and 1,000 XSs) or "full" (also 100,000 XSs, many hours)
+    only: Optional[List[str]] = None,  # KEEP / CHANGE : benchmarks to run, repeat the option for several ; all if not given
+    sizes: Optional[str] = None,  # KEEP / CHANGE : numbers of XSs run_hydxs is timed on, eg. "10,1000"
+    n_xs: Optional[int] = None,  # KEEP / CHANGE : XSs for the wrangling, pre-processing and output stages
+    n_points: Optional[int] = None,  # KEEP / CHANGE : points per synthetic XS
+    sample: Optional[int] = None,  # KEEP / CHANGE : XSs for the stage_curve and runAlg benchmarks
+    nruns: Optional[int] = None,  # KEEP / CHANGE : runs per XS
+    repeat: Optional[int] = None,  # KEEP / CHANGE : times each benchmark is timed (run_hydxs over more than 10 XSs : once)
+    smoother: str = "scipy",  # KEEP / CHANGE : run_hydxs smoother
+    geometry: str = "analytic",  # KEEP / CHANGE : run_hydxs geometry
+    workers: int = 1,  # KEEP / CHANGE : run_hydxs worker processes
+    seed: int = 1,  # KEEP / CHANGE : seed of the synthetic data and of the runs
+    output: Optional[Path] = None,  # CHANGE : JSON file for the results ; printed if not given
+    baseline: Optional[Path] = None,  # KEEP / CHANGE : JSON results of an earlier run ; exits with 1 if a benchmark got slower
+    tolerance: float = 1.25,  # KEEP / CHANGE : slowdown (ratio of the min times) above which a benchmark counts as slower
+):
+    """Time the HydXS stages and the whole pipeline on synthetic cross sections"""
+    if preset not in PRESETS:
+        raise typer.BadParameter("preset must be one of " + ", ".join(PRESETS))
+    report = run_benchmarks(
+        preset,
+        only=only,
+        smoother=smoother,
+        geometry=geometry,
+        workers=workers,
+        seed=seed,
+        sizes=None if not sizes else tuple(int(n) for n in sizes.split(",")),
+        n_xs=n_xs,
+        n_points=n_points,
+        sample=sample,
+        nruns=nruns,
+        repeat=repeat,
+    )
+    for result in report["results"]:
+        if "skipped" in result:
+            typer.echo(f"{result['name']:<28} skipped : {result['skipped']}", err=True)
+        else:
+            typer.echo(
+                f"{result['name']:<28} {result['median']:10.4f}s"
+                f" ({result['per_xs'] * 1000:.3f} ms / XS)",
+                err=True,
+            )
+    if output is None:
+        typer.echo(report_json(report))
+    else:
+        write_report(report, output)
+
+    if baseline is not None:
+        slower = compare(report, read_report(baseline), tolerance)
+        for name, ratio in slower:
+            typer.echo(f"slower than baseline : {name} x{ratio:.2f}", err=True)
+        if slower:
+            raise typer.Exit(1)
+
+
+if __name__ == "__main__":
+    app()
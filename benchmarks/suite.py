@@ -0,0 +1,344 @@
+###############################################################################################################################
+#
+# suite.py
+#
+# timed benchmarks of each HydXS stage, and of the whole pipeline, on synthetic cross sections (see synthetic.py)
+#   wrangle_cross_section / preprocess_cross_section : over n_xs XSs
+#   stage_curve[shapely] / stage_curve[analytic]     : the hydraulic depth sweep of mainFun, over `sample` pre-processed XSs
+#   runAlg[scipy] / runAlg[R]                        : the spline smoothing of those XSs' curves (R only if rpy2 imports)
+#   calcoutputs / attach_HydXS                       : over n_xs XSs, on made-up nruns run results
+#   run_hydxs[n]                                     : the whole pipeline on n XSs, for each of `sizes`
+# each benchmark is timed `repeat` times (time.perf_counter, setup not included) ; results are plain dicts, written as JSON
+#
+# compare() checks results against a baseline JSON from an earlier run, and gives the benchmarks that got slower by more
+# than `tolerance` (ratio of the min times, the least noisy of the repeats)
+#
+# INPUT: preset ("quick", "standard", "full"), or any of its settings
+# OUTPUT: {"meta": machine / versions / settings, "results": one dict per benchmark}
+#
+# example:
+#    report = run_benchmarks("quick")
+#    write_report(report, "benchmarks.json")
+#    slower = compare(report, read_report("benchmarks_main.json"))
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from importlib.metadata import version
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from HydXS.wrangle_cross_section import wrangle_cross_section
+from HydXS.xs_preprocessor import preprocess_cross_section
+from HydXS.xs_index import XSIndex
+from HydXS.xs_ragged import RaggedXS
+from HydXS.BankFullDetection_NEW import stage_curve, get_smoother
+from HydXS.HydXS_modelling import model_xs_index
+from HydXS.HydXS_output import calcoutputs
+from HydXS.HydXS_attachModelResults import attach_HydXS
+from HydXS.run_HydXS import run_hydxs
+
+from .synthetic import synthetic_cross_sections
+
+# settings of each preset ; the run_hydxs sizes are the costly part (about 0.3s per XS and run for the scipy smoothing)
+PRESETS = {
+    "quick": dict(n_xs=200, n_points=100, sample=10, sizes=(10,), nruns=3, repeat=3),
+    "standard": dict(
+        n_xs=1_000, n_points=100, sample=20, sizes=(10, 1_000), nruns=11, repeat=3
+    ),
+    "full": dict(
+        n_xs=1_000,
+        n_points=100,
+        sample=50,
+        sizes=(10, 1_000, 100_000),
+        nruns=11,
+        repeat=3,
+    ),
+}
+BENCHMARKS = (
+    "wrangle_cross_section",
+    "preprocess_cross_section",
+    "stage_curve",
+    "runAlg",
+    "calcoutputs",
+    "attach_HydXS",
+    "run_hydxs",
+)
+
+
+# run the benchmarks of a preset ; settings given here replace the preset's -----------------------------------------------------
+#   only : names from BENCHMARKS to run (all if None)
+#   smoother / geometry / workers / seed : passed to run_hydxs
+def run_benchmarks(
+    preset="quick",
+    only=None,
+    smoother="scipy",
+    geometry="analytic",
+    workers=1,
+    seed=1,
+    **settings,
+):
+    settings = {**PRESETS[preset], **{k: v for k, v in settings.items() if v}}
+    only = BENCHMARKS if not only else only
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError("unknown benchmarks: " + ", ".join(sorted(unknown)))
+    n_xs, sample, repeat = settings["n_xs"], settings["sample"], settings["repeat"]
+    results = []
+
+    points = synthetic_cross_sections(n_xs, n_points=settings["n_points"], seed=seed)
+    xs_list = list(range(1, n_xs + 1))
+    with silenced():
+        XSdata1 = wrangle_cross_section(points.copy(), make_points=False)
+        XSdata2 = preprocess_cross_section(
+            XSdata1, xs_list, dR_excl=(), xs_index=XSIndex(XSdata1)
+        )
+    if "wrangle_cross_section" in only:
+        results.append(
+            timed(
+                "wrangle_cross_section",
+                lambda: wrangle_cross_section(points.copy(), make_points=False),
+                repeat,
+                n_xs=n_xs,
+                n_points=len(points),
+            )
+        )
+    if "preprocess_cross_section" in only:
+        results.append(
+            timed(
+                "preprocess_cross_section",
+                lambda: preprocess_cross_section(
+                    XSdata1, xs_list, dR_excl=(), xs_index=XSIndex(XSdata1)
+                ),
+                repeat,
+                n_xs=n_xs,
+                n_points=len(points),
+            )
+        )
+
+    # per XS stages, on the first `sample` pre-processed XSs
+    ragged = RaggedXS(model_xs_index(XSdata2))
+    profiles = [ragged.profile(i) for i in xs_list[:sample] if i in ragged]
+    curves = [stage_curve(p, geometry="analytic") for p in profiles]
+    if "stage_curve" in only:
+        for method in ("shapely", "analytic"):
+            results.append(
+                timed(
+                    "stage_curve[" + method + "]",
+                    lambda: [stage_curve(p, geometry=method) for p in profiles],
+                    repeat,
+                    n_xs=len(profiles),
+                )
+            )
+    if "runAlg" in only:
+        for backend in ("scipy", "R"):
+            try:
+                runAlg = get_smoother(backend)
+            except Exception as e:
+                # R / rpy2 not installed
+                results.append(skipped("runAlg[" + backend + "]", e))
+                continue
+            results.append(
+                timed(
+                    "runAlg[" + backend + "]",
+                    lambda: [runAlg(c.depts, c.HydDept, seed=seed) for c in curves],
+                    repeat,
+                    n_xs=len(curves),
+                )
+            )
+
+    # output stages, on made-up run results for every XS
+    XSdata3 = synthetic_runs(XSdata2, xs_list, settings["nruns"], seed)
+    if "calcoutputs" in only:
+        results.append(
+            timed(
+                "calcoutputs",
+                lambda: calcoutputs(XSdata3, settings["nruns"]),
+                repeat,
+                n_xs=n_xs,
+                nruns=settings["nruns"],
+            )
+        )
+    if "attach_HydXS" in only:
+        XSdata4 = calcoutputs(XSdata3, settings["nruns"])
+        results.append(
+            timed(
+                "attach_HydXS",
+                lambda: attach_HydXS(
+                    XSdata2, XSdata4, xs_list, xs_index=XSIndex(XSdata2)
+                ),
+                repeat,
+                n_xs=n_xs,
+                n_points=len(XSdata2),
+            )
+        )
+
+    # whole pipeline ; timed once for the larger sizes
+    if "run_hydxs" in only:
+        for size in settings["sizes"]:
+            points = synthetic_cross_sections(
+                size, n_points=settings["n_points"], seed=seed
+            )
+            with tempfile.TemporaryDirectory() as out_data_path:
+                results.append(
+                    timed(
+                        "run_hydxs[" + str(size) + "]",
+                        lambda: run_hydxs(
+                            points.copy(),
+                            nruns=settings["nruns"],
+                            out_data_path=out_data_path,
+                            smoother=smoother,
+                            geometry=geometry,
+                            seed=seed,
+                            workers=workers,
+                            make_points=False,
+                        ),
+                        repeat if size <= 10 else 1,
+                        n_xs=size,
+                        n_points=len(points),
+                        nruns=settings["nruns"],
+                        smoother=smoother,
+                        geometry=geometry,
+                        workers=workers,
+                    )
+                )
+
+    meta = machine_info()
+    meta.update(preset=preset, seed=seed, **settings)
+    meta["sizes"] = list(settings["sizes"])
+    return {"meta": meta, "results": results}
+
+
+# end run_benchmarks
+
+
+# time fn() repeat times ; anything HydXS prints is silenced -----------------------------------------------------------------
+# params : recorded with the times (n_xs, the number of XSs, gives the per_xs time)
+def timed(name, fn, repeat=3, **params):
+    times = []
+    for _ in range(repeat):
+        with silenced():
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    result = {
+        "name": name,
+        **params,
+        "repeat": repeat,
+        "times": times,
+        "min": min(times),
+        "median": float(np.median(times)),
+    }
+    if params.get("n_xs"):
+        result["per_xs"] = result["median"] / params["n_xs"]
+    return result
+
+
+# stdout sent to os.devnull, so it doesn't mix with the JSON report (HydXS progress is logged to stderr)
+@contextlib.contextmanager
+def silenced():
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def skipped(name, reason):
+    return {"name": name, "skipped": str(reason)}
+
+
+# end timed
+
+
+# nruns made-up runs per XS, in the HydXS_run (wide) layout : bankfull near a per XS level, banks either side of the middle -----
+def synthetic_runs(XSdata2, xs_list, nruns, seed=0):
+    rng = np.random.default_rng(seed)
+    riverMin = XSdata2.groupby("x_sec_id")["POINT_Z"].min().reindex(xs_list)
+    level = riverMin.to_numpy() + rng.uniform(1, 4, len(xs_list))
+    middle = XSdata2.groupby("x_sec_id")["Distance"].median().reindex(xs_list)
+    runs = {"CrossSection": xs_list}
+    for k in range(1, nruns + 1):
+        # most runs agree, the others are 10-50cm off
+        off = np.where(rng.random(len(xs_list)) < 0.7, 0, rng.uniform(-0.5, 0.5))
+        runs["bankfull_" + str(k)] = np.round(level + off, 2)
+        runs["left_" + str(k)] = np.round(middle.to_numpy() - 10 - 5 * off, 2)
+        runs["right_" + str(k)] = np.round(middle.to_numpy() + 10 + 5 * off, 2)
+    return pd.DataFrame(runs).reset_index()
+
+
+# end synthetic_runs
+
+
+# versions and machine the benchmarks ran on -------------------------------------------------------------------------------------
+def machine_info():
+    info = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    for package in ("HydXS", "numpy", "pandas", "scipy", "shapely"):
+        try:
+            info[package] = version(package)
+        except Exception:
+            info[package] = None
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        info["git_commit"] = None
+    return info
+
+
+# end machine_info
+
+
+# reading / writing / comparing reports ------------------------------------------------------------------------------------------
+def report_json(report):
+    return json.dumps(report, indent=2)
+
+
+def write_report(report, path):
+    Path(path).write_text(report_json(report))
+
+
+def read_report(path):
+    return json.loads(Path(path).read_text())
+
+
+# benchmarks of report slower than in baseline by more than tolerance (ratio of the min times), as (name, ratio)
+# only benchmarks run with the same parameters (number of XSs, runs ...) in both are compared
+def compare(report, baseline, tolerance=1.25):
+    before = {setup(r): r for r in baseline["results"] if "min" in r}
+    slower = []
+    for result in report["results"]:
+        if "min" not in result or setup(result) not in before:
+            continue
+        ratio = result["min"] / before[setup(result)]["min"]
+        if ratio > tolerance:
+            slower.append((result["name"], ratio))
+    return slower
+
+
+# name and parameters of a benchmark result, without its times
+def setup(result):
+    timing = ("repeat", "times", "min", "median", "per_xs")
+    return tuple(sorted((k, str(v)) for k, v in result.items() if k not in timing))
+
+
+# end compare
@@ -0,0 +1,114 @@
+###############################################################################################################################
+#
+# synthetic.py
+#
+# synthetic cross section point data, in the layout run_hydxs reads (x_sec_id, x_sec_order, POINT_X, POINT_Y, POINT_Z,
+# RivCentre), for benchmarks and tests of any size without survey data
+#
+# each XS is a profile shape (below), scaled by a random bank height and channel width, with the banks of either side a little
+# different in height, plus gaussian noise ; the shapes, in turn by XS identity :
+#   "v"           : straight banks down to a single lowest point
+#   "trapezoid"   : flat bed, straight banks, gently sloping floodplain
+#   "compound"    : two-stage channel, an inner channel with a berm either side, then the outer banks and floodplain
+#   "multithread" : a main channel and a shallower side channel, with a bar between them
+#   "lidar"       : compound channel surveyed like a LiDAR transect, unevenly spaced points, more noise, and vegetation spikes
+# the XSs are laid out 50m apart down a river sloping 1m/km, each one across the river ; RivCentre is the point nearest the
+# middle of the main channel
+#
+# INPUT: n_xs = number of XSs ; n_points = points per XS, or (min, max) for a random number per XS ; shapes ; noise = standard
+#        deviation (m) of the noise on z ; seed
+# OUTPUT: dataframe, one row per point, in x_sec_id / x_sec_order order
+#
+# example:
+#    points = synthetic_cross_sections(1000, n_points=(60, 200), seed=1)
+#    XSdata4, XSdata2 = run_hydxs(points, smoother="scipy", geometry="analytic")
+#
+###############################################################################################################################
+
+
+# importing libraries etc  ----------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+SHAPES = ("v", "trapezoid", "compound", "multithread", "lidar")
+
+# profile templates : height (share of the bank height) at distances from the channel middle (share of the half width)
+TEMPLATES = {
+    "v": ([0.0, 1.0, 1.5], [0.0, 1.0, 1.0]),
+    "trapezoid": ([0.0, 0.3, 0.8, 1.5], [0.0, 0.0, 1.0, 1.1]),
+    "compound": ([0.0, 0.15, 0.35, 0.6, 0.9, 1.5], [0.0, 0.05, 0.45, 0.5, 1.0, 1.05]),
+}
+TEMPLATES["lidar"] = TEMPLATES["compound"]
+
+
+# synthetic point data of n_xs cross sections ----------------------------------------------------------------------------------
+def synthetic_cross_sections(n_xs, n_points=100, shapes=SHAPES, noise=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    if np.ndim(n_points) == 0:
+        counts = np.full(n_xs, int(n_points))
+    else:
+        counts = rng.integers(n_points[0], n_points[1] + 1, size=n_xs)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    distance = np.empty(offsets[-1])
+    z = np.empty(offsets[-1])
+    centre = np.zeros(offsets[-1], dtype=bool)
+    for k in range(n_xs):
+        shape = shapes[k % len(shapes)]
+        d, zk, middle = synthetic_profile(shape, counts[k], rng, noise)
+        rows = slice(offsets[k], offsets[k + 1])
+        distance[rows] = d
+        z[rows] = zk + 0.001 * 50 * (n_xs - k)
+        centre[offsets[k] + np.argmin(np.abs(d - middle))] = True
+    x_sec_id = np.repeat(np.arange(1, n_xs + 1), counts)
+    x_sec_order = np.arange(offsets[-1]) - np.repeat(offsets[:-1], counts) + 1
+    return pd.DataFrame(
+        {
+            "x_sec_id": x_sec_id,
+            "x_sec_order": x_sec_order,
+            "POINT_X": 50.0 * x_sec_id,
+            "POINT_Y": distance,
+            "POINT_Z": z,
+            "RivCentre": centre,
+        }
+    )
+
+
+# end synthetic_cross_sections
+
+
+# (Distance, Z) of one XS of the given shape, and the distance of the middle of its main channel ---------------------------------
+def synthetic_profile(shape, n_points, rng, noise=0.02):
+    if shape not in SHAPES:
+        raise ValueError("shape must be one of " + ", ".join(SHAPES))
+    height = rng.uniform(2, 6)
+    half = rng.uniform(10, 40)
+    width = 3 * half
+    middle = width / 2 + rng.uniform(-0.1, 0.1) * half
+    if shape == "lidar":
+        d = np.sort(rng.uniform(0, width, n_points))
+        d[0], d[-1] = 0, width
+    else:
+        d = np.linspace(0, width, n_points)
+    # bank height of the left and right side
+    side = np.where(d < middle, 1.0, rng.uniform(0.85, 1.15))
+    if shape == "multithread":
+        main = np.interp(np.abs(d - middle) / half, *TEMPLATES["trapezoid"])
+        away = 0.6 * half * np.sign(rng.uniform(-1, 1))
+        second = 0.3 + np.interp(
+            np.abs(d - middle - away) / (0.3 * half), *TEMPLATES["v"]
+        )
+        z = np.minimum(main, second)
+    else:
+        z = np.interp(np.abs(d - middle) / half, *TEMPLATES[shape])
+    z = 100 + height * side * z
+    if shape == "lidar":
+        z = z + rng.normal(0, 2.5 * noise, n_points)
+        # vegetation returns, on the floodplain and banks only
+        spikes = (rng.random(n_points) < 0.03) & (np.abs(d - middle) > 0.6 * half)
+        z[spikes] += rng.uniform(0.2, 1.5, spikes.sum())
+    else:
+        z = z + rng.normal(0, noise, n_points)
+    return d, z, middle
+
+
+# end synthetic_profile
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from HydXS.HydXS_attachModelResults import attach_HydXS
+
+
+def test_001_flags_points_between_banks():
+    """Points strictly between the banks are InRiver ; XS without results get NaN banks and a count of 0."""
+    xs = pd.DataFrame(
+        {
+            "x_sec_id": np.repeat([2, 1, 3], 5),
+            "Distance": np.tile(np.arange(5.0), 3),
+        }
+    )
+    results = pd.DataFrame(
+        {
+            "CrossSection": [1, 2],
+            "BankFullOutput": [1.5, 2.5],
+            "LeftOutput": [1.0, 0.5],
+            "RightOutput": [3.0, 2.5],
+            "CountatBankFull": [7, 9],
+        }
+    )
+    out = attach_HydXS(xs, results, [1, 2, 3, 4])
+    assert list(out["x_sec_id"]) == [1] * 5 + [2] * 5 + [3] * 5
+    assert list(out["index"][:5]) == [5, 6, 7, 8, 9]
+    assert (
+        list(out["InRiver"])
+        == [False, False, True, False, False]
+        + [
+            False,
+            True,
+            True,
+            False,
+            False,
+        ]
+        + [False] * 5
+    )
+    assert list(out["CountAtBankFull"]) == [7] * 5 + [9] * 5 + [0] * 5
+    assert out["BankLeft"][10:].isna().all()
@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+
+from benchmarks import SHAPES, compare, run_benchmarks, synthetic_cross_sections
+from HydXS import run_hydxs
+
+
+def test_001_synthetic_cross_sections(tmp_path):
+    """Every shape is made, with one river centre per XS, the asked number of points, and a channel the model finds."""
+    points = synthetic_cross_sections(10, n_points=(40, 80), seed=3)
+    counts = points.groupby("x_sec_id").size()
+    assert len(counts) == 10 and counts.between(40, 80).all()
+    assert (points.groupby("x_sec_id")["RivCentre"].sum() == 1).all()
+    assert (points.groupby("x_sec_id")["x_sec_order"].min() == 1).all()
+    assert len(SHAPES) == 5
+    out, _ = run_hydxs(
+        synthetic_cross_sections(len(SHAPES), n_points=60, seed=3),
+        nruns=1,
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+        out_data_path=tmp_path,
+        make_points=False,
+    )
+    assert out.groupby("CrossSection")["BankFullOutput"].first().notna().sum() >= 3
+
+
+def test_002_report_and_compare():
+    """The report is JSON, and compare only flags benchmarks slower than the baseline with the same parameters."""
+    report = run_benchmarks(
+        only=["calcoutputs", "attach_HydXS"], n_xs=20, nruns=3, repeat=1
+    )
+    report = json.loads(json.dumps(report))
+    assert [r["name"] for r in report["results"]] == ["calcoutputs", "attach_HydXS"]
+    assert np.isclose(
+        report["results"][0]["per_xs"] * 20, report["results"][0]["median"]
+    )
+    baseline = json.loads(json.dumps(report))
+    for result in baseline["results"]:
+        result["min"] /= 2
+    assert [name for name, _ in compare(report, baseline)] == [
+        "calcoutputs",
+        "attach_HydXS",
+    ]
+    baseline["results"][0]["n_xs"] = 10
+    assert [name for name, _ in compare(report, baseline)] == ["attach_HydXS"]
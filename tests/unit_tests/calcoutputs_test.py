@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from HydXS.HydXS_output import calcoutputs, ensemble_settled
+
+
+# one row per XS of (bankfull, left, right) for each run, in the HydXS_run layout
+def make_runs(bank, left, right):
+    data = pd.DataFrame({"CrossSection": np.arange(1, len(bank) + 1)})
+    for j in range(np.shape(bank)[1]):
+        data["bankfull_" + str(j + 1)] = np.asarray(bank, dtype=float)[:, j]
+        data["left_" + str(j + 1)] = np.asarray(left, dtype=float)[:, j]
+        data["right_" + str(j + 1)] = np.asarray(right, dtype=float)[:, j]
+    return data
+
+
+def test_001_hand_checked_results():
+    """Mode, window count, binned fallback and banks, on a few hand-worked XSs."""
+    bank = [
+        # 4 of 5 runs within 5cm of the mode 2.0 : mode, banks of its first run
+        [2.0, 2.0, 2.03, 2.5, 2.0],
+        # mode 1.0 alone : binned ; bins 1.0-1.67 (1.0, 1.1) and 1.67-2.33 (2.0, 2.1) tie, the lower wins,
+        # mean 1.05 isn't a run, so the banks are the means of the runs in the bin
+        [1.0, 1.1, 2.0, 2.1, 3.0],
+        # mode 3.0 has 2 runs : binned ; bin 1.0-1.67 has 3 runs, mean 1.1 is run 3, whose banks are taken
+        [1.0, 1.2, 1.1, 3.0, 3.0],
+        # a run without a bankfull : no result
+        [2.0, np.nan, 2.0, 2.0, 2.0],
+    ]
+    left = [[1.0, 2.0, 3.0, 4.0, 5.0]] * 4
+    right = [[21.0, 22.0, 23.0, 24.0, 25.0]] * 4
+    out = calcoutputs(make_runs(bank, left, right), 5)
+    assert out["BankFullType"].tolist()[:3] == ["mode", "binned", "binned"]
+    assert pd.isna(out["BankFullType"].iloc[3])
+    np.testing.assert_array_equal(out["BankFullOutput"], [2.0, 1.05, 1.1, np.nan])
+    np.testing.assert_array_equal(out["CountatBankFull"], [4, 1, 2, 0])
+    np.testing.assert_array_equal(out["LeftOutput"], [1.0, 1.5, 3.0, np.nan])
+    np.testing.assert_array_equal(out["RightOutput"], [21.0, 21.5, 23.0, np.nan])
+
+
+def test_002_n_members_uses_first_runs():
+    """With an n_members column, each XS gets the result of its first n_members runs alone."""
+    rng = np.random.default_rng(7)
+    n, num_runs = 200, 11
+    base = rng.uniform(1, 5, n)
+    bank = np.round(
+        base[:, None] + rng.choice([0, 0, 0.01, 0.3, 1.0], (n, num_runs)), 2
+    )
+    left = np.round(rng.uniform(0, 10, (n, num_runs)), 2)
+    right = np.round(rng.uniform(20, 30, (n, num_runs)), 2)
+    n_members = rng.integers(3, num_runs + 1, n)
+    # runs after n_members are empty, or left over
+    bank[(np.arange(num_runs) >= n_members[:, None]) & (rng.random((n, 1)) < 0.5)] = (
+        np.nan
+    )
+    data = make_runs(bank, left, right)
+    data["n_members"] = n_members
+
+    out = calcoutputs(data, num_runs)
+    columns = ["BankFullOutput", "LeftOutput", "RightOutput", "CountatBankFull"]
+    assert (out["BankFullType"] == "binned").any()
+    for m in range(n):
+        k = n_members[m]
+        expected = calcoutputs(
+            make_runs(bank[m : m + 1, :k], left[m : m + 1, :k], right[m : m + 1, :k]),
+            k,
+        )
+        assert np.array_equal(
+            out[columns].to_numpy(float)[m : m + 1],
+            expected[columns].to_numpy(float),
+            equal_nan=True,
+        )
+
+
+def test_003_ensemble_settled():
+    """An ensemble is settled when the share of runs at the mode is clearly above or below 2/3, or a run failed."""
+    agree = np.full((1, 5), 2.5)
+    split = np.array([[1.0, 2.0, 3.0, 4.0, 5.0]])
+    close = np.array([[2.5, 2.5, 2.5, 1.0, 4.0]])
+    failed = np.array([[2.5, np.nan, 2.5, 2.5, 2.5]])
+    bank = np.concatenate([agree, split, close, failed])
+    assert ensemble_settled(bank).tolist() == [True, True, False, True]
+    # more confidence needs more runs
+    assert not ensemble_settled(agree[:, :3], confidence=0.99).any()
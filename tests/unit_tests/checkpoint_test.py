@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks import synthetic_cross_sections
+from HydXS import run_hydxs
+from HydXS.HydXS_checkpoint import CheckpointStore, checkpoint_fingerprint
+
+
+def test_001_results_survive_reopening(tmp_path):
+    """Stored (XS, run) results are read back unchanged, NaN as None, when resumed."""
+    path = tmp_path / "checkpoint.sqlite"
+    fingerprint = checkpoint_fingerprint(seed=1)
+    xs = {1: "a", 2: "b"}
+    store = CheckpointStore(path, fingerprint, xs)
+    store.add((np.int64(1), 2, 10.123456789, 1.5, 20.25, "1", 0.7, 1))
+    store.add((2, 1, np.nan, np.nan, np.nan, None, np.nan, 99))
+    store.close()
+    store = CheckpointStore(path, fingerprint, xs, resume=True)
+    assert store.results() == {
+        (1, 2): (1, 2, 10.123456789, 1.5, 20.25, "1", 0.7, 1),
+        (2, 1): (2, 1, None, None, None, None, None, 99),
+    }
+    store.close()
+    # without resume, the store starts again
+    store = CheckpointStore(path, fingerprint, xs)
+    assert store.results() == {}
+    store.close()
+
+
+def test_002_resume_with_other_settings_raises(tmp_path):
+    """A checkpoint made with other settings can't be resumed."""
+    path = tmp_path / "checkpoint.sqlite"
+    CheckpointStore(path, checkpoint_fingerprint(seed=1)).close()
+    with pytest.raises(ValueError):
+        CheckpointStore(path, checkpoint_fingerprint(seed=2), resume=True)
+
+
+def test_003_resume_keyed_by_xs_points(tmp_path):
+    """Only the results of XSs with the same points are resumed, so XSs can be changed or added."""
+    path = tmp_path / "checkpoint.sqlite"
+    fingerprint = checkpoint_fingerprint(seed=1)
+    store = CheckpointStore(path, fingerprint, {1: "a", 2: "b"})
+    store.add((1, 1, 10.0, 1.0, 2.0, "1", 0.5, 1))
+    store.add((2, 1, 11.0, 1.0, 2.0, "1", 0.5, 1))
+    store.close()
+    store = CheckpointStore(path, fingerprint, {1: "a", 2: "c", 3: "d"}, resume=True)
+    assert list(store.results()) == [(1, 1)]
+    assert store.results([2, 3]) == {}
+    store.close()
+
+
+def test_004_run_hydxs_resume_with_added_xs(tmp_path):
+    """run_hydxs resumes a checkpoint after XSs are added to the survey, with the results of an uninterrupted run."""
+    points = synthetic_cross_sections(4, n_points=50, seed=3)
+    settings = dict(
+        nruns=2,
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+        out_data_path=tmp_path,
+        make_points=False,
+    )
+    run_hydxs(points[points["x_sec_id"] <= 2].copy(), checkpoint=True, **settings)
+    out, _, report = run_hydxs(points.copy(), resume=True, profile=True, **settings)
+    expected, _ = run_hydxs(points.copy(), **settings)
+    # the 2 runs of XSs 1 and 2 are taken from the checkpoint
+    assert report["counters"]["checkpoint_results"] == 4
+    pd.testing.assert_frame_equal(out, expected)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from HydXS.BankFullDetection_NEW import (
+    MIN_CAPPED_STEPS,
+    NoAdmissibleStageRange,
+    bank_crest,
+    mainFun,
+    stage_curve,
+)
+from HydXS.HydXS_modelling import HydXS_oneXS, HydXS_output, RunResults
+
+
+# V channel with a left bank 2m lower than the right bank
+def make_profile():
+    d = np.linspace(0, 40, 41)
+    z = np.abs(d - 20) * 0.4 + np.where(d > 20, 0.1 * (d - 20), 0)
+    return np.column_stack((d, z + 100))
+
+
+def test_001_grid_ends_below_lower_bank_crest():
+    """The capped depths are the uncapped depths below the lower bank crest."""
+    profile = make_profile()
+    assert bank_crest(profile) == 108
+    uniform = stage_curve(profile, 200, geometry="analytic")
+    capped = stage_curve(profile, 200, geometry="analytic", cap_at_crest=True)
+    assert uniform.depts[-1] == pytest.approx(109.9)
+    assert capped.depts[-1] < 108 <= capped.depts[-1] + np.diff(uniform.depts)[0]
+    n = len(capped.depts)
+    assert n < len(uniform.depts)
+    np.testing.assert_allclose(capped.depts, uniform.depts[:n])
+    np.testing.assert_allclose(capped.HydDept, uniform.HydDept[:n])
+    adaptive = stage_curve(
+        profile, 200, geometry="analytic", stage_grid="adaptive", cap_at_crest=True
+    )
+    assert adaptive.depts[-1] == capped.depts[-1]
+
+
+def test_002_no_admissible_range_reported():
+    """A XS whose left bank is within 0.1m of its lowest point raises, and gives runs = 98 and no bankfull."""
+    profile = make_profile()
+    profile[:20, 1] = 100.05
+    with pytest.raises(NoAdmissibleStageRange):
+        stage_curve(profile, 200, geometry="analytic", cap_at_crest=True)
+    xs_input = (1, profile, 0.0, 40.0, None)
+    result = HydXS_oneXS(
+        xs_input, smoother="scipy", geometry="analytic", seed=1, cap_at_crest=True
+    )
+    assert result[-1] == 98
+    output = HydXS_output(RunResults(1), 1, *result)
+    row = output.frame().iloc[0]
+    assert np.isnan(row["BankFull"]) and row["runs"] == 98
+
+
+def test_003_few_depths_below_crest():
+    """With fewer than MIN_CAPPED_STEPS uniform depths below the crest, the capped grid is that many depths below it."""
+    profile = make_profile()
+    profile[:20, 1] = np.linspace(100.6, 100.4, 20)
+    uniform = stage_curve(profile, 200, geometry="analytic")
+    assert np.sum(uniform.depts < 100.6) < MIN_CAPPED_STEPS
+    capped = stage_curve(profile, 200, geometry="analytic", cap_at_crest=True)
+    assert len(capped.depts) == MIN_CAPPED_STEPS
+    assert capped.depts[0] == uniform.depts[0] and capped.depts[-1] < 100.6
+
+
+def test_004_bankfull_just_under_crest():
+    """A bankfull a few cm under the lower bank crest (a wide berm) is still found with the grid capped."""
+    d = np.linspace(0, 60, 121)
+    z = np.interp(
+        d, [0, 15, 25, 30, 40, 45, 60], [104.0, 103.96, 103.95, 100, 100, 106, 106.2]
+    )
+    profile = np.column_stack((d, z))
+    assert bank_crest(profile) == 104
+    curve = stage_curve(profile, 200, geometry="analytic", cap_at_crest=True)
+    for seed in range(3):
+        capped = mainFun(
+            profile, geometry="analytic", smoother="scipy", seed=seed, curve=curve
+        )
+        # a local maximum of the smoothed curve, not the top of the grid
+        assert 103.8 < capped[3] < curve.depts[-1] - 0.05
+        assert 25 < capped[0] and capped[1] < 45
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from HydXS.HydXS_incremental import changed_xs, merge_results, xs_fingerprints
+
+
+def make_points():
+    return pd.DataFrame(
+        {
+            "x_sec_id": [1, 1, 1, 2, 2, 3, 3],
+            "x_sec_order": [1, 2, 3, 1, 2, 1, 2],
+            "POINT_Z": [5.0, 1.0, 5.0, 4.0, 4.5, 3.0, 3.5],
+            "Distance": [0.0, 1.0, 2.0, 0.0, 1.0, 0.0, 1.0],
+            "inXS": [True] * 7,
+        }
+    )
+
+
+def test_001_only_changed_xs_get_new_fingerprints():
+    """Changing the points of a XS changes its fingerprint only ; changing a setting changes all of them."""
+    data = make_points()
+    before = xs_fingerprints(data, seed=1)
+    data.loc[4, "POINT_Z"] = 4.6
+    after = xs_fingerprints(data, seed=1)
+    assert (before != after).tolist() == [False, True, False]
+    assert (xs_fingerprints(data, seed=2) != after).all()
+    previous = pd.DataFrame({"CrossSection": [1, 2, 3], "Fingerprint": before.values})
+    # XS 4 has no points, and no previous result, so there is nothing to run
+    assert changed_xs([1, 2, 3, 4], after, previous) == [2]
+    assert changed_xs([1, 2, 3], after, previous.iloc[:2]) == [2, 3]
+    assert changed_xs([1, 2], after, previous.drop(columns="Fingerprint")) == [1, 2]
+
+
+def test_002_merge_keeps_unchanged_rows_in_xs_list_order():
+    """Recomputed rows replace the previous ones, XSs no longer listed are dropped."""
+    previous = pd.DataFrame({"CrossSection": [1, 2, 3, 4], "BankFull": [1.0, 2, 3, 4]})
+    new = pd.DataFrame({"CrossSection": [2, 5], "BankFull": [20.0, 50]})
+    merged = merge_results(previous, new, [5, 1, 2, 3])
+    assert merged["CrossSection"].tolist() == [5, 1, 2, 3]
+    assert merged["BankFull"].tolist() == [50.0, 1, 20, 3]
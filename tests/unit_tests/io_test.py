@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from HydXS.HydXS_io import point_columns, read_points, write_table
+from HydXS.wrangle_cross_section import wrangle_cross_section
+
+
+def make_points():
+    return pd.DataFrame(
+        {
+            "x_sec_id": [1, 1, 1, 2, 2, 2],
+            "x_sec_order": [1, 2, 3, 1, 2, 3],
+            "POINT_X": [0.0, 3.0, 6.0, 0.0, 0.0, 0.0],
+            "POINT_Y": [0.0, 4.0, 8.0, 0.0, 1.0, 2.0],
+            "POINT_Z": [2.0, 1.0, 2.0, 3.0, 2.5, 3.0],
+            "RivCentre": [0, 1, 0, 0, 1, 0],
+            "Notes": ["a", "b", "c", "d", "e", "f"],
+        }
+    )
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet", "feather"])
+def test_001_written_tables_read_back(tmp_path, output_format):
+    """Tables written in each format read back the same, with only the asked columns."""
+    data = make_points()
+    path = write_table(data, tmp_path / "points", output_format)
+    assert path.name == "points." + output_format
+    pd.testing.assert_frame_equal(read_points(path), data)
+    columns = ["x_sec_id", "POINT_Z"]
+    pd.testing.assert_frame_equal(read_points(path, columns=columns), data[columns])
+
+
+def test_002_wrangle_from_file_matches_dataframe(tmp_path):
+    """wrangle_cross_section gives the same result from a Parquet path as from the dataframe."""
+    data = make_points()
+    data.to_parquet(tmp_path / "points.parquet")
+    out = wrangle_cross_section(
+        str(tmp_path / "points.parquet"), input_type="PARQUET", make_points=False
+    )
+    expected = wrangle_cross_section(data, make_points=False)
+    pd.testing.assert_frame_equal(out, expected)
+    with pytest.raises(ValueError):
+        wrangle_cross_section(data, input_type="PARQUET")
+
+
+def test_003_gis_input_with_geometry_column(tmp_path):
+    """A GIS file with xy_col = "geometry" is cut down to the columns used, and wrangled as the dataframe is."""
+    import geopandas as gpd
+
+    data = make_points()
+    points = gpd.GeoDataFrame(
+        data.drop(columns=["POINT_X", "POINT_Y"]),
+        geometry=gpd.points_from_xy(data["POINT_X"], data["POINT_Y"]),
+        crs="EPSG:27700",
+    )
+    points.to_file(tmp_path / "points.geojson")
+    columns = point_columns(
+        "geometry", "POINT_Z", "x_sec_id", "x_sec_order", "RivCentre"
+    )
+    assert columns[:2] == ["geometry", "POINT_Z"]
+    read = read_points(tmp_path / "points.geojson", columns=columns[:3])
+    assert list(read.columns) == ["POINT_Z", "x_sec_id", "geometry"]
+    assert isinstance(read, gpd.GeoDataFrame)
+    out = wrangle_cross_section(
+        tmp_path / "points.geojson",
+        input_type="GIS",
+        xy_col="geometry",
+        make_points=False,
+    )
+    expected = wrangle_cross_section(data, make_points=False)
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False)
@@ -0,0 +1,53 @@
+import numpy as np
+
+from HydXS.BankFullDetection_NEW import cmp, diff_n, local_maxmin
+
+
+def loop_local_maxmin(Harray):
+    """Original loop implementation of local_maxmin."""
+    gradients = np.diff(Harray)
+    maxima_num = 0
+    minima_num = 0
+    max_locations = []
+    min_locations = []
+    count = 0
+    ranks = []
+    rank = 1
+    for i in gradients[:-1]:
+        count += 1
+        if (cmp(i, 0) > 0) & (cmp(gradients[count], 0) < 0) & (i != gradients[count]):
+            maxima_num += 1
+            max_locations.append(count)
+            while diff_n(Harray, count, rank) and rank < len(Harray):
+                rank += 1
+            ranks.append(rank)
+        if (cmp(i, 0) < 0) & (cmp(gradients[count], 0) > 0) & (i != gradients[count]):
+            minima_num += 1
+            min_locations.append(count)
+    return {
+        "maxima_number": maxima_num,
+        "minima_number": minima_num,
+        "maxima_locations": max_locations,
+        "minima_locations": min_locations,
+        "maxima_ranks": ranks,
+    }
+
+
+def test_001_matches_loop_on_noisy_curves():
+    """Vectorised turning points and ranks match the original loop."""
+    rng = np.random.default_rng(3)
+    for n in [1, 2, 3, 5, 20, 200]:
+        for _ in range(20):
+            H = np.sqrt(np.linspace(0.1, 5, n)) + rng.normal(0, 0.05, n)
+            H[rng.random(n) < 0.1] = H[0]  # flat steps
+            assert local_maxmin(H) == loop_local_maxmin(H)
+
+
+def test_002_stack_of_curves():
+    """A 2-D stack gives one dictionary per curve."""
+    rng = np.random.default_rng(4)
+    stack = np.cumsum(rng.normal(0, 1, (50, 80)), axis=1)
+    result = local_maxmin(stack)
+    assert len(result) == 50
+    for H, turning_points in zip(stack, result):
+        assert turning_points == loop_local_maxmin(H)
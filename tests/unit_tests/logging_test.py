@@ -0,0 +1,45 @@
+import io
+import logging
+
+from HydXS import HydXS_logging
+from HydXS.HydXS_logging import Progress, configure_logging, duration
+from HydXS.HydXS_modelling import HydXS_pool
+
+
+def test_001_progress_rate_limited():
+    """Progress logs at most one line per interval, plus the final line, and nothing when quiet."""
+    stream = io.StringIO()
+    configure_logging("INFO", stream=stream)
+    with Progress(1000, "stage curves", interval=3600) as progress:
+        for _ in range(1000):
+            progress.update()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1 and "stage curves : 1000 XS in" in lines[0]
+    progress = Progress(10, "runs", interval=0)
+    progress.update(5)
+    assert "[##########----------] 5/10 XS (50.0%)" in stream.getvalue()
+
+    stream = io.StringIO()
+    configure_logging("INFO", quiet=True, stream=stream)
+    with Progress(10, "runs", interval=0) as progress:
+        progress.update(10)
+    logging.getLogger("HydXS.run_HydXS").info("not shown")
+    logging.getLogger("HydXS.run_HydXS").warning("shown")
+    assert stream.getvalue().splitlines()[-1].endswith("WARNING: shown")
+    assert len(stream.getvalue().splitlines()) == 1
+    assert duration(42) == "42s" and duration(185) == "3m05s"
+    assert duration(7620) == "2h07m" and duration(float("inf")) == "?"
+
+
+def test_002_worker_records_reach_main_process():
+    """Records logged in pool workers come out on the main process's handler, filtered at its level."""
+    stream = io.StringIO()
+    configure_logging("INFO", stream=stream)
+    with HydXS_pool(2, "scipy") as pool:
+        log = logging.getLogger("HydXS.spline_scipy")
+        pool.submit(log.info, "from a worker").result()
+        pool.submit(log.debug, "not sent").result()
+    assert "HydXS INFO: from a worker" in stream.getvalue()
+    assert "not sent" not in stream.getvalue()
+    configure_logging("WARNING", stream=io.StringIO())
+    assert HydXS_logging.logger.level == logging.WARNING
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+
+from benchmarks import synthetic_cross_sections
+from HydXS import run_hydxs
+from HydXS import HydXS_profiling
+from HydXS.HydXS_profiling import Profiler, histogram, profiling
+
+
+def test_001_profiler_records_and_merges():
+    """Stages, counters and histograms are recorded only while a Profiler is active, and worker states merge into it."""
+    assert HydXS_profiling.stage("off") is HydXS_profiling.stage("other")
+    HydXS_profiling.count("off")
+    worker = Profiler()
+    with profiling(worker):
+        with HydXS_profiling.stage("smoothing"):
+            HydXS_profiling.count("smoothing_calls", 2)
+        HydXS_profiling.observe("retries", 1)
+    assert HydXS_profiling.active_profiler() is None
+    profiler = Profiler()
+    profiler.merge(worker.state())
+    profiler.merge(worker.state())
+    report = json.loads(json.dumps(profiler.report()))
+    assert report["stages"]["smoothing"]["calls"] == 2
+    assert report["counters"] == {"smoothing_calls": 4}
+    assert report["histograms"]["retries"]["counts"] == [2]
+
+
+def test_002_histogram_bins():
+    """Counts get one bin per value, timings powers of 2 bins."""
+    counts = histogram([0, 0, 2])
+    assert counts["edges"] == [0, 1, 2, 3] and counts["counts"] == [2, 0, 1]
+    timings = histogram([0.3, 0.7, 3.0])
+    assert np.allclose(timings["edges"], [0.25, 0.5, 1, 2, 4])
+    assert timings["counts"] == [1, 1, 0, 1] and timings["max"] == 3.0
+
+
+def test_003_run_hydxs_profile(tmp_path):
+    """run_hydxs(profile=True) gives the same results, and a report of its stages and counters."""
+    points = synthetic_cross_sections(4, n_points=50, seed=2)
+    settings = dict(
+        nruns=2,
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+        out_data_path=tmp_path,
+        make_points=False,
+    )
+    expected, _ = run_hydxs(points.copy(), **settings)
+    out, _, report = run_hydxs(points.copy(), profile=True, **settings)
+    assert out.equals(expected)
+    for name in ("wrangle", "preprocess", "geometry", "smoothing", "output"):
+        assert report["stages"][name]["calls"] >= 1
+    counters = report["counters"]
+    assert counters["geometry_evaluations"] == 4 * 200
+    assert counters["xs_runs"] == 4 * 2
+    assert counters["smoothing_calls"] == counters["xs_runs"] + counters["retries"]
+    assert report["histograms"]["xs_run_seconds"]["count"] == 4 * 2
@@ -0,0 +1,36 @@
+import numpy as np
+
+from HydXS.HydXS_modelling import HydXS_output, HydXS_wide, RunResults
+
+
+def test_001_long_results_to_wide_layout():
+    """Collected (XS, run) rows give one row per XS with rounded bankfull/left/right per run."""
+    output = RunResults(6)
+    for k in (1, 2):
+        for i in (7, 3, 5):
+            runs = 99 if (i, k) == (5, 2) else 1
+            HydXS_output(
+                output, i, 1.234 * k, 9.876, 0, i + 0.111, "1", "-", 0.4, runs, run=k
+            )
+    long = output.frame()
+    assert len(long) == 6 and list(long["run"]) == [1, 1, 1, 2, 2, 2]
+
+    wide = HydXS_wide(long)
+    assert list(wide.columns) == [
+        "index",
+        "CrossSection",
+        "bankfull_1",
+        "left_1",
+        "right_1",
+        "bankfull_2",
+        "left_2",
+        "right_2",
+    ]
+    assert list(wide["CrossSection"]) == [7, 3, 5]
+    assert list(wide["bankfull_1"]) == [7.11, 3.11, 5.11]
+    assert list(wide["left_2"][:2]) == [2.47, 2.47]
+    # hit the boundaries in run 2 : no result
+    assert np.isnan(wide["bankfull_2"][2])
+
+    single = output.frame(run=2)
+    assert list(single.index) == [7, 3, 5] and "run" not in single.columns
@@ -0,0 +1,51 @@
+import numpy as np
+
+from HydXS import spline_scipy
+
+
+def test_001_reinsch_fit_matches_dense_solution():
+    """Banded smoothing spline solve matches the dense penalised least squares solution."""
+    rng = np.random.default_rng(0)
+    n = 30
+    x = np.sort(rng.uniform(0, 1, n))
+    y = np.sin(6 * x) + rng.normal(0, 0.1, n)
+    w = rng.uniform(0.5, 2, n)
+    h = np.diff(x)
+    Q = np.zeros((n, n - 2))
+    R = np.zeros((n - 2, n - 2))
+    for j in range(n - 2):
+        Q[j, j] = 1 / h[j]
+        Q[j + 1, j] = -1 / h[j] - 1 / h[j + 1]
+        Q[j + 2, j] = 1 / h[j + 1]
+        R[j, j] = (h[j] + h[j + 1]) / 3
+        if j < n - 3:
+            R[j, j + 1] = R[j + 1, j] = h[j + 1] / 6
+    K = Q @ np.linalg.solve(R, Q.T)
+    lam = 1e-4
+    expected = np.linalg.solve(np.diag(w) + lam * K, w * y)
+    _, g, _ = spline_scipy._fit_spline(x, y, w, lam)
+    np.testing.assert_allclose(g, expected, atol=1e-9)
+
+
+def test_002_runAlg_finds_hydraulic_depth_peak():
+    """runAlg returns the local maximum of a bumped hydraulic depth curve."""
+    rng = np.random.default_rng(1)
+    depts = np.linspace(0.1, 5, 200)
+    HydDept = (
+        np.sqrt(depts)
+        + 0.3 * np.exp(-(((depts - 3) / 0.3) ** 2))
+        + rng.normal(0, 0.01, 200)
+    )
+    deptsLM, HydDeptLM, spar, fit = spline_scipy.runAlg(depts, HydDept, seed=1)
+    assert len(fit) == len(depts)
+    assert 0 <= spar <= 1
+    assert any(abs(d - 3) < 0.2 for d in deptsLM)
+
+
+def test_003_runAlg_is_reproducible_with_seed():
+    """The same seed gives the same fold sampling and so the same result."""
+    depts = np.linspace(0.1, 5, 100)
+    HydDept = np.sqrt(depts) + 0.2 * np.sin(3 * depts)
+    assert spline_scipy.runAlg(depts, HydDept, seed=7)[:3] == spline_scipy.runAlg(
+        depts, HydDept, seed=7
+    )[:3]
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("rpy2.robjects")
+
+from HydXS import spline_withR_NEW
+
+
+def test_001_R_source_parsed_once():
+    """The R source is parsed once per process, and every later runAlg call reuses the compiled handle."""
+    rng = np.random.default_rng(1)
+    depts = np.linspace(0.1, 5, 200)
+    HydDept = (
+        np.sqrt(depts)
+        + 0.3 * np.exp(-(((depts - 3) / 0.3) ** 2))
+        + rng.normal(0, 0.01, 200)
+    )
+    handle = spline_withR_NEW.warm_up()
+    stats = dict(spline_withR_NEW.R_PARSE_STATS)
+    assert stats["parses"] == 1
+    assert spline_withR_NEW.warm_up() is handle
+    for _ in range(3):
+        spline_withR_NEW.runAlg(depts, HydDept, seed=1)
+    assert spline_withR_NEW.R_PARSE_STATS["parses"] == 1
+    assert (
+        spline_withR_NEW.R_PARSE_STATS["parses_avoided"] == stats["parses_avoided"] + 3
+    )
+
+
+def test_002_failed_fit_returns_none():
+    """When the R fit fails, runAlg returns Nones instead of raising."""
+    assert spline_withR_NEW.runAlg([1.0, 2.0], [0.5, 0.7], seed=1) == (
+        [None],
+        [None],
+        None,
+        [None],
+    )
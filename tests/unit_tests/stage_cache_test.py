@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+from HydXS import HydXS_cache
+from HydXS.BankFullDetection_NEW import stage_curve
+from HydXS.HydXS_cache import StageCache, smoother_version
+
+
+def make_profile():
+    d = np.linspace(0, 40, 30)
+    return [(x, z) for x, z in zip(d, np.abs(d - 20) * 0.4 + 100)]
+
+
+def test_001_cached_entries_match_computed(tmp_path):
+    """Stage curves and spline results read back from the cache equal the computed ones."""
+    cache = StageCache(tmp_path)
+    expected = stage_curve(make_profile(), 50, geometry="analytic")
+    first = cache.stage_curve(make_profile(), 50, geometry="analytic")
+    again = cache.stage_curve(make_profile(), 50, geometry="analytic")
+    for a, b, c in zip(expected, first, again):
+        np.testing.assert_array_equal(a, b)
+        np.testing.assert_array_equal(a, c)
+
+    calls = []
+
+    def splineR(depts, HydDept, seed=None):
+        calls.append(seed)
+        return [1.5, None], [0.25, None], 0.75, [1.0, 2.0]
+
+    for _ in range(2):
+        result = cache.spline(splineR, "test", expected.depts, expected.HydDept, 3)
+        assert result == ([1.5, None], [0.25, None], 0.75, [1.0, 2.0])
+    assert calls == [3]
+    cache.spline(splineR, "test", expected.depts, expected.HydDept, 4)
+    assert calls == [3, 4]
+
+
+def test_002_least_recently_used_evicted(tmp_path):
+    """Over max_bytes, the entries read or written longest ago are removed first."""
+    cache = StageCache(tmp_path)
+    for k in range(3):
+        cache.put(str(k) * 64, {"x": np.zeros(100)})
+        os.utime(cache.path(str(k) * 64), (k, k))
+    cache.get("0" * 64)
+    size = cache.path("0" * 64).stat().st_size
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert cache.get("0" * 64) is not None
+    assert cache.get("1" * 64) is None
+    assert cache.get("2" * 64) is not None
+
+
+def test_003_corrupt_entry_is_a_miss(tmp_path):
+    """A truncated or corrupt entry is treated as a miss and removed, then written again."""
+    cache = StageCache(tmp_path)
+    expected = cache.stage_curve(make_profile(), 50, geometry="analytic")
+    (path,) = tmp_path.glob("*/*.npz")
+    for content in (path.read_bytes()[:40], b"not an npz file", b""):
+        path.write_bytes(content)
+        again = cache.stage_curve(make_profile(), 50, geometry="analytic")
+        np.testing.assert_array_equal(again.HydDept, expected.HydDept)
+        assert cache.get(path.stem) is not None
+
+
+def test_004_eviction_scans_once_for_many_writes(tmp_path, monkeypatch):
+    """Once full, the cache is trimmed to LOW_WATER * max_bytes, so several more writes need one directory scan."""
+    cache = StageCache(tmp_path)
+    cache.put("0" * 64, {"x": np.zeros(100)})
+    size = cache.path("0" * 64).stat().st_size
+    for _ in range(3):
+        cache.put("0" * 64, {"x": np.ones(100)})
+    assert cache._size == size
+    cache.max_bytes = 20 * size
+    for k in range(1, 20):
+        cache.put(f"{k:064d}", {"x": np.zeros(100)})
+    scans = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, "entries", lambda: scans.append(1) or entries())
+    for k in range(20, 23):
+        cache.put(f"{k:064d}", {"x": np.zeros(100)})
+    assert len(scans) == 1
+    assert cache._size == sum(size for _, size, _ in entries())
+    assert cache._size <= cache.max_bytes
+
+
+def test_005_backend_version_in_spline_key(tmp_path, monkeypatch):
+    """The scipy backend's version includes a hash of spline_scipy.py, and another version misses the cache."""
+    assert len(smoother_version("scipy").split()) == 3
+    cache = StageCache(tmp_path)
+    calls = []
+
+    def splineR(depts, HydDept, seed=None):
+        calls.append(seed)
+        return [1.5], [0.25], 0.75, [1.0, 2.0]
+
+    depts, HydDept = np.linspace(0, 1, 10), np.linspace(1, 2, 10)
+    cache.spline(splineR, "scipy", depts, HydDept, 3)
+    cache.spline(splineR, "scipy", depts, HydDept, 3)
+    assert calls == [3]
+    monkeypatch.setattr(HydXS_cache, "smoother_version", lambda smoother: "changed")
+    cache.spline(splineR, "scipy", depts, HydDept, 3)
+    assert calls == [3, 3]
@@ -0,0 +1,40 @@
+import pytest
+
+from benchmarks import synthetic_cross_sections
+from HydXS import BankFullDetection_NEW, run_hydxs
+from HydXS.HydXS_modelling import HydXS_run
+
+
+@pytest.mark.parametrize("boundary", [False, True])
+def test_001_stage_curve_once_per_xs(tmp_path, monkeypatch, boundary):
+    """The stage curve of each XS is computed once, and reused by every run and boundary retry."""
+    points = synthetic_cross_sections(3, n_points=50, seed=2)
+    _, XSdata2 = run_hydxs(
+        points,
+        nruns=1,
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+        out_data_path=tmp_path,
+        make_points=False,
+    )
+    calls = []
+    stage_hydraulics = BankFullDetection_NEW.stage_hydraulics
+
+    def counted(*args, **kwargs):
+        calls.append(args[0])
+        return stage_hydraulics(*args, **kwargs)
+
+    monkeypatch.setattr(BankFullDetection_NEW, "stage_hydraulics", counted)
+    xs_list = sorted(XSdata2["x_sec_id"].unique())
+    results = HydXS_run(
+        XSdata2,
+        xs_list,
+        num_runs=3,
+        boundary=boundary,
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+    )
+    assert len(xs_list) == 3 and len(results) == 3
+    assert len(calls) == 3
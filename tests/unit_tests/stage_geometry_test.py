@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from shapely.geometry import LineString, Point, Polygon, box
+
+from HydXS.BankFullDetection_NEW import calc_hyd_outputs
+from HydXS.stage_geometry import stage_geometry
+
+
+def shapely_stage_geometry(pointList, depts, allow_multichannel=False):
+    """Per-stage shapely intersections, as done in mainFun."""
+    polygonXSorig = Polygon(pointList)
+    borderXS = LineString(pointList)
+    minx, minY, maxx, maxY = polygonXSorig.bounds
+    extended = [(minx, maxY + 1)] + list(pointList) + [(maxx, maxY + 1)]
+    polygonXS = Polygon(extended)
+    area, perimeter, width = [], [], []
+    for dept in depts:
+        wdep = box(minx, minY, maxx, dept)
+        wetArea = polygonXS.intersection(wdep)
+        wetPerimeter = borderXS.intersection(wdep)
+        wetWTLine = LineString([(minx, dept), (maxx, dept)]).intersection(polygonXS)
+        if not allow_multichannel and wetArea.geom_type == "MultiPolygon":
+            for poly in wetArea.geoms:
+                if poly.bounds[1] == minY:
+                    wetArea = poly
+                    break
+            wetPerimeter = wetArea.intersection(wetPerimeter)
+            wetWTLine = wetArea.intersection(wetWTLine)
+        area.append(wetArea.area)
+        perimeter.append(wetPerimeter.length)
+        width.append(wetWTLine.length)
+    return np.array(area), np.array(perimeter), np.array(width)
+
+
+@pytest.mark.parametrize("allow_multichannel", [False, True])
+def test_001_matches_shapely_on_random_profiles(allow_multichannel):
+    """Analytic wet area, perimeter and width match the shapely path."""
+    rng = np.random.default_rng(42)
+    for _ in range(25):
+        n = rng.integers(4, 40)
+        x = np.cumsum(rng.uniform(0.05, 2, n)) - 0.05
+        z = rng.normal(0, 2, n)
+        points = [Point(a, b) for a, b in zip(x, z)]
+        depts = np.linspace(z.min() + 0.1, z.max() - 0.1, 50)
+
+        expected = shapely_stage_geometry(points, depts, allow_multichannel)
+        result = stage_geometry(points, depts, allow_multichannel)
+        for e, r in zip(expected, result):
+            np.testing.assert_allclose(r, e, rtol=1e-9, atol=1e-9)
+
+
+def test_002_calc_hyd_outputs_analytic_v_channel():
+    """Hydraulic depth of a symmetric V channel is half the water depth."""
+    points = [(0.0, 5.0), (5.0, 0.0), (10.0, 5.0)]
+    HydDept, HydRad, width = calc_hyd_outputs(points, 2.0, geometry="analytic")
+    assert width == pytest.approx(4.0)
+    assert HydDept == pytest.approx(1.0)
+    assert HydRad == pytest.approx(4.0 / (2 * np.hypot(2.0, 2.0)))
@@ -0,0 +1,82 @@
+import numpy as np
+
+from HydXS.BankFullDetection_NEW import mainFun, stage_curve
+from HydXS.HydXS_cache import StageCache
+from HydXS.spline_scipy import runAlg
+from HydXS.stage_sampling import stage_weights
+
+
+def make_profile(seed=0):
+    rng = np.random.default_rng(seed)
+    d = np.linspace(0, 40, 60)
+    z = np.minimum(np.abs(d - 20) * 0.5, 4 + 0.05 * np.abs(d - 20))
+    return np.column_stack((d, z + rng.normal(0, 0.05, len(d)) + 100))
+
+
+def test_001_adaptive_grid_is_part_of_uniform_grid():
+    """The adaptive depths are uniform grid depths, with the same hydraulic depths, and fewer of them."""
+    profile = make_profile()
+    uniform = stage_curve(profile, 200, geometry="analytic")
+    adaptive = stage_curve(profile, 200, geometry="analytic", stage_grid="adaptive")
+    assert len(adaptive.depts) < len(uniform.depts)
+    assert adaptive.depts[0] == uniform.depts[0]
+    assert adaptive.depts[-1] == uniform.depts[-1]
+    position = np.searchsorted(uniform.depts, adaptive.depts)
+    np.testing.assert_array_equal(uniform.depts[position], adaptive.depts)
+    np.testing.assert_allclose(adaptive.HydDept, uniform.HydDept[position])
+    np.testing.assert_allclose(adaptive.HydRad, uniform.HydRad[position])
+    assert uniform.weights is None
+    assert len(adaptive.weights) == len(adaptive.depts)
+
+
+def test_002_turning_points_sampled_densely():
+    """Around the turning points of the hydraulic depth curve, every uniform grid depth is sampled."""
+    profile = make_profile(1)
+    uniform = stage_curve(profile, 200, geometry="analytic")
+    adaptive = stage_curve(profile, 200, geometry="analytic", stage_grid="adaptive")
+    slope = np.sign(np.diff(uniform.HydDept))
+    turning = np.flatnonzero(slope[1:] != slope[:-1]) + 1
+    assert len(turning) > 0
+    for j in turning:
+        assert np.isin(uniform.depts[j - 1 : j + 2], adaptive.depts).all()
+
+
+def test_003_stage_weights():
+    """Evenly spaced depths all weigh 1 ; otherwise the weights follow the spacing, with a mean of 1."""
+    np.testing.assert_allclose(stage_weights(np.linspace(1, 5, 9)), np.ones(9))
+    weights = stage_weights([0.0, 1.0, 1.5, 2.0, 4.0])
+    assert np.isclose(weights.mean(), 1)
+    np.testing.assert_allclose(weights / weights[0], [1, 0.75, 0.5, 1.25, 2])
+
+
+def test_004_weighted_smoothing():
+    """Unit weights smooth as no weights ; the adaptive curve runs through mainFun and the cache."""
+    curve = stage_curve(make_profile(), 100, geometry="analytic")
+    assert runAlg(curve.depts, curve.HydDept, seed=2) == runAlg(
+        curve.depts, curve.HydDept, seed=2, w=np.ones(len(curve.depts))
+    )
+    adaptive = stage_curve(
+        make_profile(), 100, geometry="analytic", stage_grid="adaptive"
+    )
+    result = mainFun(
+        make_profile(),
+        minVdep=0.2,
+        geometry="analytic",
+        smoother="scipy",
+        curve=adaptive,
+        seed=2,
+    )
+    assert make_profile()[0, 1] > result[3] > make_profile()[:, 1].min()
+
+
+def test_005_adaptive_curve_cached(tmp_path):
+    """The weights of an adaptive curve are kept in the cache, apart from the uniform curve."""
+    cache = StageCache(tmp_path)
+    profile = make_profile()
+    expected = stage_curve(profile, 200, geometry="analytic", stage_grid="adaptive")
+    cache.stage_curve(profile, 200, geometry="analytic", stage_grid="adaptive")
+    again = cache.stage_curve(profile, 200, geometry="analytic", stage_grid="adaptive")
+    for a, b in zip(expected, again):
+        np.testing.assert_array_equal(a, b)
+    uniform = cache.stage_curve(profile, 200, geometry="analytic")
+    assert uniform.weights is None and len(uniform.depts) == 200
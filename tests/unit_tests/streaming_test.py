@@ -0,0 +1,145 @@
+import pandas as pd
+import pytest
+from typer.testing import CliRunner
+
+from benchmarks import synthetic_cross_sections
+from HydXS import run_hydxs
+from HydXS.cli_interface import app
+from HydXS.HydXS_profiling import Profiler, profiling
+from HydXS.HydXS_streaming import read_xs_chunks, run_hydxs_streaming
+
+
+def test_001_chunks_hold_whole_cross_sections(tmp_path):
+    """A XS cut by the end of a chunk is carried over, so every chunk holds whole XSs."""
+    data = pd.DataFrame(
+        {"x_sec_id": [1] * 5 + [2] * 7 + [3] * 2 + [4] * 6, "x_sec_order": range(20)}
+    )
+    path = tmp_path / "points.csv"
+    data.to_csv(path, index=False)
+    chunks = list(read_xs_chunks(path, chunksize=4))
+    pd.testing.assert_frame_equal(pd.concat(chunks), data)
+    seen = [set(chunk["x_sec_id"]) for chunk in chunks]
+    for k, ids in enumerate(seen):
+        for other in seen[k + 1 :]:
+            assert ids.isdisjoint(other)
+
+
+def test_002_ungrouped_csv_raises(tmp_path):
+    """A XS that appears again after other XSs is rejected."""
+    data = pd.DataFrame({"x_sec_id": [1, 1, 2, 2, 1, 3], "x_sec_order": range(6)})
+    path = tmp_path / "points.csv"
+    data.to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        list(read_xs_chunks(path, chunksize=2))
+
+
+def test_003_streaming_resume_reuses_checkpoint(tmp_path):
+    """A resumed streaming run takes every (XS, run) result from the checkpoint, and writes the same results."""
+    points = synthetic_cross_sections(4, n_points=50, seed=3)
+    path = tmp_path / "points.csv"
+    points.to_csv(path, index=False)
+    settings = dict(
+        nruns=2,
+        out_data_path=tmp_path / "out",
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+        chunksize=120,
+    )
+    results_csv, _ = run_hydxs_streaming(path, checkpoint=True, **settings)
+    expected = pd.read_csv(results_csv)
+    with profiling(Profiler()) as profiler:
+        run_hydxs_streaming(path, resume=True, **settings)
+    assert profiler.counters["checkpoint_results"] == 4 * 2
+    pd.testing.assert_frame_equal(pd.read_csv(results_csv), expected)
+
+
+def test_004_streaming_cache(tmp_path):
+    """With cache_dir, a second streaming run takes its stage curves from the cache and writes the same results."""
+    points = synthetic_cross_sections(3, n_points=50, seed=4)
+    path = tmp_path / "points.csv"
+    points.to_csv(path, index=False)
+    settings = dict(
+        nruns=2,
+        out_data_path=tmp_path / "out",
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+        chunksize=100,
+        cache_dir=tmp_path / "cache",
+    )
+    results_csv, _ = run_hydxs_streaming(path, **settings)
+    expected = pd.read_csv(results_csv)
+    assert len(list((tmp_path / "cache").glob("*/*.npz"))) > 0
+    with profiling(Profiler()) as profiler:
+        run_hydxs_streaming(path, **settings)
+    assert "geometry_evaluations" not in profiler.counters
+    pd.testing.assert_frame_equal(pd.read_csv(results_csv), expected)
+
+
+def test_005_streaming_previous(tmp_path):
+    """With previous results, a streaming run only runs the changed XSs, and gives the results of a full run."""
+    points = synthetic_cross_sections(4, n_points=50, seed=5)
+    path = tmp_path / "points.csv"
+    points.to_csv(path, index=False)
+    settings = dict(
+        nruns=2, smoother="scipy", geometry="analytic", seed=1, chunksize=120
+    )
+    results_csv, points_csv = run_hydxs_streaming(
+        path, out_data_path=tmp_path, **settings
+    )
+    points.loc[points["x_sec_id"] == 3, "POINT_Z"] += 0.5
+    points.to_csv(path, index=False)
+    with profiling(Profiler()) as profiler:
+        run_hydxs_streaming(
+            path, out_data_path=tmp_path, previous=results_csv, **settings
+        )
+    assert profiler.counters["xs_runs"] == 2
+    expected = run_hydxs_streaming(path, out_data_path=tmp_path / "full", **settings)
+    for written, full in zip((results_csv, points_csv), expected):
+        pd.testing.assert_frame_equal(pd.read_csv(written), pd.read_csv(full))
+
+
+def test_006_streaming_adaptive(tmp_path):
+    """An adaptive ensemble streamed in chunks gives the results of run_hydxs on the whole CSV."""
+    points = synthetic_cross_sections(4, n_points=50, seed=6)
+    path = tmp_path / "points.csv"
+    points.to_csv(path, index=False)
+    settings = dict(
+        nruns=5,
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+        adaptive=True,
+        min_runs=2,
+    )
+    results_csv, _ = run_hydxs_streaming(
+        path, out_data_path=tmp_path, chunksize=120, **settings
+    )
+    expected, _ = run_hydxs(
+        path, out_data_path=tmp_path / "whole", make_points=False, **settings
+    )
+    expected.to_csv(tmp_path / "expected.csv", index=False)
+    pd.testing.assert_frame_equal(
+        pd.read_csv(results_csv), pd.read_csv(tmp_path / "expected.csv")
+    )
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["points.parquet"],
+        ["points.shp"],
+        ["points.csv", "--input-type", "GIS"],
+        ["points.csv", "--output-format", "parquet"],
+        ["points.csv", "--archive", "archive"],
+    ],
+)
+def test_007_cli_rejects_unsupported_streaming_options(tmp_path, options):
+    """Options that streaming can't do are rejected with --chunksize, not ignored."""
+    result = CliRunner().invoke(
+        app,
+        ["run", *options, "--chunksize", "100", "--out-data-path", str(tmp_path)],
+    )
+    assert result.exit_code == 2
+    assert "--chunksize" in result.output
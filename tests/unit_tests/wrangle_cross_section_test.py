@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from HydXS.wrangle_cross_section import wrangle_cross_section, xs_distances
+
+
+def make_points(n_xs=5, n_pts=30):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame(
+        {
+            "x_sec_id": np.repeat(np.arange(1, n_xs + 1), n_pts),
+            "x_sec_order": np.tile(np.arange(1, n_pts + 1), n_xs),
+            "POINT_X": rng.random(n_xs * n_pts) * 100,
+            "POINT_Y": rng.random(n_xs * n_pts) * 100,
+            "POINT_Z": rng.random(n_xs * n_pts),
+            "RivCentre": 0,
+        }
+    )
+
+
+def test_001_distance_matches_point_loop():
+    """Cumulative distance matches summing Point.distance along each XS."""
+    data = make_points()
+    distance = xs_distances(
+        data["x_sec_id"], data["x_sec_order"], data["POINT_X"], data["POINT_Y"]
+    )
+    for i, xs in data.groupby("x_sec_id"):
+        points = [Point(x, y) for x, y in zip(xs["POINT_X"], xs["POINT_Y"])]
+        expected = np.cumsum(
+            [0.0] + [p.distance(q) for p, q in zip(points[1:], points)]
+        )
+        np.testing.assert_allclose(distance[xs.index], expected, rtol=1e-12)
+
+
+def test_002_unsorted_rows_keep_input_order():
+    """Shuffled rows get the same Distance as sorted rows, returned in input order."""
+    data = make_points()
+    shuffled = data.sample(frac=1, random_state=0)
+    out = wrangle_cross_section(shuffled)
+    expected = wrangle_cross_section(data)
+    assert list(out.index) == list(shuffled.index)
+    np.testing.assert_allclose(
+        out["Distance"].to_numpy(), expected.loc[shuffled.index, "Distance"].to_numpy()
+    )
+    assert (
+        out["PointDZ"]
+        .iloc[0]
+        .equals(Point(out["Distance"].iloc[0], out["POINT_Z"].iloc[0]))
+    )
+    assert "PointXY" not in wrangle_cross_section(data, make_points=False).columns
@@ -0,0 +1,44 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from HydXS.xs_archive import open_xs_archive, write_xs_archive
+from HydXS.xs_index import XSIndex
+from HydXS.xs_ragged import RaggedXS
+
+
+def make_preprocessed():
+    rng = np.random.default_rng(3)
+    ids = np.repeat([4, 2, 7], [10, 6, 8])
+    return pd.DataFrame(
+        {
+            "x_sec_id": ids,
+            "x_sec_order": np.concatenate(
+                [np.arange(1, 11), np.arange(1, 7), np.arange(1, 9)]
+            ),
+            "Distance": rng.random(24) * 10,
+            "POINT_Z": rng.random(24),
+            "riverMin": np.repeat([0.1, 0.2, 0.3], [10, 6, 8]),
+            "inXS": rng.random(24) > 0.3,
+        }
+    )
+
+
+def test_001_archive_profiles_match_in_memory(tmp_path):
+    """Profiles read from the memory-mapped archive equal the in-memory ones, also after pickling."""
+    data = make_preprocessed()
+    write_xs_archive(tmp_path / "archive", data)
+    archive = open_xs_archive(tmp_path / "archive")
+    ragged = RaggedXS(XSIndex(data, mask=data["inXS"] == True))
+    assert isinstance(archive.dz, np.memmap)
+    assert len(pickle.dumps(archive)) < 200
+    copy = pickle.loads(pickle.dumps(archive))
+    for i in (2, 4, 7, 9):
+        np.testing.assert_array_equal(archive.profile(i), ragged.profile(i))
+        np.testing.assert_array_equal(copy.profile(i), ragged.profile(i))
+    meta = archive.meta()
+    kept = data[data["inXS"]]
+    assert meta.loc[7, "riverMin"] == 0.3
+    assert meta.loc[4, "first"] == kept[kept["x_sec_id"] == 4]["x_sec_order"].min()
+    assert meta["n_points"].sum() == len(kept)
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from HydXS.xs_index import XSIndex
+
+
+def make_points():
+    rng = np.random.default_rng(0)
+    ids = rng.integers(1, 8, 200)
+    return pd.DataFrame(
+        {
+            "x_sec_id": ids,
+            "x_sec_order": np.arange(200),
+            "inXS": rng.random(200) > 0.3,
+        }
+    )
+
+
+def test_001_slices_match_boolean_filter():
+    """Each lookup returns the same rows, in the same order, as the full-table filter."""
+    data = make_points()
+    index = XSIndex(data)
+    masked = XSIndex(data, mask=data["inXS"] == True)
+    for i in range(0, 10):
+        pd.testing.assert_frame_equal(index.get(i), data[data["x_sec_id"] == i])
+        pd.testing.assert_frame_equal(
+            masked.get(i), data[(data["x_sec_id"] == i) & (data["inXS"] == True)]
+        )
+    assert 3 in index and 0 not in index
+    assert len(index) == data["x_sec_id"].nunique()
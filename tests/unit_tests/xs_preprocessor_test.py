@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from HydXS.xs_preprocessor import preprocess_cross_section
+
+
+def loop_use_centre(xs, centre="RivCentre", window=10):
+    """Original row-loop implementation of XS_UseCentre."""
+    riverMin = min(xs["POINT_Z"])
+    for j in range(0, len(xs)):
+        if not xs.loc[j, centre] == 0:
+            riverMin = min(
+                xs[max(0, j - window) : min(j + window + 1, len(xs))]["POINT_Z"]
+            )
+            break
+    group = [j for j in range(0, len(xs)) if xs.loc[j, "POINT_Z"] == riverMin]
+    leftMin = group[0]
+    rightMin = group[-1]
+    left = 0
+    right = len(xs) - 1
+    for j in range(0, len(xs)):
+        if (xs.loc[j, "x_sec_order"] <= leftMin) and (xs.loc[j, "POINT_Z"] < riverMin):
+            left = j
+        if (xs.loc[j, "x_sec_order"] >= rightMin) and (xs.loc[j, "POINT_Z"] < riverMin):
+            right = j
+            break
+    xs["riverMin"] = riverMin
+    xs["inXS"] = (xs["x_sec_order"] > left + 1) & (xs["x_sec_order"] < right + 1)
+    return xs
+
+
+def make_points(n_xs=40, n_pts=25):
+    rng = np.random.default_rng(2)
+    data = pd.DataFrame(
+        {
+            "x_sec_id": np.repeat(np.arange(1, n_xs + 1), n_pts),
+            "x_sec_order": np.tile(np.arange(1, n_pts + 1), n_xs),
+            "Distance": np.tile(np.arange(n_pts, dtype=float), n_xs),
+            # rounded, so there are ties at the minimum
+            "POINT_Z": np.round(rng.random(n_xs * n_pts) * 5),
+            "RivCentre": 0,
+        }
+    )
+    # one centre row per XS, except every fifth XS
+    centre = np.arange(n_xs) * n_pts + rng.integers(0, n_pts, n_xs)
+    data.loc[centre[np.arange(n_xs) % 5 != 0], "RivCentre"] = 1
+    return data
+
+
+def test_001_matches_loop_per_xs():
+    """riverMin / inXS of the single-pass trimming match the original per-XS loop."""
+    data = make_points()
+    xs_list = list(range(0, 45))
+    out = preprocess_cross_section(data, xs_list, dR_window=3, dR_excl=(7,))
+    expected = pd.concat(
+        [
+            loop_use_centre(data[data["x_sec_id"] == i].reset_index(), window=3)
+            for i in xs_list
+            if i in set(data["x_sec_id"]) and i != 7
+        ],
+        ignore_index=True,
+    )
+    pd.testing.assert_frame_equal(out, expected)
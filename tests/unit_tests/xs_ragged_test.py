@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic_cross_sections
+from HydXS import run_hydxs
+from HydXS.wrangle_cross_section import add_point_geometry, wrangle_cross_section
+from HydXS.xs_index import XSIndex
+from HydXS.xs_ragged import RaggedXS
+
+
+def make_points():
+    rng = np.random.default_rng(2)
+    ids = rng.integers(1, 6, 60)
+    return pd.DataFrame(
+        {
+            "x_sec_id": ids,
+            "x_sec_order": np.arange(60),
+            "POINT_X": rng.random(60) * 10,
+            "POINT_Y": rng.random(60) * 10,
+            "POINT_Z": rng.random(60),
+            "RivCentre": 0,
+        }
+    )
+
+
+def test_001_profiles_match_point_columns():
+    """Each profile holds the same (Distance, Z) values, in order, as the PointDZ column."""
+    data = wrangle_cross_section(make_points())
+    index = XSIndex(data)
+    ragged = RaggedXS(index)
+    for i in range(0, 7):
+        expected = [p.coords[0] for p in index.get(i)["PointDZ"]]
+        np.testing.assert_array_equal(
+            ragged.profile(i), np.array(expected, dtype=float).reshape(-1, 2)
+        )
+    assert ragged.profile(0).shape == (0, 2) and 0 not in ragged
+    assert np.shares_memory(ragged.profile(1), ragged.dz)
+
+
+def test_002_point_geometry_added_later():
+    """add_point_geometry gives the same columns as wrangling with make_points=True."""
+    expected = wrangle_cross_section(make_points())
+    out = add_point_geometry(wrangle_cross_section(make_points(), make_points=False))
+    assert list(out.columns) == list(expected.columns)
+    for column in ("PointXY", "PointDZ"):
+        assert all(a.equals(b) for a, b in zip(out[column], expected[column]))
+
+
+def test_003_shuffled_rows_give_ordered_profiles(tmp_path):
+    """With the input rows shuffled, profiles are still in x_sec_order, and run_hydxs gives the same results."""
+    points = synthetic_cross_sections(3, n_points=50, seed=7)
+    shuffled = points.sample(frac=1, random_state=1)
+    for data in (points, shuffled):
+        ragged = RaggedXS(XSIndex(wrangle_cross_section(data, make_points=False)))
+        for i in (1, 2, 3):
+            assert np.all(np.diff(ragged.profile(i)[:, 0]) > 0)
+    settings = dict(
+        nruns=2,
+        smoother="scipy",
+        geometry="analytic",
+        seed=1,
+        out_data_path=tmp_path,
+        make_points=False,
+    )
+    expected, _ = run_hydxs(points.copy(), **settings)
+    out, _ = run_hydxs(shuffled.copy(), **settings)
+    pd.testing.assert_frame_equal(out, expected)